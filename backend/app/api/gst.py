@@ -1,14 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Dict, Optional
 from datetime import datetime
+import io
+import json
+import time
 from pydantic import BaseModel
 
 from ..services.gst_categorization import GSTCategorizationService, GSTCategorizationResult
+from ..services.gst_penalties import record_gst_filing
+from ..services.gst_returns import SECTIONS, GstReturnAggregator
+from ..services.gstin import GstinCheck, validate_gstin, validate_gstins
+from ..services.hsn_master import hsn_mapping_stats, reload_hsn_mapping
+from ..core.config import settings
 from ..services.reconciliation import ReconciliationService, ReconciliationResult
 from ..services.analytics import AnalyticsService, FraudDetectionResult, CashFlowPrediction
 
 router = APIRouter(prefix="/gst", tags=["GST"])
 
+# Records aggregated per thread-pool call while a /returns body streams in
+RETURNS_CHUNK_SIZE = 1000
+
 # Pydantic models for request/response
 class InvoiceData(BaseModel):
     invoice_id: str
@@ -31,6 +44,36 @@ class GSTCategorizationResponse(BaseModel):
     hsn_code: str
     confidence_score: float
     validation_notes: List[str]
+    matched_code: str = ""
+    matched_level: Optional[str] = None
+    mapping_version: str = ""
+
+class HsnSuggestion(BaseModel):
+    hsn_code: str
+    score: float
+
+class LineItemResponse(BaseModel):
+    description: str
+    hsn_code: str
+    source: str
+    category: str
+    confidence_score: float
+    taxable_value: float
+    tax: float
+    validation_notes: List[str]
+    suggestions: List[HsnSuggestion] = []
+
+class LineItemCategorizationResponse(BaseModel):
+    items: List[LineItemResponse]
+    slabs: Dict[str, Dict]
+    taxable_value: float
+    tax: float
+    mapping_version: str
+
+class GstFiling(BaseModel):
+    gstr1: Optional[str] = None  # filing dates, YYYY-MM-DD
+    gstr3b: Optional[str] = None
+    tax_paid: Optional[str] = None
 
 class ReconciliationResponse(BaseModel):
     status: str
@@ -61,17 +104,6 @@ gst_categorization_service = GSTCategorizationService()
 reconciliation_service = ReconciliationService()
 analytics_service = AnalyticsService()
 
-@router.post("/categorize")
-async def categorize_invoice(invoice_data: InvoiceData):
-    """
-    Test endpoint for invoice categorization
-    """
-    return {
-        "status": "success",
-        "message": "Invoice received",
-        "data": invoice_data.dict()
-    }
-
 @router.get("/test")
 async def test():
     """
@@ -80,7 +112,7 @@ async def test():
     return {"status": "GST router is working"}
 
 @router.post("/categorize", response_model=GSTCategorizationResponse)
-async def categorize_invoice_real(invoice_data: InvoiceData):
+async def categorize_invoice(invoice_data: InvoiceData):
     """
     Categorize an invoice based on its data and HSN/SAC codes
     """
@@ -90,11 +122,303 @@ async def categorize_invoice_real(invoice_data: InvoiceData):
             category=result.category.value,
             hsn_code=result.hsn_code,
             confidence_score=result.confidence_score,
-            validation_notes=result.validation_notes
+            validation_notes=result.validation_notes,
+            matched_code=result.matched_code,
+            matched_level=result.matched_level,
+            mapping_version=result.mapping_version
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/categorize-items", response_model=LineItemCategorizationResponse)
+async def categorize_line_items(invoice_data: InvoiceData):
+    """
+    Categorize each line item of an invoice and total the tax per rate slab
+    """
+    try:
+        result = gst_categorization_service.categorize_line_items(invoice_data.dict())
+        return LineItemCategorizationResponse(
+            items=[
+                LineItemResponse(
+                    description=item.description,
+                    hsn_code=item.result.hsn_code,
+                    source=item.source,
+                    category=item.result.category.value,
+                    confidence_score=item.result.confidence_score,
+                    taxable_value=item.taxable_value,
+                    tax=item.tax,
+                    validation_notes=item.result.validation_notes,
+                    suggestions=[HsnSuggestion(hsn_code=code, score=score) for code, score in item.suggestions]
+                )
+                for item in result.items
+            ],
+            slabs=result.slabs,
+            taxable_value=result.taxable_value,
+            tax=result.tax,
+            mapping_version=result.mapping_version
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/hsn-suggestions", response_model=List[HsnSuggestion])
+async def suggest_hsn_codes(description: str):
+    """
+    Suggest HSN/SAC codes for a free-text item description, best first
+    """
+    return [
+        HsnSuggestion(hsn_code=code, score=score)
+        for code, score in gst_categorization_service.suggest_hsn_codes(description)
+    ]
+
+@router.post("/hsn-mapping/reload")
+async def reload_hsn_mapping_now():
+    """
+    Reload the HSN mapping in this worker now instead of at the next poll
+    """
+    try:
+        reloaded = reload_hsn_mapping(force=True)
+        return {"reloaded": reloaded, **hsn_mapping_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _parse_batch(body: bytes, content_type: str) -> List[Dict]:
+    """Records from a JSON array, a {"records": [...]} object or NDJSON lines"""
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    payload = json.loads(body)
+    records = payload.get("records") if isinstance(payload, dict) else payload
+    if not isinstance(records, list):
+        raise ValueError('expected a JSON array or {"records": [...]}')
+    return records
+
+def _batch_result(index: int, record: Dict, result: GSTCategorizationResult) -> Dict:
+    return {
+        "index": index,
+        "id": record.get("id", record.get("invoice_id")),
+        "hsn_code": result.hsn_code,
+        "category": result.category.value,
+        "matched_code": result.matched_code,
+        "matched_level": result.matched_level,
+        "confidence_score": result.confidence_score,
+        "validation_notes": result.validation_notes,
+        "mapping_version": result.mapping_version,
+    }
+
+@router.post("/categorize-batch")
+async def categorize_batch(request: Request):
+    """
+    Categorize thousands of invoices or line items in one call.
+
+    The body is a JSON array of records (or {"records": [...]}), or NDJSON with
+    Content-Type application/x-ndjson. Each record needs an hsn_code and may
+    carry an id or invoice_id that is echoed back. All HSN/SAC codes are
+    resolved against the master in one vectorized pass.
+
+    Results stream back as NDJSON when the request accepts
+    application/x-ndjson, otherwise as {"results": [...], "summary": {...}}.
+    The summary reports the record count and throughput.
+    """
+    started = time.perf_counter()
+    body = await request.body()
+    # Parsing and categorizing run in the thread pool so other requests are
+    # served while a large batch is resolved
+    try:
+        records = await run_in_threadpool(_parse_batch, body, request.headers.get("content-type", ""))
+        if not all(isinstance(record, dict) for record in records):
+            raise ValueError("every record must be a JSON object")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch: {str(e)}")
+
+    try:
+        results = await run_in_threadpool(gst_categorization_service.categorize_batch, records)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    resolved = time.perf_counter()
+
+    def summary() -> Dict:
+        seconds = time.perf_counter() - started
+        return {
+            "records": len(records),
+            "unmatched": sum(result.matched_level is None for result in results),
+            "resolve_seconds": round(resolved - started, 6),
+            "total_seconds": round(seconds, 6),
+            "records_per_second": round(len(records) / seconds, 1) if seconds else None,
+        }
+
+    if "ndjson" in request.headers.get("accept", ""):
+        def ndjson():
+            for index, (record, result) in enumerate(zip(records, results)):
+                yield json.dumps(_batch_result(index, record, result)) + "\n"
+            yield json.dumps({"summary": summary()}) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    def document():
+        yield '{"results": ['
+        for index, (record, result) in enumerate(zip(records, results)):
+            yield ("," if index else "") + json.dumps(_batch_result(index, record, result))
+        yield '], "summary": ' + json.dumps(summary()) + '}'
+    return StreamingResponse(document(), media_type="application/json")
+
+async def _stream_records(request: Request) -> AsyncIterator[Dict]:
+    """Records of a JSON or NDJSON body; NDJSON is parsed line by line as it arrives"""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type and "jsonlines" not in content_type:
+        body = await request.body()
+        for record in await run_in_threadpool(_parse_batch, body, content_type):
+            yield record
+        return
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if buffer.strip():
+        yield json.loads(buffer)
+
+def _check_invoice(record) -> None:
+    """Raise ValueError unless a record has the shape GstReturnAggregator reads"""
+    if not isinstance(record, dict):
+        raise ValueError("every invoice must be a JSON object")
+    items = record.get("items")
+    if items is not None and not (isinstance(items, list) and all(isinstance(item, dict) for item in items)):
+        raise ValueError("items must be a list of JSON objects")
+    for name in ("gstin", "buyer_gstin"):
+        if record.get(name) is not None and not isinstance(record[name], str):
+            raise ValueError(f"{name} must be a string")
+
+@router.post("/returns")
+async def aggregate_gst_returns(
+    request: Request,
+    business_gstin: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|csv)$"),
+    section: str = Query("gstr3b"),
+    period: Optional[str] = None
+):
+    """
+    Aggregate invoices into GSTR-1 / GSTR-3B figures per return period.
+
+    The body is a JSON array of invoices (or {"records": [...]}), or NDJSON
+    with Content-Type application/x-ndjson, which is aggregated as it
+    streams in. Returns every section as JSON, or one section (b2b, b2c,
+    hsn, rates, gstr3b) as CSV.
+    """
+    if section not in SECTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown section {section}, expected one of {', '.join(SECTIONS)}")
+    aggregator = GstReturnAggregator(
+        business_gstin or settings.BUSINESS_GSTIN, categorization=gst_categorization_service
+    )
+    try:
+        # Aggregate in chunks in the thread pool, off the event loop
+        chunk = []
+        async for record in _stream_records(request):
+            _check_invoice(record)
+            chunk.append(record)
+            if len(chunk) >= RETURNS_CHUNK_SIZE:
+                await run_in_threadpool(aggregator.add_many, chunk)
+                chunk = []
+        await run_in_threadpool(aggregator.add_many, chunk)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid invoices: {str(e)}")
+
+    if format == "csv":
+        out = io.StringIO()
+        await run_in_threadpool(aggregator.write_csv, section, out, period)
+        return StreamingResponse(
+            iter([out.getvalue()]),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{section}{"-" + period if period else ""}.csv"'}
+        )
+    return await run_in_threadpool(aggregator.to_dict, period)
+
+@router.put("/filings/{period}")
+async def record_filing(period: str, filing: GstFiling):
+    """
+    Record when a period's GSTR-1 and GSTR-3B were filed (and the tax paid,
+    if not with the GSTR-3B); late fees and interest are calculated from
+    these dates. Dates already recorded are kept unless given again.
+    """
+    try:
+        datetime.strptime(period, "%Y-%m")
+        dates = filing.dict()
+        for value in dates.values():
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filing: {str(e)}")
+    return {"period": period, **record_gst_filing(settings.GST_FILINGS_PATH, period, dates)}
+
+def _gstin_result(check: GstinCheck) -> Dict:
+    return {
+        "gstin": check.gstin,
+        "valid": check.valid,
+        "errors": list(check.errors),
+        "state_code": check.state_code,
+        "state": check.state,
+        "pan": check.pan,
+        "holder_type": check.holder_type,
+        "entity_number": check.entity_number,
+    }
+
+@router.get("/gstin/{gstin}")
+async def check_gstin(gstin: str):
+    """
+    Validate a GSTIN (format and check character) and decompose it
+    """
+    return _gstin_result(validate_gstin(gstin))
+
+def _parse_gstins(body: bytes, content_type: str) -> List[str]:
+    """GSTINs of a JSON array / {"gstins": [...]} body, or the first column of a text or CSV body"""
+    if "json" in content_type:
+        payload = json.loads(body)
+        gstins = payload.get("gstins") if isinstance(payload, dict) else payload
+        if not isinstance(gstins, list):
+            raise ValueError('expected a JSON array or {"gstins": [...]}')
+        return [str(gstin) for gstin in gstins]
+    gstins = [line.split(",")[0].strip().strip('"') for line in body.decode("utf-8").splitlines() if line.strip()]
+    if gstins and gstins[0].lower() == "gstin":
+        gstins = gstins[1:]  # CSV header
+    return gstins
+
+@router.post("/validate-gstins")
+async def validate_gstin_batch(request: Request, invalid_only: bool = False):
+    """
+    Validate a vendor master's GSTINs in one vectorized pass.
+
+    The body is a JSON array of GSTINs (or {"gstins": [...]}), or plain
+    text / CSV with the GSTIN in the first column of each line (a "gstin"
+    header line is skipped). Results
+    stream back in input order, followed by a summary; with invalid_only
+    only the GSTINs that failed are listed.
+    """
+    started = time.perf_counter()
+    body = await request.body()
+    try:
+        gstins = await run_in_threadpool(_parse_gstins, body, request.headers.get("content-type", ""))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid GSTIN list: {str(e)}")
+
+    checks = await run_in_threadpool(validate_gstins, gstins)
+    valid = sum(check.valid for check in checks)
+    summary = {
+        "count": len(checks),
+        "valid": valid,
+        "invalid": len(checks) - valid,
+        "seconds": round(time.perf_counter() - started, 6),
+    }
+
+    def document():
+        yield '{"results": ['
+        first = True
+        for index, check in enumerate(checks):
+            if invalid_only and check.valid:
+                continue
+            yield ("" if first else ",") + json.dumps({"index": index, **_gstin_result(check)})
+            first = False
+        yield '], "summary": ' + json.dumps(summary) + '}'
+    return StreamingResponse(document(), media_type="application/json")
+
 @router.post("/reconcile", response_model=ReconciliationResponse)
 async def reconcile_invoice(
     invoice_data: InvoiceData,
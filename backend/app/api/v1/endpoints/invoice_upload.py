@@ -2,6 +2,7 @@
 
 import os
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from typing import List
 from sqlalchemy.orm import Session
 import magic  # for file type validation
@@ -55,7 +56,8 @@ async def upload_invoice(file: UploadFile = File(...), db: Session = Depends(get
 
         # Run Google Vision OCR + LayoutLMv3 pipeline
         try:
-            fields = run_google_vision_and_layoutlm(file_path)
+            # Off the event loop so concurrent uploads can share model batches
+            fields = await run_in_threadpool(run_google_vision_and_layoutlm, file_path)
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -6,11 +6,15 @@ import json
 import os
 from pathlib import Path
 import uuid
+import io
+from PIL import Image
 
-from app.services.ocr_service import run_ocr_on_file
+from app.services.ocr_engines import ENGINE_FACTORIES, get_ocr_router
+from app.services.extraction_cascade import run_cascade_on_file
 from app.services.gst_categorization import GSTCategorizationService
 from app.services.reconciliation import ReconciliationService
 from app.services.analytics import AnalyticsService
+from app.services.vendor_templates import TEMPLATE_FIELDS, get_template_store
 
 router = APIRouter()
 
@@ -358,8 +362,8 @@ async def process_invoice(invoice_id: int):
         }
             
         try:
-            # Run OCR
-            ocr_data = run_ocr_on_file(file_bytes)
+            # Run OCR, then regex extraction with model fallback for missing fields
+            ocr_data = run_cascade_on_file(file_bytes)
             
             # Update OCR results
             results["ocr"].update({
@@ -378,7 +382,7 @@ async def process_invoice(invoice_id: int):
                 "salesperson": ocr_data.get("salesperson", "N/A"),
                 "cashier": ocr_data.get("cashier", "N/A"),
                 "items": ocr_data.get("items", []),
-                "confidence": 95.5  # Confidence score from Google Vision API
+                "confidence": round(ocr_data.get("ocr_confidence", 0) * 100, 1)  # Mean word confidence from the OCR engine
             })
             
             # Update invoice with extracted data
@@ -388,7 +392,8 @@ async def process_invoice(invoice_id: int):
                 "amount": ocr_data.get("amount", 0),
                 "date": ocr_data.get("date"),
                 "gstin": ocr_data.get("gstin"),
-                "hsn_code": ocr_data.get("hsn_code")
+                "hsn_code": ocr_data.get("hsn_code"),
+                "ocr_engine": ocr_data.get("ocr_engine")
             })
         except Exception as e:
             print(f"Error in OCR processing: {str(e)}")
@@ -397,11 +402,27 @@ async def process_invoice(invoice_id: int):
         try:
             # Run GST categorization
             gst_result = gst_service.categorize_invoice(invoice)
+            # Line items carry their own codes and rates; tax is totalled per slab
+            line_items = gst_service.categorize_line_items({**invoice, "items": ocr_data.get("items", [])})
             results["gst"].update({
                 "gstin": invoice.get("gstin", "N/A"),  # Use GSTIN from invoice data, not from result
                 "hsn_code": gst_result.hsn_code,
                 "category": gst_result.category.value,
                 "tax_rate": gst_result.category.value,  # Use category value as tax rate
+                "items": [
+                    {
+                        "description": item.description,
+                        "hsn_code": item.result.hsn_code,
+                        "source": item.source,
+                        "category": item.result.category.value,
+                        "taxable_value": item.taxable_value,
+                        "tax": item.tax
+                    }
+                    for item in line_items.items
+                ],
+                "slabs": line_items.slabs,
+                "tax": line_items.tax,
+                "mapping_version": gst_result.mapping_version,
                 "status": "success"
             })
         except Exception as e:
@@ -462,6 +483,62 @@ async def process_invoice(invoice_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class FieldConfirmation(BaseModel):
+    # Field name (see vendor_templates.TEMPLATE_FIELDS) -> text exactly as printed on the invoice
+    fields: Dict[str, str]
+
+@router.post("/{invoice_id}/confirm-fields")
+async def confirm_fields(invoice_id: int, confirmation: FieldConfirmation, ocr_engine: Optional[str] = None):
+    """
+    Teach the vendor's layout template where the confirmed fields are printed.
+
+    Templates are kept per OCR engine. They are learned from ocr_engine's
+    words, by default the engine that processed the invoice (or the OCR
+    router's choice for invoices processed before engines were recorded).
+    """
+    unknown = sorted(set(confirmation.fields) - set(TEMPLATE_FIELDS))
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown template fields {', '.join(unknown)}, expected {', '.join(TEMPLATE_FIELDS)}"
+        )
+    invoice = next((inv for inv in load_invoices() if inv["id"] == invoice_id), None)
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    file_path = Path(invoice["file_path"])
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="Invoice file not found")
+
+    store = get_template_store()
+    if store is None:
+        raise HTTPException(status_code=409, detail="Vendor templates are disabled")
+
+    engine_name = ocr_engine or invoice.get("ocr_engine")
+    if engine_name and engine_name not in ENGINE_FACTORIES:
+        raise HTTPException(status_code=400, detail=f"Unknown OCR engine {engine_name}")
+
+    try:
+        file_bytes = file_path.read_bytes()
+        # Served from the OCR cache when the invoice was processed before
+        if engine_name:
+            ocr = ENGINE_FACTORIES[engine_name]().run(file_bytes)
+        else:
+            routed = get_ocr_router().recognize(file_bytes)
+            ocr, engine_name = routed.result, routed.engine
+        page_size = Image.open(io.BytesIO(file_bytes)).size
+        template = store.learn(ocr.words, ocr.boxes, page_size, confirmation.fields, engine_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Template learning failed: {str(e)}")
+    if template is None:
+        raise HTTPException(status_code=422, detail="Could not identify the vendor from the invoice layout")
+
+    return {
+        "vendor_key": template.vendor_key,
+        "ocr_engine": template.ocr_engine,
+        "samples": template.samples,
+        "fields": sorted(template.regions),
+    }
+
 # Initialize with some sample data if empty
 if not INVOICES_DB.exists():
     sample_invoices = [
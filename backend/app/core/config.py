@@ -9,11 +9,92 @@ This module contains application-wide configuration settings:
 
 Author: Shared
 """
+from typing import Optional
+
 from pydantic_settings import BaseSettings  # ✅ correct for Pydantic v2
 
 
 class Settings(BaseSettings):
     SQLALCHEMY_DATABASE_URI: str = "sqlite:///./invoices.db"  # or your Postgres URI
+
+    # OCR batching: images per detector batch, text crops per recognizer pass
+    OCR_BATCH_SIZE: int = 8
+    OCR_RECOGNIZER_BATCH_SIZE: int = 32
+    # Images whose height/width ratios round to the same multiple of this
+    # share a detector batch (resized to a common size for it)
+    OCR_ASPECT_BUCKET: float = 0.1
+
+    # Persistent OCR result cache
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_DIR: str = "data/ocr_cache"
+    OCR_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # OCR engine routing: comma-separated engines (easyocr, tesseract,
+    # google-vision), per-document latency budget in seconds and the mean
+    # word confidence below which a slower engine is tried
+    OCR_ENGINES: str = "easyocr"
+    OCR_LATENCY_BUDGET: float = 10.0
+    OCR_CONFIDENCE_THRESHOLD: float = 0.6
+    GOOGLE_VISION_ENDPOINT: Optional[str] = None  # e.g. "127.0.0.1:8085" for the fake Vision server
+    # Images per batch_annotate_images call (the API accepts at most 16) and
+    # concurrent Vision requests per process
+    GOOGLE_VISION_BATCH_SIZE: int = 16
+    GOOGLE_VISION_MAX_CONCURRENCY: int = 4
+
+    # LayoutLMv3 field extraction: fine-tuned model directory and runtime
+    # (torch, torch-int8, onnx, onnx-int8; see app/services/layoutlm_backends.py)
+    LAYOUTLM_MODEL_DIR: str = "models/layoutlmv3-sroie"
+    LAYOUTLM_BACKEND: str = "torch"
+    LAYOUTLM_BATCH_SIZE: int = 8  # documents per forward pass, padded to the longest in each
+    LAYOUTLM_WINDOW_STRIDE: int = 128  # overlapping tokens between windows of long documents
+    # Batch concurrent extraction requests: wait up to this long for more
+    # requests (at most LAYOUTLM_BATCH_SIZE) before running a forward pass
+    LAYOUTLM_MICROBATCH: bool = True
+    LAYOUTLM_MAX_BATCH_WAIT_MS: float = 5.0
+
+    # Vendor layout templates learned from confirmed extractions: used for
+    # vendors with TEMPLATE_MIN_SAMPLES confirmed invoices when the page
+    # matches with TEMPLATE_MIN_CONFIDENCE, otherwise LayoutLMv3 runs
+    VENDOR_TEMPLATES: bool = True
+    VENDOR_TEMPLATES_PATH: str = "data/vendor_templates.json"
+    TEMPLATE_MIN_SAMPLES: int = 2
+    TEMPLATE_MIN_CONFIDENCE: float = 0.8
+
+    # Share model weights between worker processes: memory-map the FP32
+    # LayoutLMv3 safetensors checkpoint, and/or load models in the gunicorn
+    # master before forking (see gunicorn.conf.py)
+    MODEL_WEIGHTS_MMAP: bool = False
+    PRELOAD_MODELS: bool = False
+
+    # Model manager: cap on memory held by loaded models (0 for no cap) and
+    # unloading of models unused for MODEL_IDLE_SECONDS (0 to keep them; idle
+    # unloading also drops weights shared by PRELOAD_MODELS)
+    MODEL_MAX_BYTES: int = 4 * 1024 ** 3
+    MODEL_IDLE_SECONDS: float = 0
+
+    # GST line items without an HSN/SAC code are matched to the master on
+    # their description (TF-IDF search, see app/services/hsn_search.py):
+    # similarity needed to accept a match, candidates suggested per item, and
+    # descriptions whose candidates are memoized
+    HSN_DESCRIPTION_MIN_SCORE: float = 0.3
+    HSN_SUGGESTIONS: int = 5
+    HSN_DESCRIPTION_CACHE_SIZE: int = 4096
+    # Seconds between checks of app/data/hsn_mapping.json for rate changes
+    # (0 to load it once per process)
+    HSN_RELOAD_SECONDS: float = 30.0
+
+    # GSTIN of the filing business: its state code splits return tax into
+    # CGST/SGST (intra-state) or IGST (inter-state)
+    BUSINESS_GSTIN: Optional[str] = None
+    # GSTINs whose validation is memoized (see app/services/gstin.py)
+    GSTIN_CACHE_SIZE: int = 65536
+    # GSTR-1/GSTR-3B filing dates per return period, which late fees and
+    # interest are calculated from (see app/services/gst_penalties.py)
+    GST_FILINGS_PATH: str = "data/gst_filings.json"
+
+    # Load models in the background at startup instead of on first request
+    WARMUP_MODELS: bool = False
+    WARMUP_COMPONENTS: str = "ocr,layoutlm"
     # other settings like:
     # ENV: str = "development"
     # DEBUG: bool = True
@@ -10,20 +10,52 @@ This module serves as the main entry point for the FastAPI application:
 
 Author: Shared
 """
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import logging
+from app.api.gst import router as gst_router
 from app.api.v1.endpoints.invoices import router as invoices_router
+from app.core.config import settings
+from app.services.extraction_cascade import cascade_stats
+from app.services.gstin import gstin_cache_info
+from app.services.hsn_master import hsn_mapping_stats
+from app.services.invoice_extraction import get_inference_scheduler, shutdown_inference_scheduler
+from app.services.model_manager import get_model_manager
+from app.services.ocr_engines import close_vision_client, get_vision_client
+from app.services.vendor_templates import get_template_store
+from app.services.warmup import readiness, start_background_warmup
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+def _warmup_components():
+    return [name.strip() for name in settings.WARMUP_COMPONENTS.split(",") if name.strip()]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load lazily on first use; optionally start loading them in the
+    # background so the worker serves light traffic while they warm up
+    if settings.WARMUP_MODELS:
+        logger.info("Starting background model warm-up")
+        start_background_warmup(_warmup_components())
+    if settings.GOOGLE_VISION_ENDPOINT or "google-vision" in settings.OCR_ENGINES:
+        # One Vision channel for the worker's lifetime instead of one per request
+        try:
+            get_vision_client()
+        except Exception as e:
+            logger.warning(f"Google Vision client not created: {str(e)}")
+    yield
+    shutdown_inference_scheduler()
+    close_vision_client()
+
 # Create FastAPI app
 app = FastAPI(
     title="NexusAI API",
     description="AI-powered finance automation platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -42,6 +74,7 @@ app.add_middleware(
 
 # Include routers
 app.include_router(invoices_router, prefix="/api/v1/invoices", tags=["Invoices"])
+app.include_router(gst_router, prefix="/api/v1")
 
 @app.get("/")
 async def root():
@@ -55,4 +88,28 @@ async def root():
 @app.get("/test")
 async def test():
     logger.debug("Test endpoint called")
-    return {"status": "API is working"}
\ No newline at end of file
+    return {"status": "API is working"}
+
+@app.get("/ready")
+async def ready(response: Response):
+    """
+    Report whether the OCR reader and extraction models are loaded.
+    Returns 503 while a startup warm-up is still running or has failed.
+    """
+    status = readiness(_warmup_components())
+    status["warmup"] = settings.WARMUP_MODELS
+    if settings.WARMUP_MODELS and not status["ready"]:
+        response.status_code = 503
+    return status
+
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters for capacity planning"""
+    return {
+        "layoutlm_scheduler": get_inference_scheduler().stats() if settings.LAYOUTLM_MICROBATCH else None,
+        "models": get_model_manager().stats(),
+        "extraction_cascade": cascade_stats(),
+        "vendor_templates": store.stats() if (store := get_template_store()) else None,
+        "hsn_mapping": hsn_mapping_stats(),
+        "gstin_cache": gstin_cache_info()._asdict(),
+    }
@@ -1,11 +1,17 @@
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 import logging
 from datetime import datetime, timedelta
-import numpy as np
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
+
+from app.core.config import settings
+from app.services.gst_penalties import GstPenaltyCalculator, PeriodPenalty, load_gst_filings
+from app.services.gst_returns import GstReturnAggregator
+
+# numpy and scikit-learn are imported where they are used so that importing
+# the API does not pay for them until analytics actually run
+if TYPE_CHECKING:
+    import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -60,11 +66,29 @@ class GSTComplianceAnalysis:
 
 class AnalyticsService:
     def __init__(self):
-        self.fraud_detector = IsolationForest(
-            contamination=0.1,
-            random_state=42
-        )
-        self.scaler = StandardScaler()
+        self._fraud_detector = None
+        self._scaler = None
+        # Keeps the penalties of closed return periods between dashboard loads
+        self._penalty_calculator = GstPenaltyCalculator()
+
+    @property
+    def fraud_detector(self):
+        """Isolation Forest used for anomaly scoring (created on first use)"""
+        if self._fraud_detector is None:
+            from sklearn.ensemble import IsolationForest
+            self._fraud_detector = IsolationForest(
+                contamination=0.1,
+                random_state=42
+            )
+        return self._fraud_detector
+
+    @property
+    def scaler(self):
+        """Feature scaler for anomaly scoring (created on first use)"""
+        if self._scaler is None:
+            from sklearn.preprocessing import StandardScaler
+            self._scaler = StandardScaler()
+        return self._scaler
         
     def detect_fraud(self, invoice_data: Dict, historical_data: List[Dict]) -> FraudDetectionResult:
         """
@@ -126,6 +150,8 @@ class AnalyticsService:
         Returns:
             List of CashFlowPrediction objects
         """
+        import numpy as np
+
         predictions = []
         
         # Prepare historical data
@@ -167,8 +193,10 @@ class AnalyticsService:
         self,
         invoice_data: Dict,
         historical_data: List[Dict]
-    ) -> np.ndarray:
+    ) -> "np.ndarray":
         """Extract features for fraud detection"""
+        import numpy as np
+
         features = []
         
         # Amount-based features - handle None values safely
@@ -194,7 +222,7 @@ class AnalyticsService:
         
         return np.array(features).reshape(1, -1)
         
-    def _calculate_anomaly_score(self, features: np.ndarray) -> float:
+    def _calculate_anomaly_score(self, features: "np.ndarray") -> float:
         """Calculate anomaly score using Isolation Forest"""
         # Scale features
         scaled_features = self.scaler.fit_transform(features)
@@ -240,6 +268,8 @@ class AnalyticsService:
         historical_data: List[Dict]
     ) -> bool:
         """Check for abnormal invoice amounts"""
+        import numpy as np
+
         amount_raw = invoice_data.get('amount', 0)
         try:
             amount = float(amount_raw) if amount_raw is not None else 0.0
@@ -269,6 +299,8 @@ class AnalyticsService:
         historical_data: List[Dict]
     ) -> bool:
         """Check for suspicious vendor patterns"""
+        import numpy as np
+
         vendor_gstin = invoice_data.get('gstin')
         vendor_history = [d for d in historical_data if d.get('gstin') == vendor_gstin]
         
@@ -331,6 +363,8 @@ class AnalyticsService:
         
     def _calculate_moving_average(self, amounts: List[float], window: int = 7) -> float:
         """Calculate moving average of amounts"""
+        import numpy as np
+
         if len(amounts) < window:
             return np.mean(amounts)
             
@@ -431,8 +465,11 @@ class AnalyticsService:
             GSTComplianceAnalysis containing GST compliance insights
         """
         try:
+            # Aggregate the invoices into return periods in one pass
+            returns = GstReturnAggregator(settings.BUSINESS_GSTIN).add_many(invoices)
+
             # Calculate GST metrics
-            total_gst_collected = sum(float(inv.get('gst_amount', 0)) for inv in invoices if inv.get('gst_amount'))
+            total_gst_collected = returns.total_tax()
             total_gst_paid = 0  # In a real system, this would be from input tax credits
             net_gst_liability = total_gst_collected - total_gst_paid
             
@@ -442,11 +479,17 @@ class AnalyticsService:
             # Determine compliance status
             compliance_status = self._determine_gst_compliance_status(compliance_score, invoices)
             
+            # Late fees and interest per return period, from its filing dates
+            period_penalties = self._penalty_calculator.calculate(
+                {row['period']: row['total_tax'] for row in returns.rows("gstr3b")},
+                load_gst_filings(settings.GST_FILINGS_PATH)
+            )
+            
             # Generate GST returns due
-            gst_returns_due = self._generate_gst_returns_due(invoices)
+            gst_returns_due = self._generate_gst_returns_due(returns, period_penalties)
             
             # Identify potential penalties
-            gst_penalties = self._identify_gst_penalties(invoices)
+            gst_penalties = self._identify_gst_penalties(period_penalties)
             
             # Generate recommendations
             gst_recommendations = self._generate_gst_recommendations(invoices, compliance_score)
@@ -601,6 +644,8 @@ class AnalyticsService:
     
     def _generate_cash_flow_forecast(self, invoices: List[Dict]) -> List[CashFlowPrediction]:
         """Generate cash flow forecast for next 3 months"""
+        import numpy as np
+
         if len(invoices) < 3:
             return []
         
@@ -764,61 +809,65 @@ class AnalyticsService:
         else:
             return GSTComplianceStatus.PENDING
     
-    def _generate_gst_returns_due(self, invoices: List[Dict]) -> List[Dict[str, any]]:
+    def _generate_gst_returns_due(
+        self, returns: GstReturnAggregator, period_penalties: List[PeriodPenalty]
+    ) -> List[Dict[str, any]]:
         """Generate list of GST returns due"""
         returns_due = []
+        statuses = {penalty.period: penalty.status for penalty in period_penalties}
         
-        # In a real system, this would check actual GST return filing dates
-        # For now, we'll generate mock data based on invoice dates
-        monthly_gst = {}
-        for inv in invoices:
-            date_str = inv.get('date', '')
-            if date_str:
-                try:
-                    if isinstance(date_str, str):
-                        date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                    else:
-                        date_obj = date_str
-                    month_key = date_obj.strftime("%Y-%m")
-                    gst_amount = float(inv.get('gst_amount', 0))
-                    monthly_gst[month_key] = monthly_gst.get(month_key, 0) + gst_amount
-                except (ValueError, TypeError):
-                    continue
-        
-        for month, gst_amount in monthly_gst.items():
+        for period in returns.rows("gstr3b"):
+            status = statuses.get(period['period'], 'open')
             returns_due.append({
-                'period': month,
-                'gst_amount': gst_amount,
-                'due_date': f"{month}-20",  # Mock due date
-                'status': 'pending'
+                'period': period['period'],
+                'gst_amount': period['total_tax'],
+                'taxable_value': period['taxable_value'],
+                'igst': period['igst'],
+                'cgst': period['cgst'],
+                'sgst': period['sgst'],
+                'gstr1_due_date': period['gstr1_due'],
+                'due_date': period['gstr3b_due'],  # GSTR-3B, when the tax is paid
+                'status': {'open': 'pending', 'filed_late': 'filed'}.get(status, status)
             })
         
         return returns_due
     
-    def _identify_gst_penalties(self, invoices: List[Dict]) -> List[Dict[str, any]]:
-        """Identify potential GST penalties"""
+    def _identify_gst_penalties(self, period_penalties: List[PeriodPenalty]) -> List[Dict[str, any]]:
+        """Summarize late fees and interest, one entry per return period that owes any"""
         penalties = []
         
-        # Check for late filing (mock implementation)
-        for inv in invoices:
-            date_str = inv.get('date', '')
-            if date_str:
-                try:
-                    if isinstance(date_str, str):
-                        date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                    else:
-                        date_obj = date_str
-                    
-                    # Mock penalty check - if invoice is older than 30 days without GST filing
-                    if (datetime.now() - date_obj).days > 30:
-                        penalties.append({
-                            'type': 'Late GST Filing',
-                            'amount': 1000,  # Mock penalty amount
-                            'description': f'GST return for {date_obj.strftime("%Y-%m")} is overdue',
-                            'severity': 'medium'
-                        })
-                except (ValueError, TypeError):
-                    continue
+        for penalty in period_penalties:
+            if not penalty.total:
+                continue
+            late = [
+                f"{name.upper()} {days} days"
+                for name, days in penalty.days_late.items() if days
+            ]
+            if penalty.status == 'overdue':
+                description = f"GST return for {penalty.period} is overdue ({', '.join(late)})"
+            elif not late:
+                # Returns filed on time, tax paid after the GSTR-3B due date
+                description = f"GST for {penalty.period} was paid late (interest Rs {penalty.interest:,.2f})"
+            else:
+                description = f"GST return for {penalty.period} was filed late ({', '.join(late)})"
+            
+            if penalty.total >= 10000:
+                severity = 'high'
+            elif penalty.total >= 1000:
+                severity = 'medium'
+            else:
+                severity = 'low'
+            
+            penalties.append({
+                'type': 'Late GST Filing' if penalty.late_fee else 'Late GST Payment',
+                'period': penalty.period,
+                'amount': penalty.total,
+                'late_fee': penalty.late_fee,
+                'interest': penalty.interest,
+                'status': penalty.status,
+                'description': description,
+                'severity': severity
+            })
         
         return penalties
     
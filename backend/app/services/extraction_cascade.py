@@ -0,0 +1,170 @@
+"""
+Extraction Cascade
+
+This module extracts invoice fields with the cheapest tier that validates:
+- Tier 1: regex and word-geometry extraction from the OCR text
+- Tier 2: the vendor's layout template, when one matches
+- Tier 3: LayoutLMv3, run only when a field it can supply is missing or
+  fails the checks of validation.field_errors
+- Counters of which tier resolved each document
+
+Author: Dev 1
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+import io
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+from PIL import Image
+
+from app.services.ocr_service import OcrResult, extract_invoice_from_ocr
+from app.services.validation import field_errors
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("regex", "template", "layoutlm", "unresolved")
+
+# Regex extractor keys -> validated invoice fields
+REGEX_FIELDS = {
+    "invoice_number": "invoice_number",
+    "date": "invoice_date",
+    "gstin": "gstin",
+    "amount": "total",
+    "vendor": "vendor_name",
+}
+
+# LayoutLMv3 (SROIE labels) fields -> validated invoice fields
+MODEL_FIELDS = {
+    "company": "vendor_name",
+    "date": "invoice_date",
+    "total": "total",
+}
+
+
+@dataclass
+class CascadeResult:
+    fields: Dict[str, str]  # validated invoice fields
+    tier: str  # the tier that resolved the document, see TIERS
+    errors: List[str]  # validation errors left after the last tier
+    data: Dict[str, Any] = field(default_factory=dict)  # regex extractor output, updated with model fields
+
+
+_lock = threading.Lock()
+_resolved_by: Counter = Counter()
+_regex_failures: Counter = Counter()  # invoice field -> documents where the regex tier failed it
+
+
+def invoice_fields(data: Dict[str, Any]) -> Dict[str, str]:
+    """Map regex extractor output to the invoice fields validation checks"""
+    fields = {}
+    for key, name in REGEX_FIELDS.items():
+        value = data.get(key)
+        if value is None:
+            continue
+        fields[name] = f"{value:.2f}" if isinstance(value, float) else str(value)
+    return fields
+
+
+def _amount(text: str) -> Any:
+    """Model total as a number like the regex extractor's, or the raw text"""
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return text
+
+
+def _model_tier(image: Image.Image, ocr: OcrResult, ocr_engine: str) -> Tuple[str, Dict[str, str]]:
+    """Fields from the vendor template, or from LayoutLMv3 when no template matches"""
+    from app.services.invoice_extraction import model_fields, template_fields
+
+    fields = template_fields(image, ocr.words, ocr.boxes, ocr_engine)
+    if fields is not None:
+        return "template", fields
+    return "layoutlm", model_fields(image, ocr.words, ocr.boxes)
+
+
+def run_cascade(ocr: OcrResult, load_image: Callable[[], Image.Image], ocr_engine: str) -> CascadeResult:
+    """
+    Extract invoice fields, escalating to the model tiers only when needed
+
+    Args:
+        ocr: Words, boxes and confidences of the invoice page
+        load_image: Returns the RGB page image (only called for the model tiers)
+        ocr_engine: Engine that produced ocr (picks its vendor templates)
+
+    Returns:
+        CascadeResult with the fields and the tier that resolved them
+    """
+    data = extract_invoice_from_ocr(ocr)
+    fields = invoice_fields(data)
+    errors = field_errors(fields)
+    # Only fields the model can supply are worth a forward pass
+    needed = [name for name in errors if name in MODEL_FIELDS.values()]
+
+    tier = "regex"
+    if needed:
+        try:
+            tier, predicted = _model_tier(load_image(), ocr, ocr_engine)
+        except Exception as e:
+            logger.warning(f"⚠️ Model extraction failed, keeping regex fields: {str(e)}")
+            predicted = {}
+        for key, name in MODEL_FIELDS.items():
+            if name in needed and predicted.get(key):
+                fields[name] = predicted[key]
+        errors = field_errors(fields)
+        if any(name in MODEL_FIELDS.values() for name in errors):
+            tier = "unresolved"
+
+        # Write model fields back under the regex extractor's keys
+        for key, name in REGEX_FIELDS.items():
+            if name in needed and name in fields and name not in errors:
+                data[key] = _amount(fields[name]) if key == "amount" else fields[name]
+
+    with _lock:
+        _resolved_by[tier] += 1
+        _regex_failures.update(needed)
+    logger.info(f"✅ Fields resolved by the {tier} tier")
+
+    return CascadeResult(
+        fields=fields,
+        tier=tier,
+        errors=[error for messages in errors.values() for error in messages],
+        data=data
+    )
+
+
+def run_cascade_on_file(file_bytes: bytes) -> Dict[str, Any]:
+    """
+    OCR an invoice image and extract its data through the cascade
+
+    Returns:
+        Regex extractor data (see ocr_service.extract_invoice_data) with fields
+        filled in by the model tiers, plus the OCR engine, confidence and the
+        resolving tier
+    """
+    from app.services.ocr_engines import get_ocr_router
+
+    routed = get_ocr_router().recognize(file_bytes)
+    if not routed.result.words:
+        raise Exception("No text detected in the image")
+
+    result = run_cascade(routed.result, lambda: Image.open(io.BytesIO(file_bytes)).convert("RGB"), routed.engine)
+    data = result.data
+    data["ocr_engine"] = routed.engine
+    data["ocr_confidence"] = routed.confidence
+    data["extraction_tier"] = result.tier
+    return data
+
+
+def cascade_stats() -> Dict[str, Any]:
+    """Documents resolved by each tier and the fields that sent documents past the regex tier"""
+    with _lock:
+        documents = sum(_resolved_by.values())
+        return {
+            "documents": documents,
+            "resolved_by": {tier: _resolved_by[tier] for tier in TIERS},
+            "model_invocations": documents - _resolved_by["regex"],
+            "regex_field_failures": dict(_regex_failures),
+        }
@@ -1,9 +1,14 @@
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
-import json
+from functools import lru_cache
 import logging
-import os
+
+from app.core.config import settings
+from app.services.hsn_index import HsnMatch, normalize_code
+from app.services.hsn_master import HsnMapping, get_hsn_mapping
+from app.services.hsn_search import description_tokens
+from app.services.validation import parse_invoice_date
 
 logger = logging.getLogger(__name__)
 
@@ -22,67 +27,216 @@ class GSTCategorizationResult:
     hsn_code: str
     confidence_score: float
     validation_notes: List[str]
+    matched_code: str = ""  # master code the HSN code resolved to
+    matched_level: Optional[str] = None  # chapter, heading, subheading or tariff_item
+    mapping_version: str = ""  # HSN mapping version the result was computed with
+
+@dataclass
+class LineItemCategorization:
+    description: str
+    result: GSTCategorizationResult
+    source: str  # what the code came from: "hsn_code", "description" or "none"
+    taxable_value: float
+    tax: float
+    # (code, similarity) candidates for items without an HSN/SAC code
+    suggestions: List[Tuple[str, float]] = field(default_factory=list)
+
+@dataclass
+class InvoiceCategorization:
+    items: List[LineItemCategorization]
+    # GST category (or UNCLASSIFIED) -> {"items", "taxable_value", "tax"}
+    slabs: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    taxable_value: float = 0.0
+    tax: float = 0.0
+    mapping_version: str = ""
+
+# Tax rate (percent) of each GST category
+TAX_RATES = {
+    GSTCategory.NIL: 0.0,
+    GSTCategory.EXEMPT: 0.0,
+    GSTCategory.ZERO: 0.0,
+    GSTCategory.FIVE: 5.0,
+    GSTCategory.TWELVE: 12.0,
+    GSTCategory.EIGHTEEN: 18.0,
+    GSTCategory.TWENTY_EIGHT: 28.0,
+}
+
+# Slab of line items whose code (or description) resolves to nothing in the
+# master: their rate is unknown, so they are not rolled into NIL
+UNCLASSIFIED = "UNCLASSIFIED"
 
 class GSTCategorizationService:
     def __init__(self):
-        self.hsn_mapping = self._load_hsn_mapping()
-        
-    def _load_hsn_mapping(self) -> Dict[str, Dict]:
-        """Load HSN code mapping from JSON file"""
-        try:
-            # Get the absolute path to the data directory
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            data_dir = os.path.join(os.path.dirname(current_dir), 'data')
-            mapping_file = os.path.join(data_dir, 'hsn_mapping.json')
-            
-            if not os.path.exists(mapping_file):
-                logger.warning(f"HSN mapping file not found at {mapping_file}")
-                return {}
-                
-            with open(mapping_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading HSN mapping: {str(e)}")
-            return {}
+        # Memory-mapped once per process and shared by every instance; each
+        # call takes the current version once (see hsn_master.HsnMapping)
+        get_hsn_mapping()
+        # The same item descriptions repeat across invoices: memoize
+        # candidates on (mapping version, normalized description)
+        self._suggestions = lru_cache(maxsize=settings.HSN_DESCRIPTION_CACHE_SIZE)(self._search_descriptions)
+        self._suggestions_generation = 0
+
+    @property
+    def hsn_index(self):
+        """Master of the current HSN mapping version"""
+        return get_hsn_mapping().master
             
     def categorize_invoice(self, invoice_data: Dict) -> GSTCategorizationResult:
         """
         Categorize an invoice based on its data and HSN/SAC codes
         """
+        mapping = get_hsn_mapping()
+        hsn_code = invoice_data.get('hsn_code')
+        # Longest-prefix match: rates are defined at chapter, heading,
+        # subheading and tariff item level
+        match = mapping.master.lookup(hsn_code) if hsn_code else None
+        return self._categorize(invoice_data, match, mapping)
+        
+    def categorize_batch(self, records: List[Dict]) -> List[GSTCategorizationResult]:
+        """
+        Categorize many invoices or line items, resolving all their HSN/SAC
+        codes against the master in one pass
+        """
+        mapping = get_hsn_mapping()
+        matches = mapping.master.lookup_many([str(record.get('hsn_code') or '') for record in records])
+        return [self._categorize(record, match, mapping) for record, match in zip(records, matches)]
+        
+    def categorize_line_items(self, invoice_data: Dict) -> InvoiceCategorization:
+        """
+        Categorize each line item of an invoice and roll the tax up per rate slab.
+
+        Items without an HSN/SAC code are matched to the master on their
+        description. An invoice without line items is categorized as one
+        item carrying its hsn_code and amount. Items are rated as of the
+        invoice date. Items that resolve to no master code go in the
+        UNCLASSIFIED slab.
+        """
+        items = invoice_data.get('items') or [{
+            'description': '',
+            'hsn_code': invoice_data.get('hsn_code'),
+            'amount': invoice_data.get('amount', invoice_data.get('total_amount')),
+        }]
+        invoice_date = invoice_data.get('invoice_date') or invoice_data.get('date')
+        items = [{'date': invoice_date, **item} for item in items]
+        mapping = get_hsn_mapping()
+        matches = mapping.master.lookup_many([str(item.get('hsn_code') or '') for item in items])
+
+        categorization = InvoiceCategorization(items=[], mapping_version=mapping.version)
+        for item, match in zip(items, matches):
+            description = item.get('description') or ''
+            suggestions = []
+            if item.get('hsn_code'):
+                source = "hsn_code"
+                result = self._categorize(item, match, mapping)
+            else:
+                suggestions = self.suggest_hsn_codes(description, mapping)
+                if not suggestions or suggestions[0][1] < settings.HSN_DESCRIPTION_MIN_SCORE:
+                    source = "none"
+                    result = self._categorize(item, None, mapping)
+                else:
+                    source = "description"
+                    code, score = suggestions[0]
+                    result = self._categorize(
+                        {**item, 'hsn_code': code}, mapping.master.lookup(code), mapping, code_from_description=True
+                    )
+                    result.confidence_score = round(result.confidence_score * score, 3)
+                    result.validation_notes = [
+                        f"No HSN code; matched description to {result.matched_level} {code} (similarity {score:.2f})"
+                    ]
+
+            taxable_value = self._item_amount(item)
+            tax = round(taxable_value * TAX_RATES[result.category] / 100, 2)
+            categorization.items.append(
+                LineItemCategorization(description, result, source, taxable_value, tax, suggestions)
+            )
+
+            slab_key = UNCLASSIFIED if result.matched_level is None else result.category.value
+            slab = categorization.slabs.setdefault(slab_key, {"items": 0, "taxable_value": 0.0, "tax": 0.0})
+            slab["items"] += 1
+            slab["taxable_value"] = round(slab["taxable_value"] + taxable_value, 2)
+            slab["tax"] = round(slab["tax"] + tax, 2)
+
+        categorization.taxable_value = round(sum(item.taxable_value for item in categorization.items), 2)
+        categorization.tax = round(sum(item.tax for item in categorization.items), 2)
+        return categorization
+
+    def suggest_hsn_codes(self, description: str, mapping: Optional[HsnMapping] = None) -> List[Tuple[str, float]]:
+        """
+        Up to HSN_SUGGESTIONS (code, similarity) candidates for a free-text
+        item description, best first
+        """
+        mapping = mapping or get_hsn_mapping()
+        if mapping.generation > self._suggestions_generation:
+            # A new mapping version was swapped in: drop the old version's candidates
+            self._suggestions_generation = mapping.generation
+            self._suggestions.cache_clear()
+        return list(self._suggestions(mapping, " ".join(description_tokens(description))))
+
+    def _search_descriptions(self, mapping: HsnMapping, normalized: str) -> Tuple[Tuple[str, float], ...]:
+        """Candidates for a normalized description (memoized as _suggestions)"""
+        if not normalized:
+            return ()
+        return tuple(mapping.descriptions.search(normalized, settings.HSN_SUGGESTIONS))
+
+    def _item_amount(self, item: Dict) -> float:
+        """Taxable value of a line item: its amount, else quantity x rate"""
+        try:
+            if item.get('amount') is not None:
+                return float(item['amount'])
+            if item.get('quantity') is not None and item.get('rate') is not None:
+                return round(float(item['quantity']) * float(item['rate']), 2)
+        except (TypeError, ValueError):
+            pass
+        return 0.0
+
+    def _categorize(
+        self, invoice_data: Dict, match: Optional[HsnMatch], mapping: HsnMapping, code_from_description: bool = False
+    ) -> GSTCategorizationResult:
         validation_notes = []
-        confidence_score = 0.0
         
         # Extract HSN code from invoice data
-        hsn_code = invoice_data.get('hsn_code')
+        hsn_code = str(invoice_data.get('hsn_code') or '')
         if not hsn_code:
             validation_notes.append("No HSN code found in invoice")
             return GSTCategorizationResult(
                 category=GSTCategory.NIL,
                 hsn_code="",
                 confidence_score=0.0,
-                validation_notes=validation_notes
+                validation_notes=validation_notes,
+                mapping_version=mapping.version
             )
             
-        # Look up HSN code in mapping
-        hsn_info = self.hsn_mapping.get(hsn_code)
-        if not hsn_info:
+        if not match:
             validation_notes.append(f"HSN code {hsn_code} not found in mapping")
             return GSTCategorizationResult(
                 category=GSTCategory.NIL,
                 hsn_code=hsn_code,
                 confidence_score=0.0,
-                validation_notes=validation_notes
+                validation_notes=validation_notes,
+                mapping_version=mapping.version
             )
+        if not match.exact:
+            validation_notes.append(f"HSN code {hsn_code} matched {match.level} {match.code}")
+        hsn_info = match.info
+
+        # Back-dated invoices take the rate in force on the invoice date
+        invoice_date = parse_invoice_date(invoice_data.get('invoice_date') or invoice_data.get('date'))
+        dated = mapping.rates.resolve(match.query, match.code, invoice_date) if invoice_date else None
+        if dated and dated[1] != hsn_info.get('default_category'):
+            hsn_info = {**hsn_info, 'default_category': dated[1]}
+            validation_notes.append(f"Rate for {dated[0]} on {invoice_date.isoformat()} was {dated[1]}")
             
         # Determine GST category
         category = self._determine_category(hsn_info, invoice_data)
-        confidence_score = self._calculate_confidence_score(hsn_info, invoice_data)
+        confidence_score = self._calculate_confidence_score(hsn_info, invoice_data, mapping, code_from_description)
         
         return GSTCategorizationResult(
             category=category,
             hsn_code=hsn_code,
             confidence_score=confidence_score,
-            validation_notes=validation_notes
+            validation_notes=validation_notes,
+            matched_code=match.code,
+            matched_level=match.level,
+            mapping_version=mapping.version
         )
         
     def _determine_category(self, hsn_info: Dict, invoice_data: Dict) -> GSTCategory:
@@ -98,15 +252,22 @@ class GSTCategorizationService:
             
         return category
         
-    def _calculate_confidence_score(self, hsn_info: Dict, invoice_data: Dict) -> float:
+    def _calculate_confidence_score(
+        self,
+        hsn_info: Dict,
+        invoice_data: Dict,
+        mapping: Optional[HsnMapping] = None,
+        code_from_description: bool = False
+    ) -> float:
         """Calculate confidence score for the categorization"""
         score = 0.0
         
         # Base score from HSN mapping reliability
         score += hsn_info.get('reliability_score', 0.0)
         
-        # Additional points for matching conditions
-        if self._has_matching_description(hsn_info, invoice_data):
+        # Additional points for matching conditions (a code suggested from the
+        # description trivially matches it, so that earns nothing)
+        if not code_from_description and self._has_matching_description(hsn_info, invoice_data, mapping):
             score += 0.2
         if self._has_matching_amount_range(hsn_info, invoice_data):
             score += 0.3
@@ -121,8 +282,27 @@ class GSTCategorizationService:
         """Check if invoice qualifies for zero rating"""
         return False
         
-    def _has_matching_description(self, hsn_info: Dict, invoice_data: Dict) -> bool:
+    def _has_matching_description(
+        self, hsn_info: Dict, invoice_data: Dict, mapping: Optional[HsnMapping] = None
+    ) -> bool:
         """Check if invoice description matches HSN description"""
+        # A description matches when one of its suggested codes is on the
+        # same branch of the code hierarchy as the invoice's HSN code
+        code = normalize_code(invoice_data.get('hsn_code') or '')
+        if not code:
+            return False
+        items = invoice_data.get('items') or []
+        descriptions = [invoice_data.get('description')] + [
+            item.get('description') for item in items if isinstance(item, dict)
+        ]
+        for description in descriptions:
+            if not description:
+                continue
+            for suggested, score in self.suggest_hsn_codes(description, mapping):
+                if score < settings.HSN_DESCRIPTION_MIN_SCORE:
+                    break
+                if code.startswith(suggested) or suggested.startswith(code):
+                    return True
         return False
         
     def _has_matching_amount_range(self, hsn_info: Dict, invoice_data: Dict) -> bool:
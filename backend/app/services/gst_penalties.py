@@ -0,0 +1,156 @@
+"""
+GST Penalty Calculator
+
+This module works out late fees and interest per return period instead of
+per invoice:
+- Tax per period comes from one GstReturnAggregator pass over the invoices
+- Late fees for GSTR-1 and GSTR-3B from their due dates and filing dates
+  (per day, capped per return, lower for nil returns)
+- Interest at 18% a year on tax paid after the GSTR-3B due date
+- Filing dates recorded per period in a JSON file; unfiled returns accrue
+  up to the calculation date
+- Closed periods (both returns filed) are computed once and reused until
+  their tax or filing dates change
+
+Author: Dev 2
+"""
+from dataclasses import dataclass
+from datetime import date
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from filelock import FileLock
+
+from app.services.gst_returns import due_dates
+from app.services.validation import parse_invoice_date
+
+logger = logging.getLogger(__name__)
+
+LATE_FEE_PER_DAY = 50.0  # Rs 25 CGST + Rs 25 SGST
+NIL_LATE_FEE_PER_DAY = 20.0
+LATE_FEE_CAP = 10000.0  # per return
+NIL_LATE_FEE_CAP = 500.0
+INTEREST_RATE = 0.18  # per year, simple, on tax paid late
+
+RETURNS = ("gstr1", "gstr3b")
+
+
+@dataclass
+class PeriodPenalty:
+    period: str
+    tax: float
+    status: str  # "open" (not yet due), "filed", "filed_late" or "overdue"
+    days_late: Dict[str, int]  # return -> days filed (or outstanding) past its due date
+    late_fee: float
+    interest: float
+
+    @property
+    def total(self) -> float:
+        return round(self.late_fee + self.interest, 2)
+
+
+def _days_late(due: date, done: Optional[date], as_of: date) -> int:
+    return max(0, ((done or as_of) - due).days)
+
+
+def period_penalty(period: str, tax: float, filing: Dict[str, Any], as_of: date) -> PeriodPenalty:
+    """
+    Late fees and interest of one return period
+
+    Args:
+        period: Return period (YYYY-MM)
+        tax: Tax payable for the period
+        filing: Filing dates ("gstr1", "gstr3b", optionally "tax_paid",
+            which defaults to the GSTR-3B filing date)
+        as_of: Date unfiled returns and unpaid tax accrue up to
+    """
+    due = {name: date.fromisoformat(value) for name, value in due_dates(period).items()}
+    filed = {name: parse_invoice_date(filing.get(name)) for name in RETURNS}
+    nil_return = tax <= 0
+    per_day, cap = (NIL_LATE_FEE_PER_DAY, NIL_LATE_FEE_CAP) if nil_return else (LATE_FEE_PER_DAY, LATE_FEE_CAP)
+
+    days_late = {name: _days_late(due[name], filed[name], as_of) for name in RETURNS}
+    late_fee = sum(min(days * per_day, cap) for days in days_late.values())
+
+    paid = parse_invoice_date(filing.get("tax_paid")) or filed["gstr3b"]
+    interest = 0.0 if nil_return else tax * INTEREST_RATE * _days_late(due["gstr3b"], paid, as_of) / 365
+
+    if all(filed.values()):
+        status = "filed_late" if any(days_late.values()) else "filed"
+    elif any(days_late.values()):
+        status = "overdue"
+    else:
+        status = "open"
+    return PeriodPenalty(period, round(tax, 2), status, days_late, round(late_fee, 2), round(interest, 2))
+
+
+class GstPenaltyCalculator:
+    def __init__(self):
+        # period -> ((tax, filing dates), penalty) of periods with both returns filed
+        self._closed: Dict[str, Tuple[Tuple, PeriodPenalty]] = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.computed = 0
+
+    def calculate(
+        self, period_tax: Dict[str, float], filings: Dict[str, Dict[str, Any]], as_of: Optional[date] = None
+    ) -> List[PeriodPenalty]:
+        """
+        Penalties of every period, oldest first
+
+        Args:
+            period_tax: Return period -> tax payable
+            filings: Return period -> filing dates (see period_penalty)
+            as_of: Calculation date (today by default)
+        """
+        as_of = as_of or date.today()
+        penalties = []
+        with self._lock:
+            for period in sorted(period_tax):
+                filing = filings.get(period, {})
+                key = (round(period_tax[period], 2), tuple(filing.get(name) for name in (*RETURNS, "tax_paid")))
+                cached = self._closed.get(period)
+                if cached and cached[0] == key:
+                    self.reused += 1
+                    penalties.append(cached[1])
+                    continue
+
+                penalty = period_penalty(period, period_tax[period], filing, as_of)
+                self.computed += 1
+                if penalty.status in ("filed", "filed_late"):
+                    # Filed returns no longer accrue: the result is final
+                    self._closed[period] = (key, penalty)
+                penalties.append(penalty)
+        return penalties
+
+
+def load_gst_filings(path: str) -> Dict[str, Dict[str, Any]]:
+    """Filing dates per return period, {} when none are recorded"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Error loading GST filings from {path}: {str(e)}")
+        return {}
+
+
+def record_gst_filing(path: str, period: str, filing: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge filing dates into a period's record and save all records atomically"""
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Serializes read-modify-write of the file across worker processes
+    with FileLock(str(target.with_suffix(".lock"))):
+        filings = load_gst_filings(path)
+        record = {**filings.get(period, {}), **{name: value for name, value in filing.items() if value}}
+        filings[period] = record
+        tmp_path = target.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(filings, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, target)
+    return record
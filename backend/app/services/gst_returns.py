@@ -0,0 +1,267 @@
+"""
+GST Return Aggregation
+
+This module turns a stream of invoices into return-ready GSTR-1 and GSTR-3B
+figures in one pass:
+- Each invoice is categorized per line item (rates as of the invoice date)
+  and its tax split into IGST, or CGST and SGST, by comparing the
+  counterparty's state code with the business's
+- Buckets per return period (YYYY-MM): B2B by counterparty GSTIN, B2C by
+  place of supply and rate, HSN summary, rate slabs and GSTR-3B totals
+- Memory grows with the number of buckets, never with the number of
+  invoices, so years of invoices can be streamed through it
+- JSON and CSV export, one CSV per section
+
+The counterparty of an invoice is its buyer_gstin (outward supplies), else
+its gstin. B2C invoices carry their state as place_of_supply, else the
+supply is taken as intra-state. Line items with no HSN/SAC code the master
+resolves share the stated tax the resolved items leave over, and are put in
+the slab it implies, or UNCLASSIFIED when it matches no slab (or nothing is
+left); they are never counted as nil-rated.
+
+Author: Dev 2
+"""
+import csv
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Tuple
+
+from app.services.gst_categorization import TAX_RATES, UNCLASSIFIED, GSTCategorizationService, GSTCategory, LineItemCategorization
+from app.services.gstin import is_valid_gstin
+from app.services.validation import parse_invoice_date
+
+SECTIONS = ("b2b", "b2c", "hsn", "rates", "gstr3b")
+
+# Key columns of each section (the period comes first in every key)
+SECTION_KEYS = {
+    "b2b": ("period", "gstin"),
+    "b2c": ("period", "place_of_supply", "rate"),
+    "hsn": ("period", "hsn_code", "rate"),
+    "rates": ("period", "rate"),
+    "gstr3b": ("period",),
+}
+VALUE_COLUMNS = ("count", "taxable_value", "igst", "cgst", "sgst")
+
+# Nil-rated, exempt and zero-rated supplies (GSTR-3B table 3.1(c))
+NIL_CATEGORIES = {GSTCategory.NIL.value, GSTCategory.EXEMPT.value, GSTCategory.ZERO.value}
+
+# How far (in percentage points) a stated tax may be from a slab's rate
+IMPLIED_RATE_TOLERANCE = 0.5
+
+
+class _Totals:
+    __slots__ = VALUE_COLUMNS
+
+    def __init__(self):
+        self.count = 0
+        self.taxable_value = 0.0
+        self.igst = 0.0
+        self.cgst = 0.0
+        self.sgst = 0.0
+
+    def add(self, taxable_value: float, igst: float, cgst: float, sgst: float, count: int = 1) -> None:
+        self.count += count
+        self.taxable_value += taxable_value
+        self.igst += igst
+        self.cgst += cgst
+        self.sgst += sgst
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "taxable_value": round(self.taxable_value, 2),
+            "igst": round(self.igst, 2),
+            "cgst": round(self.cgst, 2),
+            "sgst": round(self.sgst, 2),
+        }
+
+
+def state_code(gstin: Optional[str]) -> Optional[str]:
+    """Two-digit state code of a GSTIN or place of supply, or None"""
+    if not gstin:
+        return None
+    code = str(gstin).strip()[:2]
+    return code if code.isdigit() else None
+
+
+def return_period(on: date) -> str:
+    return on.strftime("%Y-%m")
+
+
+def due_dates(period: str) -> Dict[str, str]:
+    """Monthly GSTR-1 (11th) and GSTR-3B (20th) due dates of a return period"""
+    year, month = (int(part) for part in period.split("-"))
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return {
+        "gstr1": date(year, month, 11).isoformat(),
+        "gstr3b": date(year, month, 20).isoformat(),
+    }
+
+
+class GstReturnAggregator:
+    def __init__(self, business_gstin: Optional[str] = None, categorization: Optional[GSTCategorizationService] = None):
+        """
+        Args:
+            business_gstin: GSTIN of the filing business (its state decides
+                intra- vs inter-state supplies)
+            categorization: Service used to categorize line items
+        """
+        self.business_state = state_code(business_gstin)
+        self.categorization = categorization or GSTCategorizationService()
+        self.invoices = 0
+        self.skipped = 0  # invoices without a usable date
+        self._buckets: Dict[str, Dict[Tuple, _Totals]] = {section: {} for section in SECTIONS}
+        self._nil_exempt: Dict[str, float] = {}  # period -> nil/exempt/zero-rated value
+
+    def add(self, invoice: Dict[str, Any]) -> None:
+        """Aggregate one invoice"""
+        on = parse_invoice_date(invoice.get("invoice_date") or invoice.get("date"))
+        if on is None:
+            self.skipped += 1
+            return
+        period = return_period(on)
+
+        gstin = (invoice.get("buyer_gstin") or invoice.get("gstin") or "").strip().upper()
+        b2b = bool(gstin) and is_valid_gstin(gstin)
+        supply_state = state_code(gstin) if b2b else state_code(invoice.get("place_of_supply"))
+        inter_state = bool(supply_state and self.business_state and supply_state != self.business_state)
+
+        invoice_totals = _Totals()
+        for line, rate in self._lines(invoice):
+            tax = line.tax
+            igst, cgst, sgst = (tax, 0.0, 0.0) if inter_state else (0.0, tax / 2, tax / 2)
+            self._bucket("hsn", (period, line.result.hsn_code or "", rate)).add(line.taxable_value, igst, cgst, sgst)
+            self._bucket("rates", (period, rate)).add(line.taxable_value, igst, cgst, sgst)
+            if not b2b:
+                self._bucket("b2c", (period, supply_state or self.business_state or "", rate)).add(
+                    line.taxable_value, igst, cgst, sgst
+                )
+            if rate in NIL_CATEGORIES and not tax:
+                self._nil_exempt[period] = self._nil_exempt.get(period, 0.0) + line.taxable_value
+            invoice_totals.add(line.taxable_value, igst, cgst, sgst, count=0)
+
+        if b2b:
+            self._bucket("b2b", (period, gstin)).add(
+                invoice_totals.taxable_value, invoice_totals.igst, invoice_totals.cgst, invoice_totals.sgst
+            )
+        self._bucket("gstr3b", (period,)).add(
+            invoice_totals.taxable_value, invoice_totals.igst, invoice_totals.cgst, invoice_totals.sgst
+        )
+        self.invoices += 1
+
+    def add_many(self, invoices: Iterable[Dict[str, Any]]) -> "GstReturnAggregator":
+        """Aggregate a stream of invoices (consumed once, never held)"""
+        for invoice in invoices:
+            self.add(invoice)
+        return self
+
+    def periods(self) -> List[str]:
+        return sorted(key[0] for key in self._buckets["gstr3b"])
+
+    def rows(self, section: str, period: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Rows of one section (all periods, or one), sorted by key"""
+        if section not in SECTIONS:
+            raise ValueError(f"Unknown section {section!r}, expected one of {', '.join(SECTIONS)}")
+        rows = []
+        for key, totals in sorted(self._buckets[section].items()):
+            if period and key[0] != period:
+                continue
+            row = dict(zip(SECTION_KEYS[section], key))
+            row.update(totals.as_dict())
+            if section == "gstr3b":
+                row["nil_exempt_value"] = round(self._nil_exempt.get(key[0], 0.0), 2)
+                row["total_tax"] = round(totals.igst + totals.cgst + totals.sgst, 2)
+                row.update({f"{form}_due": due for form, due in due_dates(key[0]).items()})
+            rows.append(row)
+        return rows
+
+    def total_tax(self) -> float:
+        return round(sum(t.igst + t.cgst + t.sgst for t in self._buckets["gstr3b"].values()), 2)
+
+    def to_dict(self, period: Optional[str] = None) -> Dict[str, Any]:
+        """All sections grouped by return period"""
+        returns: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        for section in SECTIONS:
+            for row in self.rows(section, period):
+                returns.setdefault(row["period"], {name: [] for name in SECTIONS})[section].append(
+                    {name: value for name, value in row.items() if name != "period"}
+                )
+        return {
+            "invoices": self.invoices,
+            "skipped": self.skipped,
+            "periods": returns,
+        }
+
+    def write_csv(self, section: str, out: TextIO, period: Optional[str] = None) -> None:
+        """Write one section as CSV"""
+        rows = self.rows(section, period)
+        columns = list(SECTION_KEYS[section]) + list(VALUE_COLUMNS)
+        if section == "gstr3b":
+            columns += ["nil_exempt_value", "total_tax", "gstr1_due", "gstr3b_due"]
+        writer = csv.DictWriter(out, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    def _bucket(self, section: str, key: Tuple) -> _Totals:
+        buckets = self._buckets[section]
+        totals = buckets.get(key)
+        if totals is None:
+            totals = buckets[key] = _Totals()
+        return totals
+
+    def _lines(self, invoice: Dict[str, Any]) -> List[Tuple[LineItemCategorization, str]]:
+        """
+        (categorized line item, rate) pairs; an invoice without items is one
+        line at its stated tax. Stated tax not accounted for by the resolved
+        items is spread over the unresolved ones by taxable value.
+        """
+        stated_tax = _number(invoice.get("gst_amount"))
+        if invoice.get("items"):
+            lines = self.categorization.categorize_line_items(invoice).items
+        else:
+            amount = _number(invoice.get("amount", invoice.get("total_amount")))
+            taxable_value = _number(invoice.get("subtotal")) or (amount - stated_tax if stated_tax else amount)
+            lines = self.categorization.categorize_line_items(
+                {**invoice, "items": [{"description": "", "hsn_code": invoice.get("hsn_code"), "amount": taxable_value}]}
+            ).items
+            if stated_tax and lines[0].result.matched_level is not None:
+                # The invoice states its tax; trust it over the categorized rate
+                lines[0].tax = round(stated_tax, 2)
+
+        rates = [line.result.category.value for line in lines]
+        unresolved = [index for index, line in enumerate(lines) if line.result.matched_level is None]
+        if unresolved:
+            # No resolvable code: the tax left over tells the slab
+            resolved_tax = sum(line.tax for index, line in enumerate(lines) if index not in unresolved)
+            remaining = round(max(stated_tax - resolved_tax, 0.0), 2)
+            unresolved_value = sum(lines[index].taxable_value for index in unresolved)
+            rate = implied_rate(remaining, unresolved_value) if remaining else UNCLASSIFIED
+            shares = [
+                round(remaining * lines[index].taxable_value / unresolved_value, 2) if unresolved_value > 0
+                else round(remaining / len(unresolved), 2)
+                for index in unresolved
+            ]
+            shares[-1] = round(remaining - sum(shares[:-1]), 2)  # rounding cents go to the last line
+            for index, share in zip(unresolved, shares):
+                lines[index].tax = share
+                rates[index] = rate
+                if remaining:
+                    lines[index].result.validation_notes.append(f"Rate {rate} implied by the stated tax")
+        return list(zip(lines, rates))
+
+def implied_rate(tax: float, taxable_value: float) -> str:
+    """Slab whose rate is within IMPLIED_RATE_TOLERANCE of tax / taxable_value, else UNCLASSIFIED"""
+    if taxable_value <= 0:
+        return UNCLASSIFIED
+    percent = 100 * tax / taxable_value
+    category, rate = min(
+        ((category, rate) for category, rate in TAX_RATES.items() if rate > 0),
+        key=lambda pair: abs(pair[1] - percent)
+    )
+    return category.value if abs(rate - percent) <= IMPLIED_RATE_TOLERANCE else UNCLASSIFIED
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,190 @@
+"""
+GSTIN Validation
+
+This module is the one place GSTINs are checked:
+- Format: 2-digit state code, 10-character PAN, entity number, "Z" and a
+  check character
+- The mod-36 check character GSTN computes over the first 14 characters
+- Decomposition into state, PAN, PAN holder type and entity number
+- An LRU cache for single GSTINs, and a vectorized pass for vendor master
+  imports of hundreds of thousands of GSTINs
+
+Author: Dev 2
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+GSTIN_LENGTH = 15
+
+STATE_CODES = {
+    "01": "Jammu and Kashmir", "02": "Himachal Pradesh", "03": "Punjab", "04": "Chandigarh",
+    "05": "Uttarakhand", "06": "Haryana", "07": "Delhi", "08": "Rajasthan", "09": "Uttar Pradesh",
+    "10": "Bihar", "11": "Sikkim", "12": "Arunachal Pradesh", "13": "Nagaland", "14": "Manipur",
+    "15": "Mizoram", "16": "Tripura", "17": "Meghalaya", "18": "Assam", "19": "West Bengal",
+    "20": "Jharkhand", "21": "Odisha", "22": "Chhattisgarh", "23": "Madhya Pradesh", "24": "Gujarat",
+    "25": "Daman and Diu", "26": "Dadra and Nagar Haveli and Daman and Diu", "27": "Maharashtra",
+    "28": "Andhra Pradesh (before division)", "29": "Karnataka", "30": "Goa", "31": "Lakshadweep",
+    "32": "Kerala", "33": "Tamil Nadu", "34": "Puducherry", "35": "Andaman and Nicobar Islands",
+    "36": "Telangana", "37": "Andhra Pradesh", "38": "Ladakh", "97": "Other Territory",
+    "99": "Centre Jurisdiction",
+}
+
+# Fourth PAN character -> holder type
+PAN_HOLDER_TYPES = {
+    "A": "Association of Persons", "B": "Body of Individuals", "C": "Company", "F": "Firm",
+    "G": "Government", "H": "Hindu Undivided Family", "J": "Artificial Juridical Person",
+    "L": "Local Authority", "P": "Individual", "T": "Trust",
+}
+
+# Weights applied to the first 14 characters, alternating from the left
+CHECK_FACTORS = (1, 2) * 7
+
+
+@dataclass
+class GstinCheck:
+    gstin: str  # stripped and uppercased
+    valid: bool
+    errors: Tuple[str, ...] = ()
+    state_code: Optional[str] = None
+    state: Optional[str] = None
+    pan: Optional[str] = None
+    holder_type: Optional[str] = None
+    entity_number: Optional[str] = None
+
+
+def normalize_gstin(gstin: str) -> str:
+    return str(gstin or "").strip().upper()
+
+
+def check_character(gstin: str) -> str:
+    """Check character for the first 14 characters of a GSTIN"""
+    total = 0
+    for char, factor in zip(gstin[:14], CHECK_FACTORS):
+        product = CHARSET.index(char) * factor
+        total += product // 36 + product % 36
+    return CHARSET[(36 - total % 36) % 36]
+
+
+def _format_errors(gstin: str) -> List[str]:
+    if len(gstin) != GSTIN_LENGTH:
+        return [f"GSTIN must be {GSTIN_LENGTH} characters, got {len(gstin)}"]
+    if any(char not in CHARSET for char in gstin):
+        return ["GSTIN may only contain digits and capital letters"]
+
+    errors = []
+    if gstin[:2] not in STATE_CODES:
+        errors.append(f"Unknown state code {gstin[:2]}")
+    pan = gstin[2:12]
+    if not (pan[:5].isalpha() and pan[5:9].isdigit() and pan[9].isalpha()):
+        errors.append(f"Invalid PAN {pan}")
+    if gstin[12] == "0":
+        errors.append("Entity number must be 1-9 or A-Z")
+    if gstin[13] != "Z":
+        errors.append(f"14th character must be Z, got {gstin[13]}")
+    return errors
+
+
+@lru_cache(maxsize=settings.GSTIN_CACHE_SIZE)
+def _validate(gstin: str) -> GstinCheck:
+    errors = _format_errors(gstin)
+    if not errors:
+        expected = check_character(gstin)
+        if gstin[14] != expected:
+            errors.append(f"Check character should be {expected}, got {gstin[14]}")
+    if errors and len(gstin) != GSTIN_LENGTH:
+        return GstinCheck(gstin, False, tuple(errors))
+    return GstinCheck(
+        gstin=gstin,
+        valid=not errors,
+        errors=tuple(errors),
+        state_code=gstin[:2],
+        state=STATE_CODES.get(gstin[:2]),
+        pan=gstin[2:12],
+        holder_type=PAN_HOLDER_TYPES.get(gstin[5]),
+        entity_number=gstin[12],
+    )
+
+
+def validate_gstin(gstin: str) -> GstinCheck:
+    """Validate one GSTIN (format and check character) and decompose it"""
+    return _validate(normalize_gstin(gstin))
+
+
+def is_valid_gstin(gstin: str) -> bool:
+    """
+    GSTIN Format: 15 characters
+    2-digit state code + 10-character PAN + 1 entity + 1 Z + 1 check character
+    Example: 27AAPFU0939F1ZV
+    """
+    return validate_gstin(gstin).valid
+
+
+def valid_gstin_mask(gstins: Sequence[str]):
+    """
+    Validity of many normalized GSTINs as a numpy bool array, checking
+    format, state code and check character column by column
+    """
+    import numpy as np
+
+    count = len(gstins)
+    if not count:
+        return np.zeros(0, dtype=bool)
+    # Wrong lengths and non-ASCII are padded to a row that fails the checks below
+    rows = [g.encode("ascii", "replace") if len(g) == GSTIN_LENGTH else b"?" * GSTIN_LENGTH for g in gstins]
+    chars = np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(count, GSTIN_LENGTH)
+
+    # Character -> value in CHARSET (0-35), 255 for anything else
+    table = np.full(256, 255, dtype=np.uint8)
+    table[np.frombuffer(CHARSET.encode("ascii"), dtype=np.uint8)] = np.arange(36, dtype=np.uint8)
+    values = table[chars].astype(np.int32)
+
+    digit = values < 10
+    letter = (values >= 10) & (values < 36)
+    valid = (values < 36).all(axis=1)
+    valid &= digit[:, [0, 1, 7, 8, 9, 10]].all(axis=1)
+    valid &= letter[:, [2, 3, 4, 5, 6, 11]].all(axis=1)
+    valid &= (values[:, 12] > 0) & (values[:, 12] < 36)
+    valid &= values[:, 13] == CHARSET.index("Z")
+
+    known_states = np.zeros(100, dtype=bool)
+    known_states[[int(code) for code in STATE_CODES]] = True
+    state = np.where(digit[:, 0] & digit[:, 1], values[:, 0] * 10 + values[:, 1], 0)
+    valid &= known_states[state]
+
+    products = values[:, :14] * np.array(CHECK_FACTORS, dtype=np.int32)
+    total = (products // 36 + products % 36).sum(axis=1)
+    valid &= values[:, 14] == (36 - total % 36) % 36
+    return valid
+
+
+def validate_gstins(gstins: Sequence[str]) -> List[GstinCheck]:
+    """
+    Validate many GSTINs in one vectorized pass; only invalid ones go
+    through the per-GSTIN checks to collect their errors
+    """
+    normalized = [normalize_gstin(gstin) for gstin in gstins]
+    valid = valid_gstin_mask(normalized)
+    results = []
+    for gstin, ok in zip(normalized, valid.tolist()):
+        if ok:
+            results.append(GstinCheck(
+                gstin=gstin,
+                valid=True,
+                state_code=gstin[:2],
+                state=STATE_CODES[gstin[:2]],
+                pan=gstin[2:12],
+                holder_type=PAN_HOLDER_TYPES.get(gstin[5]),
+                entity_number=gstin[12],
+            ))
+        else:
+            results.append(_validate(gstin))
+    return results
+
+
+def gstin_cache_info():
+    """Hits and misses of the single-GSTIN cache"""
+    return _validate.cache_info()
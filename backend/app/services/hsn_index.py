@@ -0,0 +1,99 @@
+"""
+HSN/SAC Prefix Index
+
+This module resolves HSN and SAC codes against the hierarchical code master:
+- A digit trie over every code in the master (2-digit chapters, 4-digit
+  headings, 6-digit subheadings and 8-digit tariff items)
+- Longest-prefix lookup in O(code length), so an 8-digit code missing from
+  the master still gets the rate of its subheading, heading or chapter
+- The level that matched, for confidence scoring and validation notes
+
+Author: Dev 2
+"""
+from dataclasses import dataclass
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Code length -> hierarchy level
+LEVELS = {2: "chapter", 4: "heading", 6: "subheading", 8: "tariff_item"}
+# GST categories a master entry or rate period may have (GSTCategory values)
+CATEGORIES = ("NIL", "EXEMPT", "0%", "5%", "12%", "18%", "28%")
+
+
+@dataclass
+class HsnMatch:
+    query: str  # normalized code that was looked up
+    code: str  # longest code in the master that prefixes the query
+    level: str  # see LEVELS
+    info: Dict[str, Any]  # master entry of code
+
+    @property
+    def exact(self) -> bool:
+        return self.code == self.query
+
+
+def normalize_code(code: str) -> str:
+    """Strip separators and labels ("HSN 8471.30.10" -> "84713010")"""
+    return re.sub(r"\D", "", str(code))
+
+
+class _Node:
+    __slots__ = ("children", "entry")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.entry: Optional[Tuple[str, Dict[str, Any]]] = None
+
+
+class HsnIndex:
+    def __init__(self, mapping: Dict[str, Dict[str, Any]]):
+        """
+        Args:
+            mapping: Code -> master entry (default_category, description, ...)
+        """
+        self._root = _Node()
+        self._size = 0
+        for code, info in mapping.items():
+            self.add(code, info)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, code: str, info: Dict[str, Any]) -> None:
+        code = normalize_code(code)
+        if not code:
+            return
+        node = self._root
+        for digit in code:
+            node = node.children.setdefault(digit, _Node())
+        if node.entry is None:
+            self._size += 1
+        node.entry = (code, info)
+
+    def lookup(self, code: str) -> Optional[HsnMatch]:
+        """Longest code in the master that is a prefix of code, or None"""
+        query = normalize_code(code)
+        node = self._root
+        best = None
+        for digit in query:
+            node = node.children.get(digit)
+            if node is None:
+                break
+            if node.entry is not None:
+                best = node.entry
+        if best is None:
+            return None
+        matched, info = best
+        return HsnMatch(query, matched, LEVELS.get(len(matched), f"{len(matched)}-digit"), info)
+
+    def lookup_many(self, codes: List[str]) -> List[Optional[HsnMatch]]:
+        return [self.lookup(code) for code in codes]
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(code, master entry) of every code in the master"""
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node.entry is not None:
+                yield node.entry
+            stack.extend(node.children.values())
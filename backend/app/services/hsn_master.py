@@ -0,0 +1,425 @@
+"""
+Binary HSN/SAC Master
+
+This module stores the HSN/SAC code master as a compact binary table:
+- Built from hsn_mapping.json (or a CSV export of the full master) by
+  scripts/build_hsn_master.py, or on first use when the table is stale
+- Column layout: integer codes sorted by length then value, category and
+  reliability as small ints, descriptions in one UTF-8 string pool
+- Memory-mapped and read in place, so opening it costs microseconds and
+  every process shares the same page-cache pages
+- Longest-prefix lookup with one binary search per code length, and a
+  vectorized variant for batches
+- Rate history (see hsn_rates.py) loaded and versioned with the master
+- Hot reload: the sources are polled every settings.HSN_RELOAD_SECONDS and a
+  changed master is compiled and indexed in the background, then swapped in
+  as a new HsnMapping version while in-flight requests finish on the old one.
+  Every process polls with its own thread, also workers forked from a
+  gunicorn master that loaded the mapping (PRELOAD_MODELS)
+
+Table layout (little-endian): a 16-byte header (magic, record count, string
+pool size, source digest), then the columns codes u32, description offsets u32,
+description lengths u16, digit counts u8, categories u8, reliability u8,
+each padded to 4 bytes, then the string pool.
+
+Author: Dev 2
+"""
+from bisect import bisect_left, bisect_right
+import hashlib
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.services.hsn_index import CATEGORIES, LEVELS, HsnIndex, HsnMatch, normalize_code
+from app.services.hsn_rates import RateHistory
+from app.services.hsn_search import HsnDescriptionIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"HSN1"
+HEADER = struct.Struct("<4sIII")
+MAX_DIGITS = 8
+VECTORIZE_MIN_CODES = 32  # smaller batches go through lookup one code at a time
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+MASTER_SOURCE = DATA_DIR / "hsn_mapping.json"
+RATE_HISTORY_SOURCE = DATA_DIR / "hsn_rate_history.json"
+MASTER_FILE = DATA_DIR / "hsn_master.bin"
+
+
+def _padded(size: int) -> int:
+    return (size + 3) & ~3
+
+
+def source_digest(raw: bytes) -> int:
+    """Digest of a master source stored in the table header (0 for none)"""
+    return int.from_bytes(hashlib.sha1(raw).digest()[:4], "little") or 1
+
+
+def compile_master(mapping: Dict[str, Dict[str, Any]], digest: int = 0) -> bytes:
+    """
+    Compile a code -> entry mapping (default_category, description,
+    reliability_score) into the binary table
+
+    Args:
+        mapping: Code -> master entry
+        digest: source_digest of the file mapping was read from
+    """
+    records: List[Tuple[int, int, int, int, bytes]] = []
+    for raw_code, info in mapping.items():
+        code = normalize_code(raw_code)
+        if not code or len(code) > MAX_DIGITS:
+            raise ValueError(f"Invalid HSN/SAC code: {raw_code!r}")
+        category = info.get("default_category", "NIL")
+        if category not in CATEGORIES:
+            raise ValueError(f"Unknown GST category {category!r} for code {raw_code}")
+        reliability = round(100 * float(info.get("reliability_score", 0.0)))
+        description = info.get("description", "").encode("utf-8")[:0xFFFF]
+        records.append((len(code), int(code), CATEGORIES.index(category), reliability, description))
+    records.sort(key=lambda record: record[:2])
+
+    count = len(records)
+    pool = bytearray()
+    offsets = []
+    for record in records:
+        offsets.append(len(pool))
+        pool += record[4]
+
+    def column(fmt: str, values) -> bytes:
+        data = struct.pack(f"<{count}{fmt}", *values)
+        return data + b"\0" * (_padded(len(data)) - len(data))
+
+    return b"".join([
+        HEADER.pack(MAGIC, count, len(pool), digest),
+        column("I", (record[1] for record in records)),
+        column("I", offsets),
+        column("H", (len(record[4]) for record in records)),
+        column("B", (record[0] for record in records)),
+        column("B", (record[2] for record in records)),
+        column("B", (record[3] for record in records)),
+        bytes(pool),
+    ])
+
+
+def write_master(mapping: Dict[str, Dict[str, Any]], path: Union[str, Path], digest: int = 0) -> None:
+    """Compile mapping and replace the table at path atomically"""
+    path = Path(path)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(compile_master(mapping, digest))
+    os.replace(tmp_path, path)
+
+
+class HsnMaster:
+    def __init__(self, buffer):
+        """
+        Args:
+            buffer: The binary table (an mmap, or bytes for in-memory tables)
+        """
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, count, pool_size, digest = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError("Not an HSN master table")
+        self.source_digest = digest  # of the source the table was compiled from
+
+        offset = HEADER.size
+        columns = []
+        for fmt, itemsize in (("I", 4), ("I", 4), ("H", 2), ("B", 1), ("B", 1), ("B", 1)):
+            size = count * itemsize
+            columns.append(view[offset:offset + size].cast(fmt))
+            offset += _padded(size)
+        self._codes, self._offsets, self._lengths, self._digits, self._categories, self._reliability = columns
+        self._pool = view[offset:offset + pool_size]
+        self._count = count
+
+        # Records of each code length are contiguous: length -> (start, end)
+        self._blocks = {
+            digits: (bisect_left(self._digits, digits), bisect_right(self._digits, digits))
+            for digits in range(1, MAX_DIGITS + 1)
+        }
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "HsnMaster":
+        """Memory-map a table written by write_master"""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def entry(self, index: int) -> Tuple[str, Dict[str, Any]]:
+        """(code, master entry) of a record"""
+        start = self._offsets[index]
+        code = str(self._codes[index]).zfill(self._digits[index])
+        return code, {
+            "default_category": CATEGORIES[self._categories[index]],
+            "description": bytes(self._pool[start:start + self._lengths[index]]).decode("utf-8"),
+            "reliability_score": self._reliability[index] / 100,
+        }
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(code, master entry) of every record"""
+        return (self.entry(index) for index in range(self._count))
+
+    def find(self, code: str) -> Optional[int]:
+        """Record index of an exact (normalized) code, or None"""
+        if not code or len(code) > MAX_DIGITS:
+            return None
+        start, end = self._blocks[len(code)]
+        value = int(code)
+        index = bisect_left(self._codes, value, start, end)
+        return index if index < end and self._codes[index] == value else None
+
+    def lookup(self, code: str) -> Optional[HsnMatch]:
+        """Longest code in the master that is a prefix of code, or None"""
+        query = normalize_code(code)
+        for digits in range(min(len(query), MAX_DIGITS), 0, -1):
+            index = self.find(query[:digits])
+            if index is not None:
+                matched, info = self.entry(index)
+                return HsnMatch(query, matched, LEVELS.get(digits, f"{digits}-digit"), info)
+        return None
+
+    def lookup_many(self, codes: List[str]) -> List[Optional[HsnMatch]]:
+        """
+        lookup over many codes in one vectorized pass: distinct codes are
+        resolved together, one searchsorted per code length from the longest
+        """
+        if len(codes) < VECTORIZE_MIN_CODES:
+            # A single invoice's line items: numpy setup would cost more than it saves
+            return [self.lookup(code) for code in codes]
+
+        import numpy as np
+
+        queries = [normalize_code(code)[:MAX_DIGITS] for code in codes]
+        distinct = sorted({query for query in queries if query})
+        values = np.array([int(query) for query in distinct], dtype=np.int64)
+        lengths = np.array([len(query) for query in distinct], dtype=np.int64)
+        found = np.full(len(distinct), -1, dtype=np.int64)
+        matched_digits = np.zeros(len(distinct), dtype=np.int64)
+
+        table = np.frombuffer(self._codes, dtype=np.uint32)
+        for digits in range(MAX_DIGITS, 0, -1):
+            start, end = self._blocks[digits]
+            pending = np.flatnonzero((found < 0) & (lengths >= digits))
+            if start == end or not len(pending):
+                continue
+            prefixes = values[pending] // 10 ** (lengths[pending] - digits)
+            block = table[start:end]
+            positions = np.minimum(np.searchsorted(block, prefixes), len(block) - 1)
+            hits = block[positions] == prefixes
+            found[pending[hits]] = start + positions[hits]
+            matched_digits[pending[hits]] = digits
+
+        # Many codes resolve to the same master record; decode each record once
+        entries = {index: self.entry(index) for index in set(found.tolist()) if index >= 0}
+        matches: Dict[str, Optional[HsnMatch]] = {"": None}
+        for query, index, digits in zip(distinct, found.tolist(), matched_digits.tolist()):
+            if index < 0:
+                matches[query] = None
+                continue
+            matched, info = entries[index]
+            matches[query] = HsnMatch(query, matched, LEVELS.get(digits, f"{digits}-digit"), info)
+        return [matches[query] for query in queries]
+
+
+class HsnMapping:
+    """
+    One version of the HSN master. Requests take the current version once
+    and use it to the end, so a reload never changes rates mid-request.
+    """
+    def __init__(
+        self, master: Union[HsnMaster, HsnIndex], version: str, source_mtime: float, generation: int,
+        rates: Optional[RateHistory] = None
+    ):
+        self.master = master
+        self.rates = rates or RateHistory({})  # rate periods of codes whose rates changed
+        self.version = version  # content hash of the sources
+        self.source_mtime = source_mtime
+        self.generation = generation  # increases with every version loaded
+        self.loaded_at = time.time()
+        self._descriptions: Optional[HsnDescriptionIndex] = None
+        self._descriptions_lock = threading.Lock()
+
+    @property
+    def descriptions(self) -> HsnDescriptionIndex:
+        """TF-IDF index over the master descriptions, built on first use"""
+        if self._descriptions is None:
+            with self._descriptions_lock:
+                if self._descriptions is None:
+                    self._descriptions = HsnDescriptionIndex(self.master.items())
+                    logger.info(f"✅ HSN description index built ({len(self._descriptions)} codes)")
+        return self._descriptions
+
+
+# Current mapping version (loaded on first use, swapped by reload_hsn_mapping)
+_mapping: Optional[HsnMapping] = None
+_mapping_lock = threading.Lock()
+# One compile-and-swap at a time (the watcher and POST /gst/hsn-mapping/reload)
+_reload_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+# Process the watcher was started in: threads do not survive fork, so a
+# forked worker starts its own
+_watcher_pid = 0
+_reloads = 0
+_failed_reloads = 0
+
+def get_hsn_mapping() -> HsnMapping:
+    """
+    Return the current HSN mapping version, compiling MASTER_FILE from
+    MASTER_SOURCE first when it is missing or older than the source
+    """
+    global _mapping
+    mapping = _mapping
+    if mapping is None or _watcher_pid != os.getpid():
+        with _mapping_lock:
+            if _mapping is None:
+                try:
+                    _mapping = _load_mapping(generation=1)
+                except Exception as e:
+                    logger.error(f"❌ Error loading HSN master: {str(e)}")
+                    _mapping = HsnMapping(HsnIndex({}), "empty", 0.0, generation=1)
+            _start_watcher()
+            mapping = _mapping
+    return mapping
+
+def get_hsn_master() -> Union[HsnMaster, HsnIndex]:
+    """Return the master of the current HSN mapping version"""
+    return get_hsn_mapping().master
+
+def reload_hsn_mapping(force: bool = False) -> bool:
+    """
+    Load the master again when its source changed (or when forced), build
+    the new version completely, then swap it in. Requests that already hold
+    the old version finish on it. Returns whether a new version was swapped in.
+    """
+    with _reload_lock:
+        return _reload(force)
+
+def _reload(force: bool) -> bool:
+    """reload_hsn_mapping (call with _reload_lock held)"""
+    global _mapping, _reloads, _failed_reloads
+    current = get_hsn_mapping()
+    if not force and _source_mtime() == current.source_mtime:
+        return False
+    try:
+        mapping = _load_mapping(generation=current.generation + 1)
+        mapping.descriptions  # build the description index off the request path
+    except Exception as e:
+        # Keep serving the current version; retried on the next poll
+        logger.error(f"❌ Error reloading HSN master, keeping {current.version}: {str(e)}")
+        with _mapping_lock:
+            _failed_reloads += 1
+        return False
+
+    if mapping.version == current.version:
+        # Touched but unchanged
+        current.source_mtime = mapping.source_mtime
+        return False
+    with _mapping_lock:
+        _mapping = mapping
+        _reloads += 1
+    logger.info(f"✅ HSN mapping {current.version} -> {mapping.version} ({len(mapping.master)} codes)")
+    return True
+
+def hsn_mapping_stats() -> Dict[str, Any]:
+    mapping = get_hsn_mapping()
+    return {
+        "version": mapping.version,
+        "codes": len(mapping.master),
+        "loaded_at": mapping.loaded_at,
+        "reloads": _reloads,
+        "failed_reloads": _failed_reloads,
+    }
+
+def _start_watcher() -> None:
+    """Poll the sources for changes in a daemon thread of this process (call with the lock held)"""
+    global _watcher, _watcher_pid
+    if _watcher_pid == os.getpid():
+        return
+    _watcher_pid = os.getpid()
+    if settings.HSN_RELOAD_SECONDS <= 0:
+        return
+
+    def watch():
+        while True:
+            time.sleep(settings.HSN_RELOAD_SECONDS)
+            try:
+                reload_hsn_mapping()
+            except Exception as e:
+                logger.error(f"❌ HSN mapping watcher error: {str(e)}")
+
+    _watcher = threading.Thread(target=watch, name="hsn-watcher", daemon=True)
+    _watcher.start()
+
+def _reset_locks_after_fork() -> None:
+    # A lock held by a thread of the parent at fork time would never be
+    # released in the child
+    global _mapping_lock, _reload_lock
+    _mapping_lock = threading.Lock()
+    _reload_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+def _source_mtime() -> float:
+    """Latest change to the master source, the compiled table or the rate history"""
+    return max(_mtime(MASTER_SOURCE), _mtime(MASTER_FILE), _mtime(RATE_HISTORY_SOURCE))
+
+def _open_compiled(digest: int) -> Optional[HsnMaster]:
+    """MASTER_FILE when it was compiled from the source with this digest, else None"""
+    try:
+        master = HsnMaster.open(MASTER_FILE)
+    except (OSError, ValueError, struct.error):
+        return None
+    return master if master.source_digest == digest else None
+
+def _load_mapping(generation: int) -> HsnMapping:
+    source_mtime = _source_mtime()
+    digest = hashlib.sha1()
+    rates = None
+    if RATE_HISTORY_SOURCE.exists():
+        raw_history = RATE_HISTORY_SOURCE.read_bytes()
+        rates = RateHistory(json.loads(raw_history))
+        digest.update(raw_history)
+
+    if not MASTER_SOURCE.exists():
+        # Deployed with the compiled table only
+        digest.update(MASTER_FILE.read_bytes())
+        return HsnMapping(HsnMaster.open(MASTER_FILE), digest.hexdigest()[:12], source_mtime, generation, rates)
+
+    raw = MASTER_SOURCE.read_bytes()
+    digest.update(raw)
+    version = digest.hexdigest()[:12]
+    # Compared by content, not mtime: a source restored with an old mtime
+    # still replaces a newer table compiled from something else
+    raw_digest = source_digest(raw)
+    master = _open_compiled(raw_digest)
+    if master is None:
+        logger.info(f"🔄 Compiling HSN master from {MASTER_SOURCE}...")
+        mapping = json.loads(raw)
+        try:
+            write_master(mapping, MASTER_FILE, raw_digest)
+        except OSError as e:
+            # Read-only deployment: keep the compiled table in memory
+            logger.warning(f"⚠️ Could not write {MASTER_FILE}: {str(e)}")
+            return HsnMapping(HsnMaster(compile_master(mapping, raw_digest)), version, source_mtime, generation, rates)
+        # Our own write is not a change to poll for
+        source_mtime = max(source_mtime, _mtime(MASTER_FILE))
+        # Replacing MASTER_FILE later leaves this mapping of the old file intact
+        master = HsnMaster.open(MASTER_FILE)
+    logger.info(f"✅ HSN master {version} loaded ({len(master)} codes, {len(rates or ())} with rate history)")
+    return HsnMapping(master, version, source_mtime, generation, rates)
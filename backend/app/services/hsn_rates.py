@@ -0,0 +1,87 @@
+"""
+Effective-Dated GST Rates
+
+This module keeps the rate history of HSN/SAC codes whose rates changed by
+notification, so back-dated invoices get the rate in force on their date:
+- Periods per code (effective from, inclusive; to, exclusive; open-ended
+  for the current rate) loaded from app/data/hsn_rate_history.json
+- Sorted interval arrays per code, so (code, date) is one binary search
+- Codes without history, and dates outside a code's history, keep the
+  master's current rate
+- A period with a category the master does not know rejects the whole
+  file, so a reload keeps the current version
+
+Author: Dev 2
+"""
+from bisect import bisect_right
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.hsn_index import CATEGORIES, normalize_code
+
+OPEN_END = date.max.toordinal()
+
+
+class RateHistory:
+    def __init__(self, history: Dict[str, List[Dict[str, Any]]]):
+        """
+        Args:
+            history: Code -> periods ({"from": "YYYY-MM-DD", "to": "YYYY-MM-DD"
+                (optional), "default_category": "18%"})
+        """
+        # code -> (start ordinals, end ordinals, categories), sorted by start
+        self._periods: Dict[str, Tuple[List[int], List[int], List[str]]] = {}
+        for raw_code, periods in history.items():
+            code = normalize_code(raw_code)
+            rows = sorted(
+                (
+                    date.fromisoformat(period["from"]).toordinal(),
+                    date.fromisoformat(period["to"]).toordinal() if period.get("to") else OPEN_END,
+                    period["default_category"],
+                )
+                for period in periods
+            )
+            for (start, end, _), (next_start, _, _) in zip(rows, rows[1:]):
+                if end > next_start:
+                    raise ValueError(f"Overlapping rate periods for HSN code {raw_code}")
+            if any(start >= end for start, end, _ in rows):
+                raise ValueError(f"Empty rate period for HSN code {raw_code}")
+            for _, _, category in rows:
+                if category not in CATEGORIES:
+                    raise ValueError(f"Unknown GST category {category!r} for HSN code {raw_code}")
+            self._periods[code] = (
+                [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+            )
+        self._lengths = sorted({len(code) for code in self._periods}, reverse=True)
+
+    def __len__(self) -> int:
+        return len(self._periods)
+
+    def category_on(self, code: str, on: date) -> Optional[str]:
+        """Category of an exact code in force on a date, or None outside its history"""
+        periods = self._periods.get(code)
+        if periods is None:
+            return None
+        starts, ends, categories = periods
+        index = bisect_right(starts, on.toordinal()) - 1
+        if index < 0 or on.toordinal() >= ends[index]:
+            return None
+        return categories[index]
+
+    def resolve(self, query: str, matched_code: str, on: date) -> Optional[Tuple[str, str]]:
+        """
+        (code, category) in force on a date for a looked-up code: the most
+        specific code with history that prefixes query and is at least as
+        specific as the master code it matched, or None
+        """
+        for digits in self._lengths:
+            if digits < len(matched_code):
+                break
+            if digits > len(query):
+                continue
+            code = query[:digits]
+            if code in self._periods:
+                category = self.category_on(code, on)
+                if category is not None:
+                    return code, category
+        return None
@@ -0,0 +1,126 @@
+"""
+HSN/SAC Description Search
+
+This module suggests HSN/SAC codes for free-text item descriptions:
+- Features per description: normalized words plus character trigrams of
+  each word, so plurals, misspellings and run-together OCR words still match
+- TF-IDF weights, L2-normalized, so scores are cosine similarities in [0, 1]
+- An inverted index (feature -> postings of (entry, weight)) built once per
+  master, so a query only touches entries sharing a feature with it
+- Top-k candidates with ties going to the more specific code
+
+Author: Dev 2
+"""
+from collections import Counter
+import heapq
+import math
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+STOPWORDS = {"a", "an", "and", "or", "of", "the", "to", "for", "with", "in", "on", "not", "other", "than"}
+NGRAM = 3
+
+
+def description_tokens(text: str) -> Tuple[str, ...]:
+    """Normalized words of an item description: lowercase, no numbers or stopwords, plurals folded"""
+    tokens = []
+    for word in re.findall(r"[a-z]+", str(text).lower()):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tuple(tokens)
+
+
+def description_features(text: str) -> Counter:
+    """Word and character-trigram counts of a description"""
+    features: Counter = Counter()
+    for token in description_tokens(text):
+        features["w:" + token] += 1
+        padded = f"#{token}#"
+        for start in range(len(padded) - NGRAM + 1):
+            features["g:" + padded[start:start + NGRAM]] += 1
+    return features
+
+
+def _tf(count: int) -> float:
+    return 1.0 + math.log(count)
+
+
+class HsnDescriptionIndex:
+    def __init__(self, entries: Iterable[Tuple[str, Dict[str, Any]]]):
+        """
+        Args:
+            entries: (code, master entry) pairs, e.g. HsnMaster.items()
+        """
+        self._codes: List[str] = []
+        documents: List[Counter] = []
+        for code, info in entries:
+            features = description_features(info.get("description", ""))
+            if features:
+                self._codes.append(code)
+                documents.append(features)
+
+        count = len(documents)
+        document_frequency: Counter = Counter()
+        for features in documents:
+            document_frequency.update(features.keys())
+        self._idf = {
+            feature: math.log((1 + count) / (1 + frequency)) + 1.0
+            for feature, frequency in document_frequency.items()
+        }
+
+        import numpy as np
+
+        postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        for document, features in enumerate(documents):
+            weights = {feature: _tf(n) * self._idf[feature] for feature, n in features.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+            for feature, weight in weights.items():
+                documents_of, weights_of = postings.setdefault(feature, ([], []))
+                documents_of.append(document)
+                weights_of.append(weight / norm)
+        # feature -> (entry indices, normalized weights) as arrays, so a query
+        # accumulates scores with one bincount
+        self._postings = {
+            feature: (np.array(documents_of, dtype=np.int32), np.array(weights_of, dtype=np.float32))
+            for feature, (documents_of, weights_of) in postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def search(self, text: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Up to k (code, cosine similarity) candidates for a description, best first"""
+        import numpy as np
+
+        # Features no entry has still count towards the query norm (with the
+        # idf of a feature seen nowhere), so unrelated words lower the score
+        unseen_idf = math.log(1 + len(self._codes)) + 1.0
+        weights = {
+            feature: _tf(n) * self._idf.get(feature, unseen_idf)
+            for feature, n in description_features(text).items()
+        }
+        if not weights:
+            return []
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+
+        matched = [feature for feature in weights if feature in self._postings]
+        if not matched:
+            return []
+        entries = np.concatenate([self._postings[feature][0] for feature in matched])
+        contributions = np.concatenate([
+            self._postings[feature][1] * (weights[feature] / norm) for feature in matched
+        ])
+        scores = np.bincount(entries, weights=contributions, minlength=len(self._codes))
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            # Keep ties at the k-th score so the more specific code can win them
+            kth = np.partition(scores[candidates], -k)[-k]
+            candidates = candidates[scores[candidates] >= kth]
+        best = heapq.nlargest(
+            k, candidates.tolist(), key=lambda entry: (round(float(scores[entry]), 6), len(self._codes[entry]))
+        )
+        return [(self._codes[entry], round(float(scores[entry]), 3)) for entry in best]
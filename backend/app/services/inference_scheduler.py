@@ -0,0 +1,173 @@
+"""
+Micro-batching Inference Scheduler
+
+This module batches concurrent model requests inside one process:
+- Callers submit single items and get a Future back
+- A worker thread collects pending items for up to max_wait_ms or
+  max_batch_size items and runs one batched call
+- A batch that fails is retried one item at a time, so only the requests
+  that fail on their own get the error
+- Queue depth and batch size histograms for sizing the limits
+
+One worker owns the model, so concurrent requests no longer compete for the
+same intra-op threads with separate forward passes.
+
+Author: Dev 1
+"""
+from collections import Counter
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _power_of_two_bucket(value: int) -> int:
+    """Smallest power of two >= value (0 stays 0)"""
+    return 0 if value <= 0 else 1 << (value - 1).bit_length()
+
+
+class InferenceScheduler:
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        name: str = "inference"
+    ):
+        """
+        Args:
+            run_batch: Maps a list of items to a list of results in the same order
+            max_batch_size: Most items per run_batch call
+            max_wait_ms: How long the first item of a batch waits for others
+            name: Worker thread name
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._failed_requests = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+        self._batch_sizes: Counter = Counter()
+        self._queue_depths: Counter = Counter()
+
+        self._worker = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue an item; the Future resolves to its result"""
+        if not self._worker.is_alive():
+            raise RuntimeError("InferenceScheduler has been shut down")
+        future: Future = Future()
+        with self._lock:
+            self._requests += 1
+            self._queue_depths[_power_of_two_bucket(self._queue.qsize() + 1)] += 1
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Request and batch counters, mean wait and run times, and histograms of
+        batch sizes and of the queue depth seen by arriving requests (bucketed
+        by powers of two)
+        """
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": self._batches,
+                "failed_batches": self._failed_batches,
+                "failed_requests": self._failed_requests,
+                "mean_batch_size": self._requests_batched() / self._batches if self._batches else 0.0,
+                "mean_wait_ms": 1000 * self._wait_seconds / max(self._requests_batched(), 1),
+                "mean_batch_ms": 1000 * self._run_seconds / max(self._batches, 1),
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "queue_depth_histogram": dict(sorted(self._queue_depths.items())),
+            }
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Finish queued work and stop the worker"""
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+    def _requests_batched(self) -> int:
+        return sum(size * count for size, count in self._batch_sizes.items())
+
+    def _collect(self) -> Tuple[List[Tuple[Any, Future, float]], bool]:
+        """Block for one item, then gather more until the batch is full or the wait expires"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _loop(self) -> None:
+        while True:
+            batch, stop = self._collect()
+            # Skip requests whose callers cancelled while queued
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if batch:
+                self._run(batch)
+            if stop:
+                return
+
+    def _run(self, batch: List[Tuple[Any, Future, float]]) -> None:
+        started = time.perf_counter()
+        failed = False
+        try:
+            outcomes = [(True, result) for result in self._call([item for item, _, _ in batch])]
+        except Exception as e:
+            logger.error(f"❌ Inference batch of {len(batch)} failed: {str(e)}")
+            failed = True
+            outcomes = [(False, e)] if len(batch) == 1 else [self._run_one(item) for item, _, _ in batch]
+
+        finished = time.perf_counter()
+        # Counters first, so a caller woken by its future sees this batch in stats()
+        with self._lock:
+            self._batches += 1
+            self._failed_batches += failed
+            self._failed_requests += sum(not ok for ok, _ in outcomes)
+            self._batch_sizes[len(batch)] += 1
+            self._wait_seconds += sum(started - enqueued for _, _, enqueued in batch)
+            self._run_seconds += finished - started
+
+        for (_, future, _), (ok, outcome) in zip(batch, outcomes):
+            if ok:
+                future.set_result(outcome)
+            else:
+                future.set_exception(outcome)
+
+    def _call(self, items: List[Any]) -> List[Any]:
+        results = self.run_batch(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"run_batch returned {len(results)} results for {len(items)} items")
+        return results
+
+    def _run_one(self, item: Any) -> Tuple[bool, Any]:
+        """Retry one item of a failed batch on its own: (ok, result or exception)"""
+        try:
+            return True, self._call([item])[0]
+        except Exception as e:
+            return False, e
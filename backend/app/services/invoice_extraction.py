@@ -1,69 +1,254 @@
-import torch
-from transformers import LayoutLMv3Processor, LayoutLMv3ForTokenClassification
 from PIL import Image
-from typing import List, Dict
-import os
-
-# Load fine-tuned model
-MODEL_DIR = "models/layoutlmv3-sroie"
-processor = LayoutLMv3Processor.from_pretrained(MODEL_DIR)
-model = LayoutLMv3ForTokenClassification.from_pretrained(MODEL_DIR)
-model.eval()
-
-# Map class IDs to field labels
-LABEL_MAP = {
-    1: "total",
-    2: "total",
-    3: "date",
-    4: "date",
-    5: "company",
-    6: "company",
-    7: "address",
-    8: "address",
-}
-
-def extract_fields_with_model(image_path: str, ocr_words: List[str], boxes: List[List[int]]) -> Dict[str, str]:
+from typing import List, Dict, Tuple, Any, Optional
+import logging
+import threading
+
+from app.core.config import settings
+from app.services.model_manager import ModelKey, get_model_manager
+from app.services.layoutlm_decoding import FieldPrediction, group_fields, softmax, word_ids_array, word_predictions
+
+logger = logging.getLogger(__name__)
+
+# Fine-tuned model, loaded on first use (see get_model)
+MODEL_DIR = settings.LAYOUTLM_MODEL_DIR
+
+def model_key() -> ModelKey:
+    """Model manager key of the configured LayoutLMv3 backend"""
+    return ModelKey(f"layoutlm/{settings.LAYOUTLM_BACKEND}", MODEL_DIR)
+
+def get_model() -> Tuple[Any, Any]:
+    """
+    Load the configured LayoutLMv3 inference backend (settings.LAYOUTLM_BACKEND)
+    and its processor through the model manager.
+    torch and transformers are imported here so importing this module stays cheap.
+    """
+    def load():
+        from app.services.layoutlm_backends import load_backend
+
+        loaded_backend = load_backend(settings.LAYOUTLM_BACKEND, MODEL_DIR)
+        loaded_backend.processor  # load the tokenizer now too, so warm-up covers it
+        return loaded_backend
+
+    backend = get_model_manager().get(model_key(), load, size_of=lambda loaded: loaded.weight_bytes)
+    return backend.processor, backend
+
+def model_loaded() -> bool:
+    return get_model_manager().loaded(model_key())
+
+def normalize_boxes(boxes: List[List[int]], width: int, height: int) -> List[List[int]]:
+    """Scale pixel [x0, y0, x1, y1] boxes to the 0-1000 grid LayoutLMv3 expects"""
+    def scale(value, size):
+        return min(1000, max(0, int(1000 * value / size)))
+
+    return [
+        [scale(x0, width), scale(y0, height), scale(x1, width), scale(y1, height)]
+        for x0, y0, x1, y1 in (box[:4] for box in boxes)
+    ]
+
+# Micro-batching scheduler for concurrent requests (created on first use)
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_inference_scheduler():
+    """Return the process-wide scheduler batching predict_fields_batch calls"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from app.services.inference_scheduler import InferenceScheduler
+
+            _scheduler = InferenceScheduler(
+                predict_fields_batch,
+                max_batch_size=settings.LAYOUTLM_BATCH_SIZE,
+                max_wait_ms=settings.LAYOUTLM_MAX_BATCH_WAIT_MS,
+                name="layoutlm-scheduler"
+            )
+    return _scheduler
+
+def shutdown_inference_scheduler() -> None:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.shutdown()
+            _scheduler = None
+
+# Document to extract from: (RGB image, OCR words, pixel [x0, y0, x1, y1] boxes)
+Document = Tuple[Image.Image, List[str], List[List[int]]]
+
+def length_buckets(lengths: List[int], batch_size: int) -> List[List[int]]:
+    """
+    Group document indices into batches of similar token length so each
+    batch pads only to its own longest document
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+def predict_fields_batch(
+    documents: List[Document],
+    backend: Optional[Any] = None,
+    batch_size: Optional[int] = None,
+    boxes_normalized: bool = False
+) -> List[Dict[str, FieldPrediction]]:
+    """
+    Predict word labels for many invoices and group them into fields with
+    confidences.
+
+    Documents are bucketed by token length and each bucket runs as one forward
+    pass padded to its longest member, so short receipts do not pay for
+    512-token attention. Documents longer than the model's token limit are
+    split into overlapping windows (settings.LAYOUTLM_WINDOW_STRIDE tokens of
+    overlap) that run in the same batches; each word keeps the prediction of
+    the window that is most confident about it.
+
+    Args:
+        documents: (image, words, pixel boxes) per invoice
+        backend: LayoutLM backend to run (default: the configured one)
+        batch_size: Windows per forward pass (defaults to settings.LAYOUTLM_BATCH_SIZE)
+        boxes_normalized: Boxes are already on the 0-1000 grid (as in
+            datasets/sroie_tokenized) instead of in pixels
+
+    Returns:
+        Field name -> FieldPrediction, one dict per document in input order
+    """
+    import numpy as np
+
+    if backend is None:
+        _, backend = get_model()
+    batch_size = batch_size or settings.LAYOUTLM_BATCH_SIZE
+
+    words = [doc_words for _, doc_words, _ in documents]
+    boxes = [
+        doc_boxes if boxes_normalized else normalize_boxes(doc_boxes, *image.size)
+        for image, _, doc_boxes in documents
+    ]
+
+    # Tokenizing alone is cheap and gives the untruncated length of each document
+    token_ids = backend.processor.tokenizer(text=words, boxes=boxes, truncation=False, verbose=False)["input_ids"]
+
+    results: List[Dict[str, FieldPrediction]] = [{} for _ in documents]
+    for bucket in length_buckets([len(ids) for ids in token_ids], batch_size):
+        encoding = backend.processor(
+            images=[documents[i][0] for i in bucket],
+            text=[words[i] for i in bucket],
+            boxes=[boxes[i] for i in bucket],
+            return_tensors="np",
+            truncation=True,
+            padding="longest",
+            stride=settings.LAYOUTLM_WINDOW_STRIDE,
+            return_overflowing_tokens=True
+        )
+        window_docs = encoding["overflow_to_sample_mapping"]
+        # The processor repeats the page image once per window as a list
+        inputs = {key: np.asarray(encoding[key]) for key in encoding if key != "overflow_to_sample_mapping"}
+
+        probabilities = np.concatenate([
+            softmax(backend.predict_logits({key: value[start:start + batch_size] for key, value in inputs.items()}))
+            for start in range(0, len(window_docs), batch_size)
+        ])
+
+        predictions = word_predictions(
+            word_ids_array(encoding, len(window_docs)),
+            probabilities,
+            [len(words[i]) for i in bucket],
+            window_docs
+        )
+        for (labels, confidences), i in zip(predictions, bucket):
+            results[i] = group_fields(words[i], labels, confidences, backend.id2label)
+
+    return results
+
+def extract_fields_batch(
+    documents: List[Document],
+    backend: Optional[Any] = None,
+    batch_size: Optional[int] = None,
+    boxes_normalized: bool = False
+) -> List[Dict[str, str]]:
+    """
+    Batched field extraction, see predict_fields_batch
+
+    Returns:
+        Field name -> extracted text, one dict per document in input order
+    """
+    return [
+        {name: field.text for name, field in fields.items()}
+        for fields in predict_fields_batch(
+            documents, backend=backend, batch_size=batch_size, boxes_normalized=boxes_normalized
+        )
+    ]
+
+def extract_fields(
+    image: Image.Image,
+    ocr_words: List[str],
+    boxes: List[List[int]],
+    backend: Optional[Any] = None,
+    boxes_normalized: bool = False
+) -> Dict[str, str]:
+    """
+    Predict a label for each word of an invoice image and aggregate fields
+    like total, date, etc.
+
+    Args:
+        image: RGB invoice image
+        ocr_words: OCR words
+        boxes: Pixel [x0, y0, x1, y1] box per word
+        backend: LayoutLM backend to run (default: the configured one)
+        boxes_normalized: Boxes are already on the 0-1000 grid
+
+    Returns:
+        Field name -> extracted text
+    """
+    return extract_fields_batch([(image, ocr_words, boxes)], backend=backend, boxes_normalized=boxes_normalized)[0]
+
+def template_fields(
+    image: Image.Image, ocr_words: List[str], boxes: List[List[int]], ocr_engine: str
+) -> Optional[Dict[str, str]]:
+    """
+    Fields read from the vendor's layout template learned from the same OCR
+    engine, or None when the model has to run
+    """
+    from app.services.vendor_templates import get_template_store
+
+    store = get_template_store()
+    if store is None:
+        return None
+    match = store.extract(ocr_words, boxes, image.size, settings.TEMPLATE_MIN_CONFIDENCE, ocr_engine)
+    if match is None:
+        return None
+    return {name: field.text for name, field in match.fields.items()}
+
+def extract_fields_with_model(
+    image_path: str, ocr_words: List[str], boxes: List[List[int]], ocr_engine: str
+) -> Dict[str, str]:
     """
     Uses fine-tuned LayoutLMv3 model to predict labels for each word in invoice.
     Aggregates fields like total, date, etc.
+    Invoices from vendors with a matching layout template (for the OCR
+    engine that read the words) skip the model.
     """
     image = Image.open(image_path).convert("RGB")
+    fields = template_fields(image, ocr_words, boxes, ocr_engine)
+    if fields is not None:
+        return fields
+    return model_fields(image, ocr_words, boxes)
+
+def model_fields(image: Image.Image, ocr_words: List[str], boxes: List[List[int]]) -> Dict[str, str]:
+    """LayoutLMv3 fields for one invoice image, skipping vendor templates"""
+    if settings.LAYOUTLM_MICROBATCH:
+        # Concurrent requests share forward passes through the scheduler
+        fields = get_inference_scheduler().submit((image, ocr_words, boxes)).result()
+        return {name: field.text for name, field in fields.items()}
+    return extract_fields(image, ocr_words, boxes)
 
-    encoding = processor(
-        images=image,
-        text=ocr_words,
-        boxes=boxes,
-        return_tensors="pt",
-        truncation=True,
-        padding="max_length"
-    )
-
-    with torch.no_grad():
-        outputs = model(**encoding)
-        logits = outputs.logits
-        predictions = torch.argmax(logits, dim=-1)[0].tolist()
-
-    field_data = {}
-    current_field = None
-    current_value = []
-
-    for idx, pred in enumerate(predictions):
-        label = LABEL_MAP.get(pred, "O")
-        word = ocr_words[idx]
-
-        if label == "O":
-            if current_field:
-                field_data[current_field] = " ".join(current_value).strip()
-                current_field = None
-                current_value = []
-        else:
-            if current_field and current_field != label:
-                field_data[current_field] = " ".join(current_value).strip()
-                current_value = []
-            current_field = label
-            current_value.append(word)
-
-    if current_field and current_value:
-        field_data[current_field] = " ".join(current_value).strip()
-
-    return field_data
+def extract_fields_with_model_batch(
+    documents: List[Tuple[str, List[str], List[List[int]]]], ocr_engine: str
+) -> List[Dict[str, str]]:
+    """Batched extract_fields_with_model over (image_path, words, boxes) triples read by one OCR engine"""
+    loaded = [
+        (Image.open(image_path).convert("RGB"), ocr_words, boxes)
+        for image_path, ocr_words, boxes in documents
+    ]
+    results = [template_fields(*document, ocr_engine) for document in loaded]
+    pending = [i for i, fields in enumerate(results) if fields is None]
+    if pending:
+        for i, fields in zip(pending, extract_fields_batch([loaded[i] for i in pending])):
+            results[i] = fields
+    return results
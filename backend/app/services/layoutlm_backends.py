@@ -0,0 +1,181 @@
+"""
+LayoutLMv3 Inference Backends
+
+This module runs the fine-tuned LayoutLMv3 token classifier behind one
+interface so the runtime can be switched without touching extraction code:
+- torch: PyTorch FP32 (reference), optionally memory-mapped from the
+  safetensors checkpoint so workers share one copy of the weights
+- torch-int8: PyTorch with dynamic INT8 quantization of the Linear layers
+- onnx / onnx-int8: ONNX Runtime on the exported (and dynamically quantized)
+  graph written by scripts/export_layoutlm_onnx.py
+
+Every backend takes the processor encoding as NumPy arrays and returns
+logits of shape (batch, sequence, labels).
+
+Author: Dev 1
+"""
+from abc import ABC, abstractmethod
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Exported graphs live next to the PyTorch weights
+ONNX_SUBDIR = "onnx"
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+
+# Encoding keys consumed by LayoutLMv3ForTokenClassification
+MODEL_INPUTS = ["input_ids", "bbox", "attention_mask", "pixel_values"]
+
+
+class LayoutLMBackend(ABC):
+    """Common interface for LayoutLMv3 runtimes"""
+
+    name: str = ""
+
+    def __init__(self, model_dir: str):
+        self.model_dir = Path(model_dir)
+        self.id2label: Dict[int, str] = {}
+        self._processor = None
+
+    @property
+    def processor(self):
+        """LayoutLMv3 processor saved with the model (tokenizer and image preprocessing)"""
+        if self._processor is None:
+            from transformers import LayoutLMv3Processor
+            self._processor = LayoutLMv3Processor.from_pretrained(self.model_dir)
+        return self._processor
+
+    @property
+    @abstractmethod
+    def weight_bytes(self) -> int:
+        """Memory held by the model weights"""
+
+    @abstractmethod
+    def predict_logits(self, encoding: Dict[str, "np.ndarray"]) -> "np.ndarray":
+        """Run the token classifier on a NumPy encoding"""
+
+
+class TorchBackend(LayoutLMBackend):
+    name = "torch"
+
+    def __init__(self, model_dir: str, quantize: bool = False, mmap: bool = False):
+        super().__init__(model_dir)
+        import torch
+        from transformers import LayoutLMv3ForTokenClassification
+
+        if mmap and not quantize:
+            from app.services.shared_weights import load_pretrained_mmap
+            model = load_pretrained_mmap(LayoutLMv3ForTokenClassification, model_dir)
+        else:
+            model = LayoutLMv3ForTokenClassification.from_pretrained(model_dir)
+        model.eval()
+        if quantize:
+            # Linear layers hold almost all of the weights and FLOPs. The
+            # relative position biases are Linear modules whose weight the
+            # encoder indexes directly, so they stay FP32.
+            targets = {
+                name for name, module in model.named_modules()
+                if isinstance(module, torch.nn.Linear) and "rel_pos" not in name
+            }
+            model = torch.ao.quantization.quantize_dynamic(model, targets, dtype=torch.qint8)
+            self.name = "torch-int8"
+        self.model = model
+        self.id2label = {int(k): v for k, v in model.config.id2label.items()}
+
+    @property
+    def weight_bytes(self) -> int:
+        from app.services.model_manager import module_bytes
+        return module_bytes(self.model)
+
+    def predict_logits(self, encoding: Dict[str, "np.ndarray"]) -> "np.ndarray":
+        import torch
+
+        inputs = {key: torch.from_numpy(encoding[key]) for key in MODEL_INPUTS if key in encoding}
+        with torch.inference_mode():
+            return self.model(**inputs).logits.float().numpy()
+
+
+class OnnxBackend(LayoutLMBackend):
+    name = "onnx"
+
+    def __init__(self, model_dir: str, quantized: bool = False):
+        super().__init__(model_dir)
+        import onnxruntime as ort
+        from transformers import AutoConfig
+
+        model_path = self.model_dir / ONNX_SUBDIR / (ONNX_INT8_FILE if quantized else ONNX_FP32_FILE)
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"{model_path} not found, run scripts/export_layoutlm_onnx.py first"
+            )
+        if quantized:
+            self.name = "onnx-int8"
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._model_path = model_path
+        self._input_names = [i.name for i in self.session.get_inputs()]
+
+        config = AutoConfig.from_pretrained(model_dir)
+        self.id2label = {int(k): v for k, v in config.id2label.items()}
+
+    @property
+    def weight_bytes(self) -> int:
+        # The session keeps its own copy of the initializers in the graph file
+        return self._model_path.stat().st_size
+
+    def predict_logits(self, encoding: Dict[str, "np.ndarray"]) -> "np.ndarray":
+        import numpy as np
+
+        inputs = {}
+        for name in self._input_names:
+            dtype = np.float32 if name == "pixel_values" else np.int64
+            inputs[name] = np.ascontiguousarray(encoding[name], dtype=dtype)
+        return self.session.run(None, inputs)[0]
+
+
+BACKENDS: Dict[str, Callable[[str], LayoutLMBackend]] = {
+    "torch": lambda model_dir: TorchBackend(model_dir, mmap=settings.MODEL_WEIGHTS_MMAP),
+    "torch-int8": lambda model_dir: TorchBackend(model_dir, quantize=True),
+    "onnx": lambda model_dir: OnnxBackend(model_dir),
+    "onnx-int8": lambda model_dir: OnnxBackend(model_dir, quantized=True),
+}
+
+
+def available_backends(model_dir: str) -> List[str]:
+    """Backends whose weights are present under model_dir"""
+    onnx_dir = Path(model_dir) / ONNX_SUBDIR
+    names = ["torch", "torch-int8"] if Path(model_dir, "config.json").exists() else []
+    if (onnx_dir / ONNX_FP32_FILE).exists():
+        names.append("onnx")
+    if (onnx_dir / ONNX_INT8_FILE).exists():
+        names.append("onnx-int8")
+    return names
+
+
+def load_backend(name: str, model_dir: str) -> LayoutLMBackend:
+    """
+    Load a LayoutLMv3 backend by name
+
+    Args:
+        name: One of BACKENDS
+        model_dir: Fine-tuned model directory (weights, config, processor)
+
+    Returns:
+        Loaded backend ready for predict_logits
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LayoutLM backend '{name}', expected one of {', '.join(BACKENDS)}")
+    logger.info(f"🔄 Loading LayoutLMv3 backend {name} from {model_dir}...")
+    return BACKENDS[name](model_dir)
@@ -0,0 +1,163 @@
+"""
+LayoutLMv3 Prediction Decoding
+
+This module turns token-level LayoutLMv3 outputs into invoice fields:
+- Token to word alignment through the encoding's word_ids, labelling each
+  word by its first subword token
+- Softmax confidence per word, keeping the most confident window when
+  overlapping windows cover the same word
+- BIO span grouping into fields with a per-field confidence
+
+Everything is vectorized with NumPy; the only per-token Python work is
+reading word_ids off the encoding.
+
+Author: Dev 1
+"""
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# word_ids value for special and padding tokens
+NO_WORD = -1
+
+
+@dataclass
+class FieldPrediction:
+    text: str
+    confidence: float
+
+
+def softmax(logits: "np.ndarray") -> "np.ndarray":
+    """Softmax over the label axis"""
+    import numpy as np
+
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def word_ids_array(encoding, rows: int) -> "np.ndarray":
+    """(rows, sequence) word index per token, NO_WORD for special and padding tokens"""
+    import numpy as np
+
+    return np.array([
+        [NO_WORD if word_id is None else word_id for word_id in encoding.word_ids(row)]
+        for row in range(rows)
+    ], dtype=np.int64)
+
+
+def word_predictions(
+    word_ids: "np.ndarray",
+    probabilities: "np.ndarray",
+    word_counts: Sequence[int],
+    window_docs: Optional[Sequence[int]] = None
+) -> List[Tuple["np.ndarray", "np.ndarray"]]:
+    """
+    Label and confidence per word from token probabilities
+
+    Args:
+        word_ids: (windows, sequence) from word_ids_array
+        probabilities: (windows, sequence, labels) softmax outputs
+        word_counts: Number of words in each document
+        window_docs: Document index of each window (default: one window per document)
+
+    Returns:
+        (labels, confidences) arrays per document. Words no window reached get
+        label 0 and confidence 0.
+    """
+    import numpy as np
+
+    windows = word_ids.shape[0]
+    window_docs = np.arange(windows) if window_docs is None else np.asarray(window_docs)
+    probabilities = probabilities[:, :word_ids.shape[1]]
+
+    # A token starts a word when it maps to a word different from the token before it
+    previous = np.concatenate([np.full((windows, 1), NO_WORD), word_ids[:, :-1]], axis=1)
+    first_subword = (word_ids != NO_WORD) & (word_ids != previous)
+
+    window_index, token_index = np.nonzero(first_subword)
+    token_probabilities = probabilities[window_index, token_index]
+    token_labels = token_probabilities.argmax(-1)
+    token_confidences = token_probabilities.max(-1)
+
+    # Flatten (document, word) into one index and keep the most confident token per word
+    offsets = np.concatenate([[0], np.cumsum(word_counts)])
+    flat_words = offsets[window_docs[window_index]] + word_ids[window_index, token_index]
+    order = np.lexsort((-token_confidences, flat_words))
+    flat_words, first = np.unique(flat_words[order], return_index=True)
+
+    labels = np.zeros(offsets[-1], dtype=np.int64)
+    confidences = np.zeros(offsets[-1], dtype=np.float32)
+    labels[flat_words] = token_labels[order][first]
+    confidences[flat_words] = token_confidences[order][first]
+
+    return [
+        (labels[start:end], confidences[start:end])
+        for start, end in zip(offsets[:-1], offsets[1:])
+    ]
+
+
+def label_field(label: str) -> Optional[str]:
+    """Field named by a BIO label ("B-total" -> "total"), None outside fields"""
+    if label == "O":
+        return None
+    if label.startswith(("B-", "I-")):
+        return label[2:]
+    return label
+
+
+def group_fields(
+    words: Sequence[str],
+    labels: "np.ndarray",
+    confidences: "np.ndarray",
+    id2label: Dict[int, str]
+) -> Dict[str, FieldPrediction]:
+    """
+    Group per-word BIO labels into fields
+
+    A span is a run of consecutive words labelled with the same field. B-
+    does not split a run because scripts/train_sroie.py tags every field
+    word B-, so models trained with it never emit I-. A span's confidence is
+    the mean of its word confidences, and when a field has several spans the
+    most confident wins.
+    """
+    import numpy as np
+
+    if len(words) == 0:
+        return {}
+
+    names: List[str] = []
+    field_of_label = np.zeros(max(id2label) + 1, dtype=np.int64)  # 0 = no field
+    for label_id, label in id2label.items():
+        field = label_field(label)
+        if field is not None:
+            if field not in names:
+                names.append(field)
+            field_of_label[label_id] = names.index(field) + 1
+
+    fields = field_of_label[labels]
+    previous = np.concatenate([[0], fields[:-1]])
+    starts = (fields > 0) & (fields != previous)
+    span_ids = np.cumsum(starts) * (fields > 0)  # 0 outside spans
+
+    span_count = int(span_ids.max())
+    if span_count == 0:
+        return {}
+    span_confidence = (
+        np.bincount(span_ids, weights=confidences, minlength=span_count + 1)[1:]
+        / np.bincount(span_ids, minlength=span_count + 1)[1:]
+    )
+    span_field = fields[starts]
+
+    result: Dict[str, FieldPrediction] = {}
+    for span in np.argsort(-span_confidence, kind="stable"):
+        name = names[span_field[span] - 1]
+        if name in result:
+            continue
+        positions = np.flatnonzero(span_ids == span + 1)
+        result[name] = FieldPrediction(
+            text=" ".join(words[i] for i in positions).strip(),
+            confidence=float(span_confidence[span])
+        )
+    return result
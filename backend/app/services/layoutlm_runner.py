@@ -1,12 +1,24 @@
-from transformers import LayoutLMv3ForTokenClassification, LayoutLMv3Processor
 from PIL import Image
-import torch
 
-# Load model and processor
-processor = LayoutLMv3Processor.from_pretrained("microsoft/layoutlmv3-base", apply_ocr=False)
-model = LayoutLMv3ForTokenClassification.from_pretrained("microsoft/layoutlmv3-base")
+from app.services.model_manager import ModelKey, get_model_manager, module_bytes
+
+BASE_MODEL = "microsoft/layoutlmv3-base"
+
+def get_model():
+    """Load the base LayoutLMv3 processor and model through the model manager"""
+    def load():
+        from transformers import LayoutLMv3ForTokenClassification, LayoutLMv3Processor
+
+        loaded_processor = LayoutLMv3Processor.from_pretrained(BASE_MODEL, apply_ocr=False)
+        loaded_model = LayoutLMv3ForTokenClassification.from_pretrained(BASE_MODEL)
+        return loaded_processor, loaded_model
+
+    return get_model_manager().get(
+        ModelKey("layoutlm-base", BASE_MODEL), load, size_of=lambda loaded: module_bytes(loaded[1])
+    )
 
 def prepare_inputs(tokens, boxes, image_path):
+    processor, _ = get_model()
     image = Image.open(image_path).convert("RGB")
 
     # LayoutLMv3 expects list of lists (batch)
@@ -16,31 +28,24 @@ def prepare_inputs(tokens, boxes, image_path):
     encoding = processor(
         image,
         boxes=boxes,
-        words=words,
+        text=words,
         return_tensors="pt",
-        padding="max_length",
+        padding="longest",
         truncation=True
     )
     return encoding
 
 def predict_fields(tokens, boxes, image_path):
+    import torch
+    from app.services.layoutlm_decoding import group_fields, softmax, word_ids_array, word_predictions
+
+    _, model = get_model()
     encoding = prepare_inputs(tokens, boxes, image_path)
 
     with torch.no_grad():
         outputs = model(**encoding)
 
-    logits = outputs.logits
-    predictions = torch.argmax(logits, dim=-1)
-
-    result = {}
-    for idx, label_id in enumerate(predictions[0]):
-        label = model.config.id2label[label_id.item()]
-        if label != "O" and idx < len(tokens):
-            key = label.replace("B-", "").replace("I-", "")
-            if key not in result:
-                result[key] = tokens[idx]
-            else:
-                result[key] += " " + tokens[idx]
-
-    return result
-
+    probabilities = softmax(outputs.logits.float().numpy())
+    [(labels, confidences)] = word_predictions(word_ids_array(encoding, 1), probabilities, [len(tokens)])
+    fields = group_fields(tokens, labels, confidences, model.config.id2label)
+    return {key: field.text for key, field in fields.items()}
@@ -0,0 +1,226 @@
+"""
+Model Manager
+
+This module owns every heavy model the process loads:
+- On-demand loading keyed by (kind, version, language)
+- A total memory cap enforced by evicting least recently used models
+- Eviction of models idle for longer than a timeout
+- Load time, hit, miss and eviction statistics for sizing worker memory
+
+Callers report model sizes from their weights (see module_bytes). Without a
+size, the growth in process RSS while loading is used instead, which also
+counts libraries imported by the first load.
+
+Author: Shared
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelKey:
+    kind: str
+    version: str = "default"
+    language: str = "en"
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{self.version}:{self.language}"
+
+
+@dataclass
+class _Entry:
+    model: Any
+    size_bytes: int
+    load_seconds: float
+    last_used: float
+    hits: int = 0
+
+
+def module_bytes(*modules) -> int:
+    """Bytes of the tensors in the state dicts of torch modules (including quantized packed weights)"""
+    import torch
+
+    def tensor_bytes(value) -> int:
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(tensor_bytes(item) for item in value)
+        return 0
+
+    return sum(tensor_bytes(value) for module in modules for value in module.state_dict().values())
+
+
+def _process_rss() -> int:
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+class ModelManager:
+    def __init__(self, max_bytes: int, idle_seconds: float = 0.0):
+        """
+        Args:
+            max_bytes: Total model memory to keep loaded (0 for no cap)
+            idle_seconds: Unload models unused for this long (0 to keep them)
+        """
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.lru_evictions = 0
+        self.idle_evictions = 0
+
+        self._lock = threading.Lock()
+        # Loads are serialized so RSS growth is attributed to the right model
+        self._load_lock = threading.Lock()
+        self._entries: "OrderedDict[ModelKey, _Entry]" = OrderedDict()  # least recently used first
+        self._reaper: Optional[threading.Thread] = None
+
+    def get(self, key: ModelKey, load: Callable[[], Any], size_of: Optional[Callable[[Any], int]] = None) -> Any:
+        """
+        Return the model for key, loading it with load() on a miss
+
+        Args:
+            key: Model identity
+            load: Builds the model
+            size_of: Model size in bytes (default: RSS growth during load)
+        """
+        model = self._lookup(key)
+        if model is not None:
+            return model
+
+        with self._load_lock:
+            # Another thread may have loaded it while we waited
+            model = self._lookup(key)
+            if model is not None:
+                return model
+
+            logger.info(f"🔄 Loading model {key}...")
+            rss_before = _process_rss()
+            started = time.perf_counter()
+            model = load()
+            load_seconds = time.perf_counter() - started
+            size_bytes = size_of(model) if size_of else max(0, _process_rss() - rss_before)
+            logger.info(f"✅ Loaded model {key} in {load_seconds:.1f}s ({size_bytes / 1e6:.0f} MB)")
+
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = _Entry(model, size_bytes, load_seconds, time.monotonic())
+                self._evict_over_budget(keep=key)
+        self.evict_idle()
+        return model
+
+    def loaded(self, key: ModelKey) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def peek(self, key: ModelKey) -> Optional[Any]:
+        """Return the model if loaded, without loading it or counting a hit"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.model if entry else None
+
+    def unload(self, key: ModelKey) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def evict_idle(self) -> List[ModelKey]:
+        """Unload models unused for longer than idle_seconds"""
+        if not self.idle_seconds:
+            return []
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [key for key, entry in self._entries.items() if entry.last_used < cutoff]
+            for key in idle:
+                del self._entries[key]
+                self.idle_evictions += 1
+        for key in idle:
+            logger.info(f"🧹 Unloaded idle model {key}")
+        return idle
+
+    def start_idle_reaper(self) -> Optional[threading.Thread]:
+        """Check for idle models periodically in a daemon thread"""
+        if not self.idle_seconds:
+            return None
+        with self._lock:
+            if self._reaper is None:
+                def reap():
+                    while True:
+                        time.sleep(max(1.0, self.idle_seconds / 2))
+                        self.evict_idle()
+
+                self._reaper = threading.Thread(target=reap, name="model-reaper", daemon=True)
+                self._reaper.start()
+        return self._reaper
+
+    def stats(self) -> Dict[str, Any]:
+        """Totals plus load time, size, hits and idle time per loaded model"""
+        now = time.monotonic()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "lru_evictions": self.lru_evictions,
+                "idle_evictions": self.idle_evictions,
+                "loaded_bytes": sum(entry.size_bytes for entry in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "models": {
+                    str(key): {
+                        "size_bytes": entry.size_bytes,
+                        "load_seconds": round(entry.load_seconds, 2),
+                        "hits": entry.hits,
+                        "idle_seconds": round(now - entry.last_used, 1),
+                    }
+                    for key, entry in self._entries.items()
+                },
+            }
+
+    def _lookup(self, key: ModelKey) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.hits += 1
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.model
+
+    def _evict_over_budget(self, keep: ModelKey) -> None:
+        if not self.max_bytes:
+            return
+        total = sum(entry.size_bytes for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries.pop(key).size_bytes
+            self.lru_evictions += 1
+            logger.info(f"🧹 Evicted least recently used model {key}")
+        if total > self.max_bytes:
+            logger.warning(f"⚠️ Model {keep} alone exceeds the model memory cap of {self.max_bytes / 1e6:.0f} MB")
+
+
+# Shared manager instance (created on first use)
+_manager: Optional[ModelManager] = None
+_manager_lock = threading.Lock()
+
+def get_model_manager() -> ModelManager:
+    """Return the process-wide model manager configured from settings"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelManager(settings.MODEL_MAX_BYTES, settings.MODEL_IDLE_SECONDS)
+            _manager.start_idle_reaper()
+    return _manager
@@ -0,0 +1,224 @@
+"""
+OCR Result Cache
+
+This module provides a persistent cache of OCR outputs:
+- Keys built from the image content hash, OCR engine, model version and
+  preprocessing parameters
+- Compact zlib-compressed binary entries (packed boxes and confidences,
+  length-prefixed UTF-8 words)
+- Size-bounded LRU eviction, with file mtimes carrying recency across restarts
+- Hit, miss and eviction counters
+
+Author: Dev 1
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import struct
+import threading
+from typing import Any, Dict, Optional
+import zlib
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"OCR1"
+ENTRY_SUFFIX = ".ocr"
+
+
+class OcrCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self._total_bytes = 0
+        self._load_index()
+
+    @staticmethod
+    def make_key(content: bytes, engine: str, version: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Build a cache key for an image
+
+        Args:
+            content: Raw image bytes
+            engine: OCR engine name
+            version: Engine or model version
+            params: Preprocessing/recognition parameters that affect the output
+
+        Returns:
+            Hex digest identifying the OCR output
+        """
+        content_hash = hashlib.sha256(content).hexdigest()
+        descriptor = json.dumps(
+            {"engine": engine, "version": version, "params": params or {}},
+            sort_keys=True
+        )
+        return hashlib.sha256(f"{content_hash}:{descriptor}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached OcrResult for key, or None on a miss"""
+        path = self._path(key)
+        with self._lock:
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except OSError:
+                # Never stored, or evicted by another worker sharing the directory
+                self._forget(key)
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                # Written by another worker sharing the directory
+                self._entries[key] = len(data)
+                self._total_bytes += len(data)
+
+        try:
+            result = _decode(data)
+        except (ValueError, struct.error, zlib.error) as e:
+            logger.warning(f"Discarding corrupt OCR cache entry {key}: {str(e)}")
+            with self._lock:
+                self._remove(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, result) -> None:
+        """Store an OcrResult and evict least recently used entries over the size bound"""
+        data = _encode(result)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write OCR cache entry {key}: {str(e)}")
+            return
+
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters and occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{ENTRY_SUFFIX}"
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU order from entry modification times"""
+        entries = []
+        for path in self.cache_dir.glob(f"*{ENTRY_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _forget(self, key: str) -> None:
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _remove(self, key: str) -> None:
+        self._forget(key)
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+
+def _encode(result) -> bytes:
+    """Pack an OcrResult into the compact binary entry format"""
+    encoded_words = [word.encode("utf-8") for word in result.words]
+    count = len(encoded_words)
+    flat_boxes = [int(v) for box in result.boxes for v in box[:4]]
+    payload = b"".join([
+        struct.pack("<I", count),
+        struct.pack(f"<{4 * count}i", *flat_boxes),
+        struct.pack(f"<{count}f", *result.confidences),
+        struct.pack(f"<{count}I", *(len(word) for word in encoded_words)),
+        *encoded_words,
+    ])
+    return MAGIC + zlib.compress(payload)
+
+
+def _decode(data: bytes):
+    """Unpack a binary entry into an OcrResult"""
+    from app.services.ocr_service import OcrResult
+
+    if not data.startswith(MAGIC):
+        raise ValueError("bad magic")
+    payload = zlib.decompress(data[len(MAGIC):])
+
+    (count,) = struct.unpack_from("<I", payload, 0)
+    offset = 4
+    flat_boxes = struct.unpack_from(f"<{4 * count}i", payload, offset)
+    offset += 16 * count
+    confidences = struct.unpack_from(f"<{count}f", payload, offset)
+    offset += 4 * count
+    lengths = struct.unpack_from(f"<{count}I", payload, offset)
+    offset += 4 * count
+
+    words = []
+    for length in lengths:
+        words.append(payload[offset:offset + length].decode("utf-8"))
+        offset += length
+
+    boxes = [list(flat_boxes[i:i + 4]) for i in range(0, 4 * count, 4)]
+    return OcrResult(words=words, boxes=boxes, confidences=list(confidences))
+
+
+# Shared cache instance (created on first use)
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_ocr_cache() -> Optional[OcrCache]:
+    """Return the process-wide OCR cache, or None when caching is disabled"""
+    global _cache
+    if not settings.OCR_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = OcrCache(settings.OCR_CACHE_DIR, settings.OCR_CACHE_MAX_BYTES)
+    return _cache
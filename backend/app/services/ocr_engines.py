@@ -0,0 +1,459 @@
+"""
+OCR Engines and Routing
+
+This module puts the OCR backends behind one interface:
+- OcrEngine: common recognize() returning words, boxes and confidences
+- EasyOCR, Tesseract and Google Vision implementations
+- OcrRouter: latency-budgeted engine selection that escalates to slower
+  engines only when the first pass has low confidence
+- A process-wide Google Vision client and batched batch_annotate_images
+  calls with a cap on concurrent requests
+
+Author: Dev 1
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+import io
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from app.core.config import settings
+from app.services.ocr_cache import OcrCache, get_ocr_cache
+from app.services.ocr_service import OCR_LANGUAGES, OcrResult, get_ocr_reader, results_to_layout
+
+logger = logging.getLogger(__name__)
+
+
+class OcrEngine(ABC):
+    """Common interface for OCR backends"""
+
+    name: str = ""
+    # Seconds per document assumed before the router has observed the engine
+    expected_latency: float = 1.0
+
+    @property
+    def version(self) -> str:
+        """Engine or model version, part of the OCR cache key"""
+        return "unknown"
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        """Parameters that change the engine output, part of the OCR cache key"""
+        return {}
+
+    @abstractmethod
+    def recognize(self, content: bytes) -> OcrResult:
+        """Run recognition on raw image bytes"""
+
+    def cache_key(self, content: bytes) -> str:
+        return OcrCache.make_key(content, self.name, self.version, self.params)
+
+    def lookup(self, content: bytes) -> Optional[OcrResult]:
+        """Return a cached result for this engine, if any"""
+        cache = get_ocr_cache()
+        return cache.get(self.cache_key(content)) if cache else None
+
+    def store(self, content: bytes, result: OcrResult) -> None:
+        cache = get_ocr_cache()
+        if cache:
+            cache.put(self.cache_key(content), result)
+
+    def run(self, content: bytes) -> OcrResult:
+        """Recognize with the OCR cache in front"""
+        result = self.lookup(content)
+        if result is None:
+            result = self.recognize(content)
+            self.store(content, result)
+        return result
+
+
+class EasyOcrEngine(OcrEngine):
+    name = "easyocr"
+    expected_latency = 3.0
+
+    @property
+    def version(self) -> str:
+        import easyocr
+        return easyocr.__version__
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return {"languages": OCR_LANGUAGES}
+
+    def recognize(self, content: bytes) -> OcrResult:
+        results = get_ocr_reader().readtext(content, batch_size=settings.OCR_RECOGNIZER_BATCH_SIZE)
+        return OcrResult(*results_to_layout(results))
+
+
+class TesseractEngine(OcrEngine):
+    name = "tesseract"
+    expected_latency = 0.5
+
+    def __init__(self, lang: str = "eng"):
+        self.lang = lang
+        self._version: Optional[str] = None
+
+    @property
+    def version(self) -> str:
+        if self._version is None:
+            import pytesseract
+            self._version = str(pytesseract.get_tesseract_version())
+        return self._version
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return {"lang": self.lang}
+
+    def recognize(self, content: bytes) -> OcrResult:
+        import pytesseract
+        from PIL import Image
+
+        image = Image.open(io.BytesIO(content)).convert("RGB")
+        data = pytesseract.image_to_data(image, lang=self.lang, output_type=pytesseract.Output.DICT)
+
+        words, boxes, confidences = [], [], []
+        for i, text in enumerate(data["text"]):
+            word = text.strip()
+            confidence = float(data["conf"][i])
+            # Layout rows (blocks, lines) carry conf -1 and no text
+            if not word or confidence < 0:
+                continue
+            x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
+            words.append(word)
+            boxes.append([x, y, x + w, y + h])
+            confidences.append(confidence / 100)
+
+        return OcrResult(words=words, boxes=boxes, confidences=confidences)
+
+
+def create_vision_client(endpoint: Optional[str] = None):
+    """
+    Build a Google Vision client.
+
+    With an endpoint (e.g. "127.0.0.1:8085") the client speaks plain HTTP/REST
+    with anonymous credentials, which is how the fake Vision server used in
+    tests and offline development is reached.
+    """
+    from google.cloud import vision
+
+    endpoint = endpoint or settings.GOOGLE_VISION_ENDPOINT
+    if not endpoint:
+        return vision.ImageAnnotatorClient()
+
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud.vision_v1.services.image_annotator.transports.rest import ImageAnnotatorRestTransport
+
+    transport = ImageAnnotatorRestTransport(
+        host=endpoint,
+        credentials=AnonymousCredentials(),
+        url_scheme="http"
+    )
+    return vision.ImageAnnotatorClient(transport=transport)
+
+
+# Shared Vision client (one gRPC channel and credential refresh per process)
+_vision_client = None
+_vision_client_lock = threading.Lock()
+# Caps concurrent Vision requests across all callers in the process
+_vision_slots: Optional[threading.BoundedSemaphore] = None
+
+def get_vision_client():
+    """Return the process-wide Vision client for settings.GOOGLE_VISION_ENDPOINT"""
+    global _vision_client
+    with _vision_client_lock:
+        if _vision_client is None:
+            _vision_client = create_vision_client()
+    return _vision_client
+
+def close_vision_client() -> None:
+    """Close the shared client's channel (call at shutdown)"""
+    global _vision_client
+    with _vision_client_lock:
+        if _vision_client is not None:
+            _vision_client.transport.close()
+            _vision_client = None
+
+def _vision_request_slots() -> threading.BoundedSemaphore:
+    global _vision_slots
+    with _vision_client_lock:
+        if _vision_slots is None:
+            _vision_slots = threading.BoundedSemaphore(settings.GOOGLE_VISION_MAX_CONCURRENCY)
+    return _vision_slots
+
+
+def vision_response_to_ocr(response) -> OcrResult:
+    """
+    Flatten a Vision document_text_detection response into words,
+    [x0, y0, x1, y1] boxes and word confidences
+    """
+    words = []
+    boxes = []
+    confidences = []
+
+    for page in response.full_text_annotation.pages:
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    word_text = ''.join([
+                        symbol.text for symbol in word.symbols
+                    ])
+                    words.append(word_text)
+                    confidences.append(word.confidence)
+
+                    # Get bounding box
+                    vertices = word.bounding_box.vertices
+                    box = [
+                        vertices[0].x,
+                        vertices[0].y,
+                        vertices[2].x,
+                        vertices[2].y
+                    ]
+                    boxes.append(box)
+
+    return OcrResult(words=words, boxes=boxes, confidences=confidences)
+
+
+class GoogleVisionEngine(OcrEngine):
+    name = "google-vision"
+    expected_latency = 1.5
+
+    def __init__(self, client=None, endpoint: Optional[str] = None):
+        self._client = client
+        self._endpoint = endpoint
+
+    @property
+    def client(self):
+        if self._client is None:
+            # An explicit endpoint gets its own client; otherwise share the process-wide one
+            self._client = create_vision_client(self._endpoint) if self._endpoint else get_vision_client()
+        return self._client
+
+    @property
+    def version(self) -> str:
+        from google.cloud import vision
+        return getattr(vision, "__version__", "unknown")
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return {"feature": "DOCUMENT_TEXT_DETECTION"}
+
+    def recognize(self, content: bytes) -> OcrResult:
+        from google.cloud import vision
+
+        with _vision_request_slots():
+            response = self.client.document_text_detection(image=vision.Image(content=content))
+        if response.error.message:
+            raise Exception(f"Vision API error: {response.error.message}")
+        return vision_response_to_ocr(response)
+
+    def recognize_batch(self, contents: List[bytes]) -> List[Union[OcrResult, Exception]]:
+        """
+        Recognize many images with batch_annotate_images calls of up to
+        settings.GOOGLE_VISION_BATCH_SIZE images, running at most
+        settings.GOOGLE_VISION_MAX_CONCURRENCY calls at a time.
+
+        Returns:
+            One OcrResult per image in input order, or the Exception for
+            images the API rejected
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from google.cloud import vision
+
+        batch_size = settings.GOOGLE_VISION_BATCH_SIZE
+        chunks = [contents[start:start + batch_size] for start in range(0, len(contents), batch_size)]
+        feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+
+        def annotate(chunk: List[bytes]) -> List[Union[OcrResult, Exception]]:
+            requests = [
+                vision.AnnotateImageRequest(image=vision.Image(content=content), features=[feature])
+                for content in chunk
+            ]
+            with _vision_request_slots():
+                responses = self.client.batch_annotate_images(requests=requests).responses
+            return [
+                Exception(f"Vision API error: {response.error.message}") if response.error.message
+                else vision_response_to_ocr(response)
+                for response in responses
+            ]
+
+        if len(chunks) <= 1:
+            return annotate(chunks[0]) if chunks else []
+        with ThreadPoolExecutor(max_workers=min(len(chunks), settings.GOOGLE_VISION_MAX_CONCURRENCY)) as pool:
+            return [result for results in pool.map(annotate, chunks) for result in results]
+
+    def run_batch(self, contents: List[bytes]) -> List[Union[OcrResult, Exception]]:
+        """recognize_batch with the OCR cache in front; only misses are sent"""
+        outputs: List[Union[OcrResult, Exception, None]] = [self.lookup(content) for content in contents]
+        pending = [index for index, output in enumerate(outputs) if output is None]
+        if pending:
+            for index, result in zip(pending, self.recognize_batch([contents[i] for i in pending])):
+                outputs[index] = result
+                if isinstance(result, OcrResult):
+                    self.store(contents[index], result)
+        return outputs
+
+
+@dataclass
+class RoutedOcrResult:
+    result: OcrResult
+    engine: str
+    confidence: float
+    attempts: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class OcrRouter:
+    """
+    Pick OCR engines per document within a latency budget.
+
+    Engines are tried from the fastest expected latency upwards. A slower
+    engine runs only when the best result so far is below the confidence
+    threshold and the engine's expected latency fits in the remaining budget,
+    or when every engine tried so far has failed. Expected latencies are
+    exponentially smoothed from observed (uncached) runs.
+    """
+
+    def __init__(
+        self,
+        engines: List[OcrEngine],
+        latency_budget: float,
+        confidence_threshold: float,
+        smoothing: float = 0.3
+    ):
+        if not engines:
+            raise ValueError("OcrRouter needs at least one engine")
+        self.engines = engines
+        self.latency_budget = latency_budget
+        self.confidence_threshold = confidence_threshold
+        self.smoothing = smoothing
+
+        self._lock = threading.Lock()
+        self._latency = {engine.name: engine.expected_latency for engine in engines}
+        self._resolved = {engine.name: 0 for engine in engines}
+        self._escalations = 0
+        self._failures = 0
+
+    def expected_latency(self, engine_name: str) -> float:
+        with self._lock:
+            return self._latency[engine_name]
+
+    def recognize(
+        self,
+        content: bytes,
+        latency_budget: Optional[float] = None,
+        confidence_threshold: Optional[float] = None
+    ) -> RoutedOcrResult:
+        """
+        Recognize a document with the cheapest engine that is confident enough
+
+        Args:
+            content: Raw image bytes
+            latency_budget: Seconds available for this document
+            confidence_threshold: Mean word confidence that ends escalation
+
+        Returns:
+            RoutedOcrResult with the most confident result and every attempt
+        """
+        budget = self.latency_budget if latency_budget is None else latency_budget
+        threshold = self.confidence_threshold if confidence_threshold is None else confidence_threshold
+
+        started = time.perf_counter()
+        best: Optional[RoutedOcrResult] = None
+        attempts: List[Dict[str, Any]] = []
+
+        for engine in self._by_expected_latency():
+            remaining = budget - (time.perf_counter() - started)
+            if best is not None:
+                if self.expected_latency(engine.name) > remaining:
+                    logger.info(f"⏱️ Skipping {engine.name}: expected latency exceeds remaining budget")
+                    break
+                with self._lock:
+                    self._escalations += 1
+
+            attempt_started = time.perf_counter()
+            try:
+                result = engine.lookup(content)
+                cached = result is not None
+                if result is None:
+                    result = engine.recognize(content)
+                    self._observe(engine.name, time.perf_counter() - attempt_started)
+                    engine.store(content, result)
+            except Exception as e:
+                logger.warning(f"⚠️ OCR engine {engine.name} failed: {str(e)}")
+                with self._lock:
+                    self._failures += 1
+                attempts.append({
+                    "engine": engine.name,
+                    "latency": time.perf_counter() - attempt_started,
+                    "error": str(e)
+                })
+                continue
+
+            confidence = result.confidence
+            attempts.append({
+                "engine": engine.name,
+                "latency": time.perf_counter() - attempt_started,
+                "confidence": confidence,
+                "cached": cached
+            })
+            if best is None or confidence > best.confidence:
+                best = RoutedOcrResult(result=result, engine=engine.name, confidence=confidence)
+            if confidence >= threshold:
+                break
+
+        if best is None:
+            raise Exception("All OCR engines failed: " + "; ".join(
+                f"{attempt['engine']}: {attempt['error']}" for attempt in attempts
+            ))
+
+        best.attempts = attempts
+        with self._lock:
+            self._resolved[best.engine] += 1
+        return best
+
+    def stats(self) -> Dict[str, Any]:
+        """Expected latencies and how often each engine produced the final result"""
+        with self._lock:
+            return {
+                "expected_latency": dict(self._latency),
+                "resolved_by": dict(self._resolved),
+                "escalations": self._escalations,
+                "failures": self._failures,
+            }
+
+    def _by_expected_latency(self) -> List[OcrEngine]:
+        with self._lock:
+            return sorted(self.engines, key=lambda engine: self._latency[engine.name])
+
+    def _observe(self, engine_name: str, latency: float) -> None:
+        with self._lock:
+            previous = self._latency[engine_name]
+            self._latency[engine_name] = (1 - self.smoothing) * previous + self.smoothing * latency
+
+
+ENGINE_FACTORIES = {
+    EasyOcrEngine.name: EasyOcrEngine,
+    TesseractEngine.name: TesseractEngine,
+    GoogleVisionEngine.name: GoogleVisionEngine,
+}
+
+# Shared router instance (created on first use)
+_router: Optional[OcrRouter] = None
+_router_lock = threading.Lock()
+
+def get_ocr_router() -> OcrRouter:
+    """Return the process-wide router over the engines listed in settings.OCR_ENGINES"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            names = [name.strip() for name in settings.OCR_ENGINES.split(",") if name.strip()]
+            unknown = [name for name in names if name not in ENGINE_FACTORIES]
+            if unknown:
+                raise ValueError(f"Unknown OCR engines: {', '.join(unknown)}")
+            _router = OcrRouter(
+                [ENGINE_FACTORIES[name]() for name in names],
+                latency_budget=settings.OCR_LATENCY_BUDGET,
+                confidence_threshold=settings.OCR_CONFIDENCE_THRESHOLD
+            )
+    return _router
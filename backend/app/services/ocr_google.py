@@ -0,0 +1,82 @@
+import os
+from PIL import Image
+import io
+from typing import Any, Dict, List, Tuple
+from .extraction_cascade import run_cascade
+from .ocr_engines import GoogleVisionEngine
+
+
+# Fields the upload response always carries ("N/A" when not extracted)
+RESPONSE_FIELDS = [
+    "invoice_number", "invoice_date", "due_date", "gstin",
+    "total", "currency", "vendor_name", "vendor_tax_id",
+    "customer_name", "payment_terms"
+]
+
+
+def _extract(ocr, file_path: str) -> Dict[str, str]:
+    # Regex fields first; LayoutLMv3 runs only for missing or invalid ones
+    fields = run_cascade(ocr, lambda: Image.open(file_path).convert("RGB"), GoogleVisionEngine.name).fields
+
+    # Add any missing fields with default values
+    for field in RESPONSE_FIELDS:
+        if field not in fields:
+            fields[field] = "N/A"
+
+    return fields
+
+
+def run_google_vision_and_layoutlm(file_path: str) -> Dict[str, str]:
+    """
+    Process an invoice using Google Vision OCR and the extraction cascade
+    (regex, vendor template, LayoutLMv3)
+    """
+    try:
+        # Read the file
+        with open(file_path, 'rb') as image_file:
+            content = image_file.read()
+
+        # Google Vision OCR (served from the OCR cache when seen before)
+        ocr = GoogleVisionEngine().run(content)
+
+        return _extract(ocr, file_path)
+
+    except Exception as e:
+        raise Exception(f"Error processing invoice: {str(e)}")
+
+
+def run_google_vision_and_layoutlm_batch(file_paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    Process many invoices with batched Google Vision calls (see
+    GoogleVisionEngine.recognize_batch) and the extraction cascade
+
+    Returns:
+        Fields per file in input order, or {"error": message} for files that failed
+    """
+    ocr_results: List[Any] = [None] * len(file_paths)
+    contents = {}
+    for index, file_path in enumerate(file_paths):
+        try:
+            with open(file_path, 'rb') as image_file:
+                contents[index] = image_file.read()
+        except OSError as e:
+            ocr_results[index] = e
+
+    readable = list(contents)
+    try:
+        batch = GoogleVisionEngine().run_batch([contents[index] for index in readable])
+    except Exception as e:
+        # A transport failure fails the files it covered, not the call
+        batch = [e] * len(readable)
+    for index, ocr in zip(readable, batch):
+        ocr_results[index] = ocr
+
+    results = []
+    for file_path, ocr in zip(file_paths, ocr_results):
+        try:
+            if isinstance(ocr, Exception):
+                raise ocr
+            results.append(_extract(ocr, file_path))
+        except Exception as e:
+            results.append({"error": f"Error processing invoice: {str(e)}"})
+    return results
@@ -1,30 +1,70 @@
 import os
-import easyocr
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import re
 from datetime import datetime
 import logging
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.services.model_manager import ModelKey, get_model_manager, module_bytes
+from app.services.ocr_cache import get_ocr_cache
+from app.services.table_extraction import extract_line_items
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize EasyOCR reader (will download models on first use)
-reader = None
+@dataclass
+class OcrResult:
+    """Recognized words with [x0, y0, x1, y1] pixel boxes and confidences for one image"""
+    words: List[str]
+    boxes: List[List[int]]
+    confidences: List[float]
+
+    @property
+    def text(self) -> str:
+        return ' '.join(self.words)
+
+    @property
+    def confidence(self) -> float:
+        """Mean word confidence (0 when nothing was recognized)"""
+        return sum(self.confidences) / len(self.confidences) if self.confidences else 0.0
+
+# Languages loaded into the EasyOCR reader (also part of the OCR cache key)
+OCR_LANGUAGES = ['en']
+
+def ocr_reader_key(languages: Optional[List[str]] = None) -> ModelKey:
+    """Model manager key of the EasyOCR reader for a language set"""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        easyocr_version = version("easyocr")
+    except PackageNotFoundError:
+        easyocr_version = "unknown"
+    return ModelKey("easyocr", easyocr_version, "+".join(languages or OCR_LANGUAGES))
+
+def get_ocr_reader(languages: Optional[List[str]] = None):
+    """Return the EasyOCR reader for the given languages, loading it on first use."""
+    languages = languages or OCR_LANGUAGES
 
-def get_ocr_reader():
-    """Initialize and return EasyOCR reader."""
-    global reader
-    if reader is None:
+    def load():
         try:
-            logger.info("🔄 Initializing EasyOCR reader...")
-            # Initialize with English language
-            reader = easyocr.Reader(['en'])
-            logger.info("✅ EasyOCR reader initialized successfully")
+            # Imported here: easyocr pulls in torch, which is slow to import
+            import easyocr
+
+            # Downloads the detection and recognition models on first use
+            return easyocr.Reader(languages)
         except Exception as e:
             logger.error(f"❌ Failed to initialize EasyOCR reader: {str(e)}")
             raise Exception(f"Failed to initialize EasyOCR reader: {str(e)}")
-    return reader
+
+    return get_model_manager().get(
+        ocr_reader_key(languages), load,
+        size_of=lambda loaded: module_bytes(loaded.detector, loaded.recognizer)
+    )
+
+def ocr_reader_loaded() -> bool:
+    return get_model_manager().loaded(ocr_reader_key())
 
 def run_ocr_on_file(file_bytes: bytes) -> Dict[str, Any]:
     """
@@ -37,27 +77,172 @@ def run_ocr_on_file(file_bytes: bytes) -> Dict[str, Any]:
         Dict containing extracted invoice data
     """
     try:
-        # Get OCR reader
-        ocr_reader = get_ocr_reader()
+        from app.services.ocr_engines import get_ocr_router
         
-        # Perform OCR
+        # Perform OCR through the configured engines (EasyOCR by default)
         logger.info("🔍 Performing OCR on image...")
-        results = ocr_reader.readtext(file_bytes)
+        routed = get_ocr_router().recognize(file_bytes)
+        ocr = routed.result
+        logger.info(f"✅ OCR by {routed.engine} with confidence {routed.confidence:.2f}")
         
-        if not results:
+        if not ocr.words:
             raise Exception("No text detected in the image")
         
-        # Extract text from results
-        full_text = ' '.join([text[1] for text in results])
-        logger.info(f"📝 Extracted text length: {len(full_text)} characters")
-        
-        # Extract invoice data
-        return extract_invoice_data(full_text)
+        data = extract_invoice_from_ocr(ocr)
+        data["ocr_engine"] = routed.engine
+        data["ocr_confidence"] = routed.confidence
+        return data
         
     except Exception as e:
         logger.error(f"❌ OCR processing failed: {str(e)}")
         raise Exception(f"OCR processing failed: {str(e)}")
 
+def run_ocr_on_files(files: List[bytes], batch_size: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Perform OCR on several invoice files in batched passes.
+    
+    Args:
+        files: Invoice file contents as bytes
+        batch_size: Images per detector batch (defaults to settings.OCR_BATCH_SIZE)
+        
+    Returns:
+        List of extracted invoice data dicts, in the same order as files
+    """
+    try:
+        extracted = []
+        for index, ocr in enumerate(ocr_images_batched(files, batch_size=batch_size)):
+            if not ocr.words:
+                logger.warning(f"⚠️ No text detected in image {index}")
+            extracted.append(extract_invoice_from_ocr(ocr))
+        return extracted
+        
+    except Exception as e:
+        logger.error(f"❌ Batched OCR processing failed: {str(e)}")
+        raise Exception(f"Batched OCR processing failed: {str(e)}")
+
+def ocr_images_batched(
+    images: List[bytes],
+    batch_size: Optional[int] = None,
+    recognizer_batch_size: Optional[int] = None
+) -> List[OcrResult]:
+    """
+    Run EasyOCR detection and recognition over many images with batched tensors.
+    
+    Images already in the OCR cache are served from it. The detector stacks
+    each batch into one tensor, so the remaining images are grouped by
+    aspect ratio (buckets of settings.OCR_ASPECT_BUCKET) and every group is
+    fed to readtext_batched in chunks of batch_size, resized to the largest
+    width and height in the chunk. Boxes are scaled back to each image's own
+    pixels. The recognizer batches text crops within each image.
+    
+    Args:
+        images: Image contents as bytes
+        batch_size: Images per detector batch (defaults to settings.OCR_BATCH_SIZE)
+        recognizer_batch_size: Text crops per recognizer forward pass
+            (defaults to settings.OCR_RECOGNIZER_BATCH_SIZE)
+        
+    Returns:
+        One OcrResult per input image, in input order
+    """
+    from easyocr.utils import reformat_input
+    
+    batch_size = batch_size or settings.OCR_BATCH_SIZE
+    recognizer_batch_size = recognizer_batch_size or settings.OCR_RECOGNIZER_BATCH_SIZE
+    
+    # Serve cached images first; only misses go through recognition
+    cache = get_ocr_cache()
+    outputs: List[Optional[OcrResult]] = [None] * len(images)
+    cache_keys: Dict[int, str] = {}
+    if cache:
+        for index, image in enumerate(images):
+            if isinstance(image, bytes):
+                cache_keys[index] = _easyocr_cache_key(image)
+                outputs[index] = cache.get(cache_keys[index])
+    pending = [index for index, output in enumerate(outputs) if output is None]
+    if not pending:
+        return outputs
+    
+    ocr_reader = get_ocr_reader()
+    
+    # Decode once and bucket by channels and aspect ratio, so scans of
+    # slightly different sizes still share a detector batch
+    decoded = {index: reformat_input(images[index])[0] for index in pending}
+    groups: Dict[Tuple, List[int]] = {}
+    for index, array in decoded.items():
+        height, width = array.shape[:2]
+        aspect_bucket = round(height / width / settings.OCR_ASPECT_BUCKET)
+        groups.setdefault((array.shape[2:], aspect_bucket), []).append(index)
+    
+    for indices in groups.values():
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            sizes = {i: decoded[i].shape[1::-1] for i in chunk}  # (width, height)
+            target = (max(w for w, _ in sizes.values()), max(h for _, h in sizes.values()))
+            resize = {} if len(set(sizes.values())) == 1 else {"n_width": target[0], "n_height": target[1]}
+            logger.info(f"🔍 Performing batched OCR on {len(chunk)} image(s)...")
+            batched_results = ocr_reader.readtext_batched(
+                [decoded[i] for i in chunk],
+                batch_size=recognizer_batch_size,
+                **resize
+            )
+            # Split the batch back per image
+            for index, results in zip(chunk, batched_results):
+                if resize:
+                    results = _scale_results(results, sizes[index][0] / target[0], sizes[index][1] / target[1])
+                outputs[index] = OcrResult(*results_to_layout(results))
+                if index in cache_keys:
+                    cache.put(cache_keys[index], outputs[index])
+    
+    return outputs
+
+def _scale_results(results: List[Any], x_scale: float, y_scale: float) -> List[Any]:
+    """EasyOCR results with their quads scaled from a resized image back to the original"""
+    return [
+        ([[point[0] * x_scale, point[1] * y_scale] for point in quad], text, confidence)
+        for quad, text, confidence in results
+    ]
+
+def _easyocr_cache_key(file_bytes: bytes) -> str:
+    """OCR cache key for an image read by the EasyOCR reader"""
+    from app.services.ocr_engines import EasyOcrEngine
+    return EasyOcrEngine().cache_key(file_bytes)
+
+def extract_invoice_from_ocr(ocr: OcrResult) -> Dict[str, Any]:
+    """
+    Extract invoice data from OCR words, using word geometry for line items.
+    
+    Args:
+        ocr: Words, boxes and confidences for one image
+        
+    Returns:
+        Dict containing extracted invoice data
+    """
+    full_text = ocr.text
+    logger.info(f"📝 Extracted text length: {len(full_text)} characters")
+    
+    data = extract_invoice_data(full_text)
+    
+    # Rebuild the line-item table from word geometry
+    items = extract_line_items(ocr.words, ocr.boxes)
+    if items:
+        data["items"] = items
+    
+    return data
+
+def results_to_layout(results: List[Any]) -> Tuple[List[str], List[List[int]], List[float]]:
+    """
+    Convert EasyOCR (quad, text, confidence) results into parallel lists of
+    words, axis-aligned [x0, y0, x1, y1] boxes and confidences.
+    """
+    words, boxes, confidences = [], [], []
+    for quad, text, confidence in results:
+        xs = [point[0] for point in quad]
+        ys = [point[1] for point in quad]
+        words.append(text)
+        boxes.append([int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))])
+        confidences.append(float(confidence))
+    return words, boxes, confidences
+
 def extract_invoice_data(text: str) -> Dict[str, Any]:
     """
     Extract key information from OCR text.
@@ -331,7 +516,12 @@ def extract_amount_info(text: str) -> Dict[str, Any]:
     return amount_info
 
 def extract_item_details(text: str) -> List[Dict[str, Any]]:
-    """Extract item details from text"""
+    """
+    Extract item details from text.
+
+    Text-only fallback; when word boxes are available run_ocr_on_file uses
+    table_extraction.extract_line_items instead.
+    """
     items = []
     
     # Look for item patterns
@@ -371,7 +561,7 @@ def test_ocr():
             "Date: 28/06/2025",
             "Vendor: Test Company Ltd",
             "Amount: Rs. 1500.00",
-            "GSTIN: 22AAAAA0000A1Z5"
+            "GSTIN: 27AAPFU0939F1ZV"
         ]
         
         y_position = 20
@@ -4,6 +4,8 @@ from enum import Enum
 import logging
 from datetime import datetime
 
+from app.services.gstin import is_valid_gstin
+
 logger = logging.getLogger(__name__)
 
 class ReconciliationStatus(Enum):
@@ -147,12 +149,8 @@ class ReconciliationService:
         
     def _is_valid_gstin_format(self, gstin: str) -> bool:
         """Validate GSTIN format"""
-        # GSTIN format: 2 digits state code + 10 digits PAN + 1 digit entity number + 1 check digit
-        if not gstin or len(gstin) != 15:
-            return False
-            
-        # Add more detailed validation if needed
-        return True
+        # GSTIN format: 2 digits state code + 10 character PAN + 1 entity number + Z + 1 check character
+        return bool(gstin) and is_valid_gstin(gstin)
         
     def _validate_invoice_date(self, invoice_data: Dict, vendor_data: Dict) -> bool:
         """Validate if invoice date is within expected range"""
@@ -0,0 +1,96 @@
+"""
+Shared Model Weights
+
+This module keeps one physical copy of model weights across worker processes:
+- Memory-mapped loading of safetensors checkpoints, so every worker maps the
+  same page-cache pages instead of reading private copies
+- Pre-fork preparation for servers that load models in a master process
+  (gunicorn --preload) and share them copy-on-write with forked workers
+
+Author: Shared
+"""
+import gc
+import json
+import logging
+import os
+from pathlib import Path
+import struct
+from typing import TYPE_CHECKING, Dict
+
+if TYPE_CHECKING:
+    import torch
+
+logger = logging.getLogger(__name__)
+
+SAFETENSORS_FILE = "model.safetensors"
+
+# safetensors dtype names -> torch dtype attribute names
+_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+
+
+def mmap_safetensors(path: str) -> Dict[str, "torch.Tensor"]:
+    """
+    Open a safetensors file as tensors backed by a private file mapping.
+
+    Nothing is copied: pages are read on first touch from the page cache, which
+    every process mapping the file shares. Writing to a tensor copies only the
+    touched pages, so inference weights stay shared.
+    """
+    import torch
+
+    with open(path, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+
+    storage = torch.UntypedStorage.from_file(str(path), False, os.path.getsize(path))
+    data_start = 8 + header_size
+
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = getattr(torch, _DTYPES[info["dtype"]])
+        begin, _ = info["data_offsets"]
+        offset = data_start + begin
+        if offset % dtype.itemsize:
+            raise ValueError(f"{path}: tensor {name} is not aligned for memory mapping")
+        tensors[name] = torch.empty(0, dtype=dtype).set_(storage, offset // dtype.itemsize, info["shape"])
+    return tensors
+
+
+def load_pretrained_mmap(model_class, model_dir: str):
+    """
+    Build a transformers model whose parameters are memory-mapped from
+    model_dir/model.safetensors instead of read into process memory
+
+    Parameters are created on the meta device (buffers are computed as usual)
+    and then replaced by the mapped tensors.
+    """
+    from accelerate import init_empty_weights
+    from transformers import AutoConfig
+
+    path = Path(model_dir) / SAFETENSORS_FILE
+    if not path.exists():
+        raise FileNotFoundError(f"{path} not found; memory-mapped loading needs a safetensors checkpoint")
+
+    config = AutoConfig.from_pretrained(model_dir)
+    with init_empty_weights(include_buffers=False):
+        model = model_class(config)
+    model.load_state_dict(mmap_safetensors(str(path)), assign=True, strict=True)
+    model.eval()
+    logger.info(f"🗺️ Memory-mapped weights from {path}")
+    return model
+
+
+def prepare_for_fork() -> None:
+    """
+    Call in the master after preloading models and before forking workers.
+    Moves every live object to the permanent GC generation so collections in
+    the workers do not write to (and so un-share) the preloaded pages.
+    """
+    gc.collect()
+    gc.freeze()
+    logger.info(f"🧊 Froze {gc.get_freeze_count()} objects before forking workers")
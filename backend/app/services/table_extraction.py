@@ -0,0 +1,299 @@
+"""
+Line-Item Table Extraction
+
+This module rebuilds invoice line-item tables from OCR word boxes:
+- Row clustering by sort-and-sweep over vertical word centres
+- Header detection for description, quantity, rate, HSN and amount columns
+- Column assignment by binary search over header boundaries
+- Fallback to "description ... amount" rows for receipts without a header
+
+Every step is a sort followed by linear sweeps, so extraction stays
+O(n log n) in the number of OCR words.
+
+Author: Dev 1
+"""
+from bisect import bisect_right
+from dataclasses import dataclass, field
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+# Header keywords for each output column, matched against normalized header cells
+COLUMN_KEYWORDS = {
+    "description": {"description", "desc", "item", "items", "particulars", "product", "goods", "details"},
+    "hsn_code": {"hsn", "sac", "hsn/sac", "hsnsac", "hsn code", "sac code"},
+    "quantity": {"qty", "quantity", "qnty", "nos", "units"},
+    "rate": {"rate", "price", "unit price", "u/price", "u.price", "mrp", "unit rate"},
+    "amount": {"amount", "amt", "total", "value", "net amount", "line total"},
+}
+
+# Rows that close the item table (summary and payment lines)
+TERMINATOR_KEYWORDS = (
+    "total", "subtotal", "sub total", "grand", "round", "rounding", "cgst", "sgst",
+    "igst", "gst", "tax", "discount", "cash", "change", "tendered", "balance", "paid",
+)
+
+NUMBER_PATTERN = re.compile(r'-?\d[\d,]*(?:\.\d+)?')
+AMOUNT_PATTERN = re.compile(r'^(?:RM|Rs\.?|INR|₹)?\s*-?\d[\d,]*\.\d{2}$', re.IGNORECASE)
+HSN_PATTERN = re.compile(r'^\d{4,8}$')
+
+
+@dataclass
+class _Word:
+    text: str
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+    @property
+    def cx(self) -> float:
+        return (self.x0 + self.x1) / 2
+
+    @property
+    def cy(self) -> float:
+        return (self.y0 + self.y1) / 2
+
+    @property
+    def height(self) -> float:
+        return max(self.y1 - self.y0, 1.0)
+
+
+@dataclass
+class _Row:
+    words: List[_Word] = field(default_factory=list)
+    top: float = 0.0
+    bottom: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return " ".join(w.text for w in self.words)
+
+
+def cluster_rows(words: List[str], boxes: List[Sequence[float]]) -> List[List[Dict[str, Any]]]:
+    """
+    Group OCR words into visual rows.
+
+    Args:
+        words: Recognized words
+        boxes: Matching [x0, y0, x1, y1] boxes
+
+    Returns:
+        Rows ordered top to bottom, each a left-to-right list of
+        {"text", "box"} dicts
+    """
+    return [
+        [{"text": w.text, "box": [w.x0, w.y0, w.x1, w.y1]} for w in row.words]
+        for row in _cluster_rows(_to_words(words, boxes))
+    ]
+
+
+def extract_line_items(words: List[str], boxes: List[Sequence[float]]) -> List[Dict[str, Any]]:
+    """
+    Extract structured line items from OCR words and their bounding boxes.
+
+    Args:
+        words: Recognized words
+        boxes: Matching [x0, y0, x1, y1] boxes in any consistent unit
+
+    Returns:
+        List of items with description, hsn_code, quantity, rate and amount
+        (missing columns are None)
+    """
+    rows = _cluster_rows(_to_words(words, boxes))
+    if not rows:
+        return []
+
+    for index, row in enumerate(rows):
+        columns = _detect_header(row)
+        if columns:
+            items = _extract_with_header(rows[index + 1:], columns)
+            if items:
+                return items
+
+    return _extract_without_header(rows)
+
+
+def _to_words(words: List[str], boxes: List[Sequence[float]]) -> List[_Word]:
+    """Pair words with boxes, dropping blanks and malformed boxes"""
+    result = []
+    for text, box in zip(words, boxes):
+        text = (text or "").strip()
+        if not text or len(box) < 4:
+            continue
+        x0, y0, x1, y1 = (float(v) for v in box[:4])
+        result.append(_Word(text, min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+    return result
+
+
+def _cluster_rows(words: List[_Word]) -> List[_Row]:
+    """Sort words by vertical centre and sweep them into rows"""
+    rows: List[_Row] = []
+    current: Optional[_Row] = None
+
+    for word in sorted(words, key=lambda w: w.cy):
+        if current is not None:
+            row_height = current.bottom - current.top
+            tolerance = 0.5 * max(row_height, word.height)
+            row_centre = (current.top + current.bottom) / 2
+            if abs(word.cy - row_centre) <= tolerance:
+                current.words.append(word)
+                current.top = min(current.top, word.y0)
+                current.bottom = max(current.bottom, word.y1)
+                continue
+        current = _Row(words=[word], top=word.y0, bottom=word.y1)
+        rows.append(current)
+
+    for row in rows:
+        row.words.sort(key=lambda w: w.x0)
+    return rows
+
+
+def _merge_cells(row: _Row) -> List[_Word]:
+    """Merge horizontally adjacent words of a row into cells"""
+    cells: List[_Word] = []
+    for word in row.words:
+        if cells:
+            last = cells[-1]
+            gap = word.x0 - last.x1
+            if gap <= 0.8 * max(last.height, word.height):
+                cells[-1] = _Word(
+                    f"{last.text} {word.text}",
+                    last.x0, min(last.y0, word.y0), word.x1, max(last.y1, word.y1),
+                )
+                continue
+        cells.append(word)
+    return cells
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'[^a-z/ ]', '', text.lower()).strip()
+
+
+def _classify_header(text: str) -> Optional[str]:
+    normalized = _normalize(text)
+    if not normalized:
+        return None
+    for column, keywords in COLUMN_KEYWORDS.items():
+        if normalized in keywords:
+            return column
+    tokens = normalized.replace("/", " ").split()
+    for column, keywords in COLUMN_KEYWORDS.items():
+        if any(token in keywords for token in tokens):
+            return column
+    return None
+
+
+def _detect_header(row: _Row) -> Optional[List[_Word]]:
+    """
+    Return the header cells of a row, labelled by column, if the row looks
+    like a table header
+    """
+    labelled: Dict[str, _Word] = {}
+
+    # Try word-level labels first so "Qty Rate" split by a small gap still
+    # yields two columns, then fall back to merged multi-word cells
+    for candidates in (row.words, _merge_cells(row)):
+        labelled = {}
+        previous = None
+        for cell in candidates:
+            column = _classify_header(cell.text)
+            if column and column == previous:
+                # "Item Description" style headers widen the same column
+                labelled[column].x1 = max(labelled[column].x1, cell.x1)
+            elif column and column not in labelled:
+                labelled[column] = _Word(column, cell.x0, cell.y0, cell.x1, cell.y1)
+            previous = column
+        if len(labelled) >= 2 and labelled.keys() & {"amount", "quantity", "rate"}:
+            break
+    else:
+        return None
+
+    return sorted(labelled.values(), key=lambda w: w.cx)
+
+
+def _column_boundaries(columns: List[_Word]) -> List[float]:
+    """Split points between neighbouring header columns"""
+    return [(left.x1 + right.x0) / 2 for left, right in zip(columns, columns[1:])]
+
+
+def _parse_number(text: str) -> Optional[float]:
+    cleaned = re.sub(r'(?i)^(?:RM|Rs\.?|INR|₹)\s*', '', text.strip())
+    match = NUMBER_PATTERN.search(cleaned)
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _is_terminator(text: str) -> bool:
+    lowered = text.lower().strip()
+    return any(re.match(rf'{re.escape(keyword)}\b', lowered) for keyword in TERMINATOR_KEYWORDS)
+
+
+def _extract_with_header(rows: List[_Row], columns: List[_Word]) -> List[Dict[str, Any]]:
+    """Read body rows below a detected header"""
+    boundaries = _column_boundaries(columns)
+    names = [column.text for column in columns]
+    items: List[Dict[str, Any]] = []
+
+    for row in rows:
+        cells: Dict[str, List[str]] = {}
+        for word in row.words:
+            name = names[bisect_right(boundaries, word.cx)]
+            cells.setdefault(name, []).append(word.text)
+        values = {name: " ".join(parts) for name, parts in cells.items()}
+
+        if _is_terminator(values.get("description", row.text)):
+            break
+
+        item = {
+            "description": values.get("description"),
+            "hsn_code": None,
+            "quantity": _parse_number(values["quantity"]) if "quantity" in values else None,
+            "rate": _parse_number(values["rate"]) if "rate" in values else None,
+            "amount": _parse_number(values["amount"]) if "amount" in values else None,
+        }
+        hsn = values.get("hsn_code", "").replace(" ", "")
+        if HSN_PATTERN.match(hsn):
+            item["hsn_code"] = hsn
+
+        if item["amount"] is None and item["quantity"] is not None and item["rate"] is not None:
+            item["amount"] = round(item["quantity"] * item["rate"], 2)
+
+        if item["amount"] is None:
+            # A text-only row continues the previous item's description
+            if items and item["description"] and not any(
+                item[key] is not None for key in ("quantity", "rate", "hsn_code")
+            ):
+                previous = items[-1]
+                previous["description"] = " ".join(
+                    part for part in (previous["description"], item["description"]) if part
+                )
+            continue
+
+        items.append(item)
+
+    return items
+
+
+def _extract_without_header(rows: List[_Row]) -> List[Dict[str, Any]]:
+    """Fallback for headerless receipts: rows of text ending in an amount"""
+    items = []
+    for row in rows:
+        if len(row.words) < 2 or not AMOUNT_PATTERN.match(row.words[-1].text):
+            continue
+        description = " ".join(
+            w.text for w in row.words[:-1] if re.search(r'[A-Za-z]', w.text)
+        ).strip()
+        if not description or _is_terminator(description):
+            continue
+        items.append({
+            "description": description,
+            "hsn_code": None,
+            "quantity": None,
+            "rate": None,
+            "amount": _parse_number(row.words[-1].text),
+        })
+    return items
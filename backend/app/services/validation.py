@@ -1,55 +1,92 @@
 # app/services/validation.py
 
+from datetime import date, datetime
+from functools import lru_cache
 import re
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
 
-REQUIRED_FIELDS = ["invoice_number", "invoice_date", "gstin", "total"]
-
-def is_valid_gstin(gstin: str) -> bool:
-    """
-    GSTIN Format: 15 characters
-    2-digit state code + 10-character PAN + 1 entity + 1 Z + 1 checksum
-    Example: 22AAAAA0000A1Z5
-    """
-    pattern = r"^[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1}$"
-    return bool(re.match(pattern, gstin.strip()))
+# is_valid_gstin stays importable from here for existing callers
+from app.services.gstin import is_valid_gstin, validate_gstin
 
+REQUIRED_FIELDS = ["invoice_number", "invoice_date", "gstin", "total"]
 
 def is_valid_date(date_str: str) -> bool:
     """Basic date format checker (dd/mm/yyyy or dd-mm-yyyy)."""
     return bool(re.match(r"\d{2}[\/\-.]\d{2}[\/\-.]\d{4}", date_str.strip()))
 
 
+# Invoice date formats, day first as on Indian invoices
+DATE_FORMATS = (
+    "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%d-%m-%y",
+    "%d %b %Y", "%d-%b-%Y", "%d %B %Y", "%d-%b-%y", "%b %d, %Y",
+)
+
+
+def parse_invoice_date(value: Any) -> Optional[date]:
+    """Invoice date from a date, datetime or string in DATE_FORMATS (or ISO), else None."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return _parse_date_text(value.strip())
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_text(text: str) -> Optional[date]:
+    # The same dates repeat across a batch of invoices
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).date()
+    except ValueError:
+        return None
+
+
 def is_valid_amount(value: str) -> bool:
     """Check if value is a valid number with decimal."""
     return bool(re.match(r"[\d,]+\.\d{2}", value.strip()))
 
 
-def validate_invoice_data(data: Dict[str, str]) -> List[str]:
+def field_errors(data: Dict[str, str]) -> Dict[str, List[str]]:
     """
     Validate extracted invoice fields.
-    Returns a list of errors if found.
+    Returns the errors of each missing or invalid field.
     """
-    errors = []
+    errors: Dict[str, List[str]] = {}
 
     # Check for missing required fields
     for field in REQUIRED_FIELDS:
         if not data.get(field) or data[field] == "N/A":
-            errors.append(f"Missing required field: {field}")
+            errors.setdefault(field, []).append(f"Missing required field: {field}")
 
-    # GSTIN format
+    # GSTIN format and check character
     gstin = data.get("gstin")
-    if gstin and gstin != "N/A" and not is_valid_gstin(gstin):
-        errors.append(f"Invalid GSTIN format: {gstin}")
+    if gstin and gstin != "N/A":
+        check = validate_gstin(gstin)
+        if not check.valid:
+            errors.setdefault("gstin", []).append(f"Invalid GSTIN {gstin}: {'; '.join(check.errors)}")
 
     # Date formats
     invoice_date = data.get("invoice_date")
     if invoice_date and not is_valid_date(invoice_date):
-        errors.append(f"Invalid invoice date format: {invoice_date}")
+        errors.setdefault("invoice_date", []).append(f"Invalid invoice date format: {invoice_date}")
 
     # Amount
     total = data.get("total")
     if total and not is_valid_amount(total):
-        errors.append(f"Invalid total amount: {total}")
+        errors.setdefault("total", []).append(f"Invalid total amount: {total}")
 
     return errors
+
+
+def validate_invoice_data(data: Dict[str, str]) -> List[str]:
+    """
+    Validate extracted invoice fields.
+    Returns a list of errors if found.
+    """
+    return [error for errors in field_errors(data).values() for error in errors]
@@ -0,0 +1,380 @@
+"""
+Vendor Layout Templates
+
+This module extracts fields from recurring vendor layouts without running
+LayoutLMv3:
+- Vendor fingerprints from the GSTIN on the page, or from the header words
+- Anchor words (static text found at the same place on every confirmed
+  invoice) that score how well a document matches its vendor's template and
+  how far the scan is shifted
+- Field regions learned from confirmed extractions, read back by box lookup
+- Templates kept per OCR engine, since engines split a page into words
+  differently (EasyOCR returns phrases, Google Vision single words)
+- A JSON store shared by all workers (updates hold a file lock), with hit
+  and fallback counters
+
+Documents whose template match is below settings.TEMPLATE_MIN_CONFIDENCE go
+through the model as before.
+
+Author: Dev 1
+"""
+from dataclasses import asdict, dataclass, field
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from filelock import FileLock
+
+from app.core.config import settings
+from app.services.extraction_cascade import MODEL_FIELDS
+from app.services.invoice_extraction import normalize_boxes
+from app.services.layoutlm_decoding import FieldPrediction
+from app.services.gstin import is_valid_gstin
+
+logger = logging.getLogger(__name__)
+
+# Geometry is compared on LayoutLM's 0-1000 page grid
+HEADER_BOTTOM = 200  # header words end in the top fifth of the page
+HEADER_WORDS = 8
+MAX_ANCHORS = 40
+ANCHOR_TOLERANCE = 15  # how far an anchor may move beyond the page shift
+REGION_PADDING = 10
+
+# Fields the extraction cascade reads from a template match
+TEMPLATE_FIELDS = tuple(MODEL_FIELDS)
+
+
+@dataclass
+class VendorTemplate:
+    vendor_key: str
+    samples: int = 0
+    # (word, center x, center y) of static words
+    anchors: List[Tuple[str, int, int]] = field(default_factory=list)
+    # Field name -> [x0, y0, x1, y1] covering the field on every confirmed sample
+    regions: Dict[str, List[int]] = field(default_factory=dict)
+    ocr_engine: str = ""  # engine whose words the template was learned from
+
+
+@dataclass
+class TemplateMatch:
+    vendor_key: str
+    confidence: float
+    fields: Dict[str, FieldPrediction]
+
+
+def _anchor_token(word: str) -> Optional[str]:
+    """Lowercased word if it looks like static layout text (no digits, 3+ letters)"""
+    token = re.sub(r"[^a-z&]", "", word.lower())
+    if len(token) < 3 or any(char.isdigit() for char in word):
+        return None
+    return token
+
+
+def _center(box: List[int]) -> Tuple[int, int]:
+    return (box[0] + box[2]) // 2, (box[1] + box[3]) // 2
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def vendor_key(words: List[str], boxes: List[List[int]]) -> Optional[str]:
+    """
+    Identify the vendor of a page (boxes on the 0-1000 grid): the first GSTIN
+    in reading order, else a hash of the header words
+    """
+    for word in words:
+        candidate = word.strip().upper()
+        if len(candidate) == 15 and is_valid_gstin(candidate):
+            return f"gstin:{candidate}"
+
+    header = [
+        token for word, box in zip(words, boxes)
+        if box[3] <= HEADER_BOTTOM and (token := _anchor_token(word))
+    ][:HEADER_WORDS]
+    if not header:
+        return None
+    return "header:" + hashlib.sha1(" ".join(header).encode("utf-8")).hexdigest()[:16]
+
+
+def _locate(text: str, words: List[str], boxes: List[List[int]]) -> Optional[List[int]]:
+    """Box around the run of words whose joined text is text"""
+    target = _normalize_text(text)
+    if not target:
+        return None
+    for start in range(len(words)):
+        joined = ""
+        for end in range(start, len(words)):
+            joined = _normalize_text(f"{joined} {words[end]}")
+            if joined == target:
+                run = boxes[start:end + 1]
+                return [
+                    min(box[0] for box in run), min(box[1] for box in run),
+                    max(box[2] for box in run), max(box[3] for box in run),
+                ]
+            if not target.startswith(joined):
+                break
+    return None
+
+
+def _anchor_offsets(
+    anchors: List[Tuple[str, int, int]], words: List[str], boxes: List[List[int]]
+) -> List[Optional[Tuple[int, int]]]:
+    """Offset from each anchor to the nearest same word on the page (None if absent)"""
+    positions: Dict[str, List[Tuple[int, int]]] = {}
+    for word, box in zip(words, boxes):
+        token = _anchor_token(word)
+        if token:
+            positions.setdefault(token, []).append(_center(box))
+
+    offsets = []
+    for token, x, y in anchors:
+        candidates = positions.get(token)
+        if not candidates:
+            offsets.append(None)
+            continue
+        cx, cy = min(candidates, key=lambda c: abs(c[0] - x) + abs(c[1] - y))
+        offsets.append((cx - x, cy - y))
+    return offsets
+
+
+def _median(values: List[int]) -> int:
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def match_template(template: VendorTemplate, words: List[str], boxes: List[List[int]]) -> TemplateMatch:
+    """
+    Read a template's field regions from a page (boxes on the 0-1000 grid).
+
+    The page shift is the median anchor offset; confidence is the share of
+    anchors found within ANCHOR_TOLERANCE of their shifted position, scaled
+    by the share of regions that contain any words.
+    """
+    offsets = [offset for offset in _anchor_offsets(template.anchors, words, boxes) if offset]
+    if not offsets:
+        return TemplateMatch(template.vendor_key, 0.0, {})
+    dx = _median([offset[0] for offset in offsets])
+    dy = _median([offset[1] for offset in offsets])
+    aligned = sum(
+        1 for ox, oy in offsets
+        if abs(ox - dx) <= ANCHOR_TOLERANCE and abs(oy - dy) <= ANCHOR_TOLERANCE
+    )
+    anchor_score = aligned / len(template.anchors)
+
+    texts: Dict[str, str] = {}
+    for name, (x0, y0, x1, y1) in template.regions.items():
+        inside = [
+            word for word, box in zip(words, boxes)
+            if x0 - REGION_PADDING <= _center(box)[0] - dx <= x1 + REGION_PADDING
+            and y0 - REGION_PADDING <= _center(box)[1] - dy <= y1 + REGION_PADDING
+        ]
+        if inside:
+            texts[name] = " ".join(inside)
+
+    confidence = anchor_score * len(texts) / max(len(template.regions), 1)
+    return TemplateMatch(
+        template.vendor_key,
+        confidence,
+        {name: FieldPrediction(text, confidence) for name, text in texts.items()}
+    )
+
+
+def learn_template(
+    template: Optional[VendorTemplate],
+    key: str,
+    words: List[str],
+    boxes: List[List[int]],
+    fields: Dict[str, str],
+    ocr_engine: str = ""
+) -> VendorTemplate:
+    """
+    Fold one confirmed extraction into a vendor template (boxes on the
+    0-1000 grid). Regions grow to cover the field on every sample; anchors
+    shrink to the static words that stay in place on every sample.
+    """
+    template = template or VendorTemplate(key, ocr_engine=ocr_engine)
+
+    for name, text in fields.items():
+        box = _locate(text, words, boxes)
+        if box is None:
+            logger.warning(f"⚠️ Confirmed {name} {text!r} not found on the page, region not learned")
+            continue
+        if name in template.regions:
+            old = template.regions[name]
+            box = [min(old[0], box[0]), min(old[1], box[1]), max(old[2], box[2]), max(old[3], box[3])]
+        template.regions[name] = box
+
+    if not template.samples:
+        # Words that occur once on the page, so each anchor has one position
+        tokens = [_anchor_token(word) for word in words]
+        template.anchors = [
+            (token, *_center(box)) for token, box in zip(tokens, boxes)
+            if token and tokens.count(token) == 1
+        ][:MAX_ANCHORS]
+    else:
+        template.anchors = [
+            anchor for anchor, offset in zip(template.anchors, _anchor_offsets(template.anchors, words, boxes))
+            if offset and abs(offset[0]) <= ANCHOR_TOLERANCE and abs(offset[1]) <= ANCHOR_TOLERANCE
+        ]
+    template.samples += 1
+    return template
+
+
+class VendorTemplateStore:
+    def __init__(self, path: str, min_samples: int = 2):
+        """
+        Args:
+            path: JSON file holding the templates
+            min_samples: Confirmed invoices needed before a template is used
+        """
+        self.path = Path(path)
+        self.min_samples = min_samples
+
+        self.hits = 0
+        self.low_confidence = 0
+        self.no_template = 0
+
+        self._lock = threading.Lock()
+        # Serializes read-modify-write of the file across worker processes
+        self._file_lock = FileLock(str(self.path.with_suffix(".lock")))
+        # "engine|vendor key" -> template
+        self._templates: Dict[str, VendorTemplate] = {}
+        self._mtime = 0.0
+        self._reload()
+
+    def extract(
+        self,
+        words: List[str],
+        boxes: List[List[int]],
+        page_size: Tuple[int, int],
+        min_confidence: float,
+        ocr_engine: str
+    ) -> Optional[TemplateMatch]:
+        """
+        Extract fields by template when the page matches its vendor's template
+        with at least min_confidence, else return None
+
+        Args:
+            words: OCR words
+            boxes: Pixel [x0, y0, x1, y1] box per word
+            page_size: (width, height) of the page image
+            min_confidence: Lowest match confidence to accept
+            ocr_engine: Engine that produced the words; only templates
+                learned from the same engine are used
+        """
+        grid_boxes = normalize_boxes(boxes, *page_size)
+        key = vendor_key(words, grid_boxes)
+        with self._lock:
+            self._reload()
+            template = self._templates.get(_store_key(ocr_engine, key)) if key else None
+            if template is None or template.samples < self.min_samples:
+                self.no_template += 1
+                return None
+
+        match = match_template(template, words, grid_boxes)
+        with self._lock:
+            if match.confidence < min_confidence:
+                self.low_confidence += 1
+                return None
+            self.hits += 1
+        return match
+
+    def learn(
+        self,
+        words: List[str],
+        boxes: List[List[int]],
+        page_size: Tuple[int, int],
+        fields: Dict[str, str],
+        ocr_engine: str
+    ) -> Optional[VendorTemplate]:
+        """
+        Learn from a confirmed extraction (field name -> text as on the page,
+        see TEMPLATE_FIELDS) of the words ocr_engine read. Returns the updated
+        template, or None when the vendor cannot be identified.
+        """
+        unknown = sorted(set(fields) - set(TEMPLATE_FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown template fields {', '.join(unknown)}, expected {', '.join(TEMPLATE_FIELDS)}")
+        grid_boxes = normalize_boxes(boxes, *page_size)
+        key = vendor_key(words, grid_boxes)
+        if key is None:
+            return None
+        store_key = _store_key(ocr_engine, key)
+        with self._lock, self._file_lock:
+            self._reload()
+            template = learn_template(self._templates.get(store_key), key, words, grid_boxes, fields, ocr_engine)
+            self._templates[store_key] = template
+            self._save()
+        logger.info(f"✅ Learned {ocr_engine} template {key} from {template.samples} invoice(s)")
+        return template
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "templates": len(self._templates),
+                "usable_templates": sum(t.samples >= self.min_samples for t in self._templates.values()),
+                "hits": self.hits,
+                "low_confidence": self.low_confidence,
+                "no_template": self.no_template,
+            }
+
+    def _reload(self) -> None:
+        """Pick up templates learned by other workers (call with the lock held)"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.path, "r") as f:
+            data = json.load(f)
+        templates = {}
+        for key, entry in data.items():
+            if not entry.get("ocr_engine"):
+                # Learned before templates were kept per engine: the words
+                # may come from any engine, so it is relearned
+                logger.warning(f"⚠️ Dropping template {key} learned from an unknown OCR engine")
+                continue
+            templates[key] = VendorTemplate(
+                entry["vendor_key"],
+                entry["samples"],
+                [tuple(anchor) for anchor in entry["anchors"]],
+                entry["regions"],
+                entry["ocr_engine"],
+            )
+        self._templates = templates
+        self._mtime = mtime
+
+    def _save(self) -> None:
+        """Write all templates atomically (call with the lock held)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({key: asdict(t) for key, t in self._templates.items()}, f)
+        os.replace(tmp_path, self.path)
+        self._mtime = self.path.stat().st_mtime
+
+
+def _store_key(ocr_engine: str, key: str) -> str:
+    return f"{ocr_engine}|{key}"
+
+
+# Shared store instance (created on first use)
+_store: Optional[VendorTemplateStore] = None
+_store_lock = threading.Lock()
+
+def get_template_store() -> Optional[VendorTemplateStore]:
+    """Return the process-wide template store, or None when templates are disabled"""
+    global _store
+    if not settings.VENDOR_TEMPLATES:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = VendorTemplateStore(settings.VENDOR_TEMPLATES_PATH, settings.TEMPLATE_MIN_SAMPLES)
+    return _store
@@ -0,0 +1,125 @@
+"""
+Model Warm-up and Readiness
+
+This module tracks the heavy models the API loads lazily:
+- Background warm-up of the OCR reader and LayoutLMv3 at startup
+- Per-component readiness (not_loaded, loading, ready, failed)
+
+Author: Shared
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _load_ocr():
+    from app.services.ocr_service import get_ocr_reader
+    get_ocr_reader()
+
+
+def _ocr_loaded() -> bool:
+    from app.services.ocr_service import ocr_reader_loaded
+    return ocr_reader_loaded()
+
+
+def _load_layoutlm():
+    from app.services.invoice_extraction import get_model
+    get_model()
+
+
+def _layoutlm_loaded() -> bool:
+    from app.services.invoice_extraction import model_loaded
+    return model_loaded()
+
+
+# Component name -> (loader, loaded check)
+COMPONENTS: Dict[str, Tuple[Callable[[], None], Callable[[], bool]]] = {
+    "ocr": (_load_ocr, _ocr_loaded),
+    "layoutlm": (_load_layoutlm, _layoutlm_loaded),
+}
+
+_lock = threading.Lock()
+_loading: Dict[str, float] = {}  # component -> load start time
+_failures: Dict[str, str] = {}
+_load_seconds: Dict[str, float] = {}
+_warmup_thread: Optional[threading.Thread] = None
+_unknown_reported: set = set()
+
+
+def known_components(components: Optional[List[str]] = None) -> List[str]:
+    """The given component names (default: all), skipping and logging unknown ones"""
+    if not components:
+        return list(COMPONENTS)
+    unknown = [name for name in components if name not in COMPONENTS]
+    with _lock:
+        unreported = [name for name in unknown if name not in _unknown_reported]
+        _unknown_reported.update(unreported)
+    if unreported:
+        logger.warning(
+            f"⚠️ Skipping unknown warm-up components {', '.join(unreported)} "
+            f"(expected {', '.join(COMPONENTS)})"
+        )
+    return [name for name in components if name in COMPONENTS]
+
+
+def warm_up(components: Optional[List[str]] = None) -> None:
+    """Load the given components (default: all) in the calling thread"""
+    for name in known_components(components):
+        loader, _ = COMPONENTS[name]
+        with _lock:
+            _loading[name] = time.perf_counter()
+            _failures.pop(name, None)
+        try:
+            loader()
+            with _lock:
+                _load_seconds[name] = time.perf_counter() - _loading[name]
+            logger.info(f"🔥 Warmed up {name} in {_load_seconds[name]:.1f}s")
+        except Exception as e:
+            logger.error(f"❌ Warm-up of {name} failed: {str(e)}")
+            with _lock:
+                _failures[name] = str(e)
+        finally:
+            with _lock:
+                _loading.pop(name, None)
+
+
+def start_background_warmup(components: Optional[List[str]] = None) -> threading.Thread:
+    """Warm up components in a daemon thread so the app serves requests meanwhile"""
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is None or not _warmup_thread.is_alive():
+            _warmup_thread = threading.Thread(
+                target=warm_up, args=(components,), name="model-warmup", daemon=True
+            )
+            _warmup_thread.start()
+        return _warmup_thread
+
+
+def component_status(name: str) -> str:
+    _, is_loaded = COMPONENTS[name]
+    if is_loaded():
+        return "ready"
+    with _lock:
+        if name in _loading:
+            return "loading"
+        if name in _failures:
+            return "failed"
+    return "not_loaded"
+
+
+def readiness(components: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Readiness of the given components (default: all)"""
+    names = known_components(components)
+    statuses = {name: component_status(name) for name in names}
+    with _lock:
+        errors = {name: _failures[name] for name in names if name in _failures}
+        load_seconds = {name: round(_load_seconds[name], 2) for name in names if name in _load_seconds}
+    return {
+        "ready": all(status == "ready" for status in statuses.values()),
+        "components": statuses,
+        "load_seconds": load_seconds,
+        "errors": errors,
+    }
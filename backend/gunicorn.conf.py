@@ -0,0 +1,46 @@
+"""
+Gunicorn Configuration
+
+Production entry point running the FastAPI app in uvicorn workers:
+    gunicorn app.main:app -c gunicorn.conf.py
+
+With PRELOAD_MODELS=true the master imports the app and loads the models
+listed in WARMUP_COMPONENTS before forking, so every worker shares one
+copy-on-write copy of the weights instead of loading its own.
+
+Author: Shared
+"""
+import logging
+import multiprocessing
+import os
+
+from app.core.config import settings
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+preload_app = settings.PRELOAD_MODELS
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def when_ready(server):
+    """Runs in the master once the app is imported, before any worker is forked"""
+    if not settings.PRELOAD_MODELS:
+        return
+
+    from app.services.shared_weights import prepare_for_fork
+    from app.services.warmup import warm_up
+
+    components = [name.strip() for name in settings.WARMUP_COMPONENTS.split(",") if name.strip()]
+    # ONNX Runtime sessions own thread pools that do not survive fork; each
+    # worker creates its own session instead
+    if settings.LAYOUTLM_BACKEND.startswith("onnx") and "layoutlm" in components:
+        logger.info("Not preloading layoutlm: ONNX Runtime sessions cannot be shared across fork")
+        components.remove("layoutlm")
+
+    logger.info(f"Preloading models in the master: {', '.join(components)}")
+    warm_up(components)
+    prepare_for_fork()
+
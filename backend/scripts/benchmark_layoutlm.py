@@ -0,0 +1,97 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import psutil
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+
+# Usage: python scripts/benchmark_layoutlm.py [model_dir] [backends...]
+# Each backend is measured in a fresh subprocess so RSS is not shared between them.
+SROIE_DATASET = "datasets/sroie_tokenized"
+REPEATS = 5
+
+
+def measure(backend_name: str, model_dir: str) -> dict:
+    """Load one backend and time extraction over the SROIE samples (runs in the child)"""
+    from datasets import load_from_disk
+    from transformers import LayoutLMv3Processor  # noqa: F401 - shared by every backend, keep out of the model RSS
+    from app.services.invoice_extraction import extract_fields, extract_fields_batch
+    from app.services.layoutlm_backends import load_backend
+
+    process = psutil.Process()
+    # The tokenized dataset stores boxes on the 0-1000 grid already
+    samples = [(s["image"].convert("RGB"), s["words"], s["boxes"]) for s in load_from_disk(SROIE_DATASET)]
+    rss_before = process.memory_info().rss
+
+    start = time.perf_counter()
+    backend = load_backend(backend_name, model_dir)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = process.memory_info().rss
+
+    # First call pays for lazy initialisation, keep it out of the timings
+    extract_fields(*samples[0], backend=backend, boxes_normalized=True)
+
+    latencies = []
+    for _ in range(REPEATS):
+        for image, words, boxes in samples:
+            start = time.perf_counter()
+            extract_fields(image, words, boxes, backend=backend, boxes_normalized=True)
+            latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+
+    start = time.perf_counter()
+    extract_fields_batch(samples * REPEATS, backend=backend, boxes_normalized=True)
+    batch_docs_per_s = len(samples) * REPEATS / (time.perf_counter() - start)
+
+    return {
+        "backend": backend_name,
+        "load_s": load_seconds,
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+        "batch_docs_s": batch_docs_per_s,
+        "model_rss_mb": (rss_loaded - rss_before) / 1e6,
+        "peak_rss_mb": process.memory_info().rss / 1e6,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        print(json.dumps(measure(sys.argv[2], sys.argv[3])))
+        sys.exit(0)
+
+    from app.services.layoutlm_backends import available_backends
+
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else settings.LAYOUTLM_MODEL_DIR
+    backends = sys.argv[2:] or available_backends(model_dir)
+    if not backends:
+        print(f"❌ No LayoutLMv3 model found in {model_dir}")
+        sys.exit(1)
+
+    print(f"🔍 Benchmarking LayoutLMv3 backends from {model_dir}...")
+    print(f"{'backend':<12}{'load s':>8}{'p50 ms':>10}{'p95 ms':>10}{'batch doc/s':>13}{'model MB':>10}{'RSS MB':>10}")
+    reference = None
+    for name in backends:
+        child = subprocess.run(
+            [sys.executable, __file__, "--child", name, model_dir],
+            capture_output=True, text=True
+        )
+        if child.returncode != 0:
+            print(f"{name:<12} failed: {child.stderr.strip().splitlines()[-1]}")
+            continue
+        r = json.loads(child.stdout.strip().splitlines()[-1])
+        reference = reference or r
+        print(
+            f"{name:<12}{r['load_s']:>8.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['batch_docs_s']:>13.1f}"
+            f"{r['model_rss_mb']:>10.0f}{r['peak_rss_mb']:>10.0f}"
+            f"  ({reference['p50_ms'] / r['p50_ms']:.1f}x)"
+        )
+
+    print("✅ Benchmark complete")
@@ -0,0 +1,36 @@
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.ocr_service import get_ocr_reader, ocr_images_batched
+
+# Usage: python scripts/benchmark_ocr.py [image_dir] [batch sizes...]
+IMAGE_DIR = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("datasets/sroie/images")
+BATCH_SIZES = [int(b) for b in sys.argv[2:]] or [1, 4, 8, 16]
+
+images = [p.read_bytes() for p in sorted(IMAGE_DIR.glob("*.jpg"))[:32]]
+if not images:
+    print(f"❌ No .jpg images found in {IMAGE_DIR}")
+    sys.exit(1)
+
+# Load the reader outside the timed region
+get_ocr_reader()
+
+print(f"🔍 Benchmarking OCR on {len(images)} images...")
+
+start = time.perf_counter()
+for image in images:
+    get_ocr_reader().readtext(image)
+baseline = len(images) / (time.perf_counter() - start)
+print(f"readtext, one image at a time: {baseline:.2f} images/s")
+
+for batch_size in BATCH_SIZES:
+    start = time.perf_counter()
+    ocr_images_batched(images, batch_size=batch_size)
+    throughput = len(images) / (time.perf_counter() - start)
+    print(f"readtext_batched, batch_size={batch_size}: {throughput:.2f} images/s ({throughput / baseline:.1f}x)")
+
+print("✅ Benchmark complete")
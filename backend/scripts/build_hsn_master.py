@@ -0,0 +1,33 @@
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.hsn_master import MASTER_FILE, MASTER_SOURCE, HsnMaster, source_digest, write_master
+
+# Usage: python scripts/build_hsn_master.py [source] [output]
+# source is hsn_mapping.json or a CSV export of the full HSN/SAC master with
+# columns code, default_category, description and optionally reliability_score
+# The header records the source's digest; when app/data/hsn_mapping.json is
+# present and differs, the app compiles the table from it again
+SOURCE = Path(sys.argv[1]) if len(sys.argv) > 1 else MASTER_SOURCE
+OUTPUT = Path(sys.argv[2]) if len(sys.argv) > 2 else MASTER_FILE
+
+if SOURCE.suffix == ".csv":
+    with open(SOURCE, newline="", encoding="utf-8") as f:
+        mapping = {row["code"]: row for row in csv.DictReader(f)}
+else:
+    with open(SOURCE, "r", encoding="utf-8") as f:
+        mapping = json.load(f)
+
+write_master(mapping, OUTPUT, source_digest(SOURCE.read_bytes()))
+
+started = time.perf_counter()
+master = HsnMaster.open(OUTPUT)
+open_us = (time.perf_counter() - started) * 1e6
+print(f"✅ Compiled {len(master)} codes from {SOURCE} into {OUTPUT} ({OUTPUT.stat().st_size} bytes)")
+print(f"📊 Opened in {open_us:.0f} µs")
@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+import torch
+from PIL import Image
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import LayoutLMv3ForTokenClassification, LayoutLMv3Processor
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.services.layoutlm_backends import MODEL_INPUTS, ONNX_FP32_FILE, ONNX_INT8_FILE, ONNX_SUBDIR
+
+# Usage: python scripts/export_layoutlm_onnx.py [model_dir]
+MODEL_DIR = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(settings.LAYOUTLM_MODEL_DIR)
+OUTPUT_DIR = MODEL_DIR / ONNX_SUBDIR
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+processor = LayoutLMv3Processor.from_pretrained(MODEL_DIR)
+model = LayoutLMv3ForTokenClassification.from_pretrained(MODEL_DIR)
+model.eval()
+
+# Dummy document; batch and sequence axes are exported as dynamic
+encoding = processor(
+    images=Image.new("RGB", (224, 224), "white"),
+    text=["invoice", "total", "100.00"],
+    boxes=[[10, 10, 100, 40], [10, 50, 80, 80], [100, 50, 200, 80]],
+    return_tensors="pt"
+)
+# Trailing dict: passed to forward() as keyword arguments
+inputs = ({name: encoding[name] for name in MODEL_INPUTS},)
+
+fp32_path = OUTPUT_DIR / ONNX_FP32_FILE
+print(f"📦 Exporting {MODEL_DIR} to {fp32_path}...")
+torch.onnx.export(
+    model,
+    inputs,
+    str(fp32_path),
+    input_names=MODEL_INPUTS,
+    output_names=["logits"],
+    dynamic_axes={
+        "input_ids": {0: "batch", 1: "sequence"},
+        "bbox": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "sequence"},
+        "pixel_values": {0: "batch"},
+        "logits": {0: "batch", 1: "sequence"},
+    },
+    opset_version=17,
+    dynamo=False
+)
+
+int8_path = OUTPUT_DIR / ONNX_INT8_FILE
+print(f"🗜️ Quantizing weights to INT8: {int8_path}...")
+quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+
+for path in (fp32_path, int8_path):
+    print(f"{path.name}: {path.stat().st_size / 1e6:.1f} MB")
+print("✅ Export complete")
@@ -0,0 +1,96 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import psutil
+
+# Usage: python scripts/memory_report.py [workers] [components]
+# Starts gunicorn in each weight-sharing mode, waits until every worker has
+# loaded its models, and reports per-worker memory. RSS counts shared pages in
+# full; PSS splits them between the processes mapping them; USS is private.
+BACKEND_DIR = Path(__file__).parent.parent
+WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+COMPONENTS = sys.argv[2] if len(sys.argv) > 2 else "layoutlm"
+READY_TIMEOUT = 600
+
+MODES = {
+    "per-worker": {},
+    "preload": {"PRELOAD_MODELS": "true"},
+    "mmap": {"MODEL_WEIGHTS_MMAP": "true"},
+    "preload+mmap": {"PRELOAD_MODELS": "true", "MODEL_WEIGHTS_MMAP": "true"},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_loaded(master: subprocess.Popen, port: int) -> bool:
+    """Every worker warms up on its own; wait until many requests in a row see models ready"""
+    deadline = time.time() + READY_TIMEOUT
+    streak = 0
+    while time.time() < deadline and streak < 3 * WORKERS:
+        if master.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {master.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=5):
+                streak += 1
+        except Exception:
+            streak = 0
+            time.sleep(0.5)
+    return streak >= 3 * WORKERS
+
+
+def measure(mode: str, overrides: dict) -> dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "BIND": f"127.0.0.1:{port}",
+        "WEB_CONCURRENCY": str(WORKERS),
+        "WARMUP_MODELS": "true",
+        "WARMUP_COMPONENTS": COMPONENTS,
+        **overrides,
+    }
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app.main:app", "-c", "gunicorn.conf.py"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_until_loaded(master, port):
+            raise RuntimeError(f"{mode}: workers did not become ready within {READY_TIMEOUT}s")
+        time.sleep(2)  # let the last warm-up threads settle
+
+        master_info = psutil.Process(master.pid).memory_full_info()
+        workers = [child.memory_full_info() for child in psutil.Process(master.pid).children()]
+        return {
+            "mode": mode,
+            "rss": sum(w.rss for w in workers) / len(workers),
+            "pss": sum(w.pss for w in workers) / len(workers),
+            "uss": sum(w.uss for w in workers) / len(workers),
+            "total_pss": master_info.pss + sum(w.pss for w in workers),
+        }
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+
+print(f"📊 Worker memory with {WORKERS} workers, components: {COMPONENTS}")
+print(f"{'mode':<14}{'RSS/worker':>12}{'PSS/worker':>12}{'USS/worker':>12}{'total PSS':>12}")
+for mode, overrides in MODES.items():
+    try:
+        r = measure(mode, overrides)
+    except Exception as e:
+        print(f"{mode:<14} failed: {str(e)}")
+        continue
+    print(
+        f"{r['mode']:<14}{r['rss'] / 1e6:>10.0f}MB{r['pss'] / 1e6:>10.0f}MB"
+        f"{r['uss'] / 1e6:>10.0f}MB{r['total_pss'] / 1e6:>10.0f}MB"
+    )
+print("✅ Memory report complete")
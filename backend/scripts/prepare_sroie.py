@@ -1,10 +1,16 @@
 import os
+import sys
+from pathlib import Path
 from tqdm import tqdm
 from PIL import Image
-import pytesseract
 from datasets import Dataset, DatasetDict
 from transformers import LayoutLMv3Processor
 
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.ocr_engines import TesseractEngine
+
 # Paths
 IMAGE_DIR = "datasets/sroie/images"
 LABEL_DIR = "datasets/sroie/annotations"
@@ -12,6 +18,9 @@ LABEL_DIR = "datasets/sroie/annotations"
 # Load processor (no OCR here)
 processor = LayoutLMv3Processor.from_pretrained("microsoft/layoutlmv3-base", apply_ocr=False)
 
+# Same Tesseract path the OCR router uses
+tesseract = TesseractEngine()
+
 examples = []
 
 def parse_labels(txt_path):
@@ -47,21 +56,11 @@ for filename in tqdm(os.listdir(IMAGE_DIR)):
     image = Image.open(img_path).convert("RGB")
     width, height = image.size
 
-    ocr_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-
-    words = []
-    boxes = []
-
-    for i in range(len(ocr_data["text"])):
-        word = ocr_data["text"][i].strip()
-        if not word:
-            continue
-
-        x, y, w, h = ocr_data["left"][i], ocr_data["top"][i], ocr_data["width"][i], ocr_data["height"][i]
-        box = normalize_box([x, y, x + w, y + h], width, height)
+    with open(img_path, "rb") as f:
+        ocr = tesseract.recognize(f.read())
 
-        words.append(word)
-        boxes.append(box)
+    words = ocr.words
+    boxes = [normalize_box(box, width, height) for box in ocr.boxes]
 
     # Just pass raw labels for now
     examples.append({
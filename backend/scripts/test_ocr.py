@@ -5,7 +5,8 @@ from pathlib import Path
 # Add the parent directory to Python path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from app.services.ocr_service import get_vision_client, run_ocr_on_file
+from app.services.ocr_engines import get_vision_client
+from app.services.ocr_service import run_ocr_on_file
 
 def test_ocr():
     """Test the OCR service with a sample image."""
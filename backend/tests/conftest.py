@@ -23,4 +23,13 @@ def cleanup_test_files(sample_invoice_path):
     """Clean up test files after each test"""
     yield
     if sample_invoice_path.exists():
-        os.remove(sample_invoice_path) 
\ No newline at end of file
+        os.remove(sample_invoice_path) 
+
+
+@pytest.fixture
+def fake_vision_server():
+    """Local fake Google Vision REST endpoint"""
+    from tests.fake_vision_server import FakeVisionServer
+
+    with FakeVisionServer() as server:
+        yield server
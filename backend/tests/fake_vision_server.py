@@ -0,0 +1,105 @@
+"""
+Fake Google Vision Server
+
+Local stand-in for the Vision REST API (POST /v1/images:annotate) so the
+cloud OCR path can run offline. Each image's content is read as
+whitespace-separated words and returned as one line of word annotations,
+which lets tests tell images apart. Content starting with b"ERROR" yields a
+per-image error status.
+
+Run standalone for offline development and point the app at it:
+    python tests/fake_vision_server.py 8085
+    GOOGLE_VISION_ENDPOINT=127.0.0.1:8085 uvicorn app.main:app
+
+Author: Dev 1
+"""
+import base64
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import sys
+import threading
+from typing import Any, Dict, List
+
+WORD_WIDTH = 60
+WORD_HEIGHT = 20
+WORD_CONFIDENCE = 0.95
+
+
+def annotate(content: bytes) -> Dict[str, Any]:
+    """Build the AnnotateImageResponse JSON for one image"""
+    if content.startswith(b"ERROR"):
+        return {"error": {"code": 3, "message": content.decode("utf-8", "replace")}}
+
+    words = []
+    for index, text in enumerate(content.decode("utf-8", "replace").split()):
+        x0 = 10 + index * (WORD_WIDTH + 10)
+        x1, y0, y1 = x0 + WORD_WIDTH, 10, 10 + WORD_HEIGHT
+        words.append({
+            "confidence": WORD_CONFIDENCE,
+            "boundingBox": {"vertices": [
+                {"x": x0, "y": y0}, {"x": x1, "y": y0}, {"x": x1, "y": y1}, {"x": x0, "y": y1}
+            ]},
+            "symbols": [{"text": char} for char in text],
+        })
+
+    return {"fullTextAnnotation": {
+        "text": content.decode("utf-8", "replace"),
+        "pages": [{"blocks": [{"paragraphs": [{"words": words}]}]}],
+    }}
+
+
+class FakeVisionServer:
+    """Threaded fake Vision endpoint; use as a context manager"""
+
+    def __init__(self, port: int = 0):
+        self.calls: List[int] = []  # number of images in each annotate call
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if not self.path.startswith("/v1/images:annotate"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                requests = body.get("requests", [])
+                server.calls.append(len(requests))
+                payload = json.dumps({"responses": [
+                    annotate(base64.b64decode(request["image"]["content"])) for request in requests
+                ]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> "FakeVisionServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeVisionServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8085
+    with FakeVisionServer(port) as fake:
+        print(f"🛰️ Fake Vision server listening on {fake.endpoint}")
+        threading.Event().wait()
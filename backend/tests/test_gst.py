@@ -9,3 +9,463 @@ This module contains test cases for GST-related functionality:
 
 Author: Dev 2
 """
+import sys
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.gst_categorization import GSTCategorizationService, GSTCategory
+from app.services.hsn_index import HsnIndex
+
+
+def test_hsn_index_longest_prefix_match():
+    index = HsnIndex({
+        "84": {"default_category": "18%"},
+        "8415": {"default_category": "28%"},
+        "847130": {"default_category": "18%"},
+        "84713010": {"default_category": "18%"},
+    })
+
+    assert index.lookup("84713010").level == "tariff_item"
+    assert index.lookup("84713090").code == "847130"
+    assert index.lookup("8415.10.10").code == "8415"
+    assert index.lookup("84819090").level == "chapter"
+    assert index.lookup("85171300") is None
+    assert index.lookup("84713010").exact and not index.lookup("8415 1010").exact
+
+
+def test_categorize_invoice_resolves_unlisted_codes_by_prefix():
+    service = GSTCategorizationService()
+
+    listed = service.categorize_invoice({"hsn_code": "998231"})
+    assert listed.category == GSTCategory.EIGHTEEN and listed.matched_level == "subheading"
+    assert listed.validation_notes == []
+
+    # Air conditioner tariff item not in the master: falls back to heading 8415
+    unlisted = service.categorize_invoice({"hsn_code": "84151010"})
+    assert unlisted.category == GSTCategory.TWENTY_EIGHT
+    assert (unlisted.matched_code, unlisted.matched_level) == ("8415", "heading")
+    assert unlisted.confidence_score > 0
+
+    unknown = service.categorize_invoice({"hsn_code": "00000000"})
+    assert unknown.category == GSTCategory.NIL and unknown.confidence_score == 0.0
+
+
+def test_binary_hsn_master_matches_mapping(tmp_path):
+    from app.services.hsn_master import HsnMaster, write_master
+
+    mapping = {
+        "04": {"default_category": "5%", "description": "Dairy produce", "reliability_score": 0.5},
+        "0401": {"default_category": "NIL", "description": "Milk and cream", "reliability_score": 0.7},
+        "8415": {"default_category": "28%", "description": "Air conditioners", "reliability_score": 0.7},
+        "998231": {"default_category": "18%", "description": "Software Development Services", "reliability_score": 0.9},
+    }
+    path = tmp_path / "hsn_master.bin"
+    write_master(mapping, path)
+    master, trie = HsnMaster.open(path), HsnIndex(mapping)
+
+    codes = ["04", "04011000", "0402", "84151010", "998231", "99823", "85", "4", "", "04011000"]
+    assert len(master) == 4
+    # Repeated past the scalar cut-off so the vectorized path runs
+    for code, batched in zip(codes * 4, master.lookup_many(codes * 4)):
+        expected, match = trie.lookup(code), master.lookup(code)
+        assert (match and (match.code, match.level, match.info)) == (expected and (expected.code, expected.level, expected.info))
+        assert batched == match
+    # Leading zeros survive the integer encoding
+    assert master.lookup("04011000").code == "0401"
+
+
+def test_gst_services_share_one_hsn_master():
+    assert GSTCategorizationService().hsn_index is GSTCategorizationService().hsn_index
+
+
+def test_categorize_batch_endpoint():
+    import json
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    records = [{"id": "a", "hsn_code": "998231"}, {"id": "b", "hsn_code": "00000000"}, {"id": "c"}]
+
+    response = client.post("/api/v1/gst/categorize-batch", json=records)
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["id"] for result in body["results"]] == ["a", "b", "c"]
+    assert body["results"][0]["matched_level"] == "subheading"
+    assert body["results"][1]["category"] == "NIL" and body["summary"]["records"] == 3
+
+    response = client.post(
+        "/api/v1/gst/categorize-batch",
+        content="\n".join(json.dumps(record) for record in records),
+        headers={"Content-Type": "application/x-ndjson", "Accept": "application/x-ndjson"},
+    )
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line.get("index") for line in lines[:3]] == [0, 1, 2]
+    assert lines[-1]["summary"]["unmatched"] == 2
+
+    assert client.post("/api/v1/gst/categorize-batch", json={"records": "nope"}).status_code == 400
+
+
+def test_categorize_line_items_rolls_up_tax_per_slab():
+    service = GSTCategorizationService()
+    invoice = {"items": [
+        {"description": "Milk", "hsn_code": "0401", "amount": 50},
+        {"description": "Software development services", "amount": 10000},
+        {"description": "Software Development Services", "quantity": 2, "rate": 500},
+        {"description": "Unlisted widget", "amount": 100},
+    ]}
+
+    result = service.categorize_line_items(invoice)
+
+    assert [item.source for item in result.items] == ["hsn_code", "description", "description", "none"]
+    assert result.items[1].result.hsn_code == "998231" and result.items[1].tax == 1800.0
+    assert result.items[2].taxable_value == 1000.0
+    assert result.slabs["18%"] == {"items": 2, "taxable_value": 11000.0, "tax": 1980.0}
+    # Milk is nil-rated; the unlisted widget's rate is unknown
+    assert result.slabs["NIL"] == {"items": 1, "taxable_value": 50.0, "tax": 0.0}
+    assert result.slabs["UNCLASSIFIED"] == {"items": 1, "taxable_value": 100.0, "tax": 0.0}
+    assert (result.taxable_value, result.tax) == (11150.0, 1980.0)
+    # Both spellings normalize to one memoized description
+    assert service._suggestions.cache_info().hits >= 1
+    assert result.items[3].suggestions == service.suggest_hsn_codes("Unlisted widget")
+
+
+def test_description_index_ranks_codes_by_tfidf_similarity():
+    from app.services.hsn_search import HsnDescriptionIndex
+
+    index = HsnDescriptionIndex([
+        ("8471", {"description": "Automatic data processing machines"}),
+        ("847130", {"description": "Portable computers (laptops)"}),
+        ("8443", {"description": "Printing machinery and printers"}),
+        ("998231", {"description": "Software development services"}),
+        ("9983", {"description": "Other professional and technical services"}),
+    ])
+
+    assert index.search("Laptop", k=1)[0][0] == "847130"
+    assert index.search("sofware developmnt", k=1)[0][0] == "998231"  # OCR misspellings
+    assert index.search("Software development services")[0][1] == 1.0
+    assert index.search("zzz") == []
+
+
+def test_matching_description_raises_confidence():
+    service = GSTCategorizationService()
+    plain = service.categorize_invoice({"hsn_code": "998231"})
+    described = service.categorize_invoice({"hsn_code": "998231", "description": "Software development"})
+    unrelated = service.categorize_invoice({"hsn_code": "998231", "description": "Fresh milk"})
+
+    assert described.confidence_score == min(plain.confidence_score + 0.2, 1.0)
+    assert unrelated.confidence_score == plain.confidence_score
+    # A code suggested from the description gets no bonus for matching it
+    guessed = service.categorize_line_items({"items": [{"description": "Software development", "amount": 1}]}).items[0]
+    assert guessed.source == "description"
+    assert guessed.result.confidence_score == round(plain.confidence_score * guessed.suggestions[0][1], 3)
+
+
+def test_hsn_mapping_reload_swaps_in_new_rates(tmp_path, monkeypatch):
+    import json
+    import os
+    from app.services import hsn_master
+
+    source = tmp_path / "hsn_mapping.json"
+    entry = {"description": "Air conditioners", "reliability_score": 0.7}
+    source.write_text(json.dumps({"8415": {**entry, "default_category": "28%"}}))
+    monkeypatch.setattr(hsn_master, "MASTER_SOURCE", source)
+    monkeypatch.setattr(hsn_master, "MASTER_FILE", tmp_path / "hsn_master.bin")
+    monkeypatch.setattr(hsn_master, "_mapping", None)
+    monkeypatch.setattr(hsn_master.settings, "HSN_RELOAD_SECONDS", 0)
+
+    service = GSTCategorizationService()
+    in_flight = hsn_master.get_hsn_mapping()
+    before = service.categorize_invoice({"hsn_code": "84151010"})
+    assert before.category == GSTCategory.TWENTY_EIGHT
+    assert not hsn_master.reload_hsn_mapping()
+
+    # A rate notification edits the source
+    source.write_text(json.dumps({"8415": {**entry, "default_category": "18%"}}))
+    mtime = source.stat().st_mtime + 10
+    os.utime(source, (mtime, mtime))
+    assert hsn_master.reload_hsn_mapping()
+
+    after = service.categorize_invoice({"hsn_code": "84151010"})
+    assert after.category == GSTCategory.EIGHTEEN
+    assert after.mapping_version == hsn_master.get_hsn_mapping().version != before.mapping_version
+    # Requests holding the old version keep reading the old table
+    assert in_flight.master.lookup("8415").info["default_category"] == "28%"
+
+    # A broken edit keeps the current version
+    source.write_text("{")
+    os.utime(source, (mtime + 10, mtime + 10))
+    assert not hsn_master.reload_hsn_mapping()
+    assert service.categorize_invoice({"hsn_code": "8415"}).category == GSTCategory.EIGHTEEN
+
+
+def test_hsn_master_recompiles_when_the_source_digest_differs(tmp_path, monkeypatch):
+    import json
+    import os
+    from app.services import hsn_master
+
+    source, table = tmp_path / "hsn_mapping.json", tmp_path / "hsn_master.bin"
+    entry = {"description": "Air conditioners", "reliability_score": 0.7}
+    monkeypatch.setattr(hsn_master, "MASTER_SOURCE", source)
+    monkeypatch.setattr(hsn_master, "MASTER_FILE", table)
+    # A table compiled from other rates, newer than a source restored with its old mtime
+    hsn_master.write_master({"8415": {**entry, "default_category": "18%"}}, table)
+    source.write_text(json.dumps({"8415": {**entry, "default_category": "28%"}}))
+    os.utime(source, (table.stat().st_mtime - 100, table.stat().st_mtime - 100))
+
+    mapping = hsn_master._load_mapping(generation=1)
+    assert mapping.master.lookup("8415").info["default_category"] == "28%"
+    assert mapping.master.source_digest == hsn_master.source_digest(source.read_bytes())
+    # The table was rewritten, and that write is not seen as a change
+    assert mapping.source_mtime == hsn_master._source_mtime()
+
+    # A deployment that ships only the compiled table reloads when it is replaced
+    source.unlink()
+    hsn_master.write_master({"8415": {**entry, "default_category": "18%"}}, table)
+    os.utime(table, (mapping.source_mtime + 10, mapping.source_mtime + 10))
+    assert hsn_master._source_mtime() != mapping.source_mtime
+    assert hsn_master._load_mapping(generation=2).master.lookup("8415").info["default_category"] == "18%"
+
+
+def test_hsn_mapping_watcher_restarts_in_forked_workers(monkeypatch):
+    import os
+    from app.services import hsn_master
+
+    monkeypatch.setattr(hsn_master.settings, "HSN_RELOAD_SECONDS", 3600)
+    monkeypatch.setattr(hsn_master, "_watcher", None)
+    # The mapping and watcher were set up in another process (a preloading
+    # gunicorn master) before this worker was forked
+    monkeypatch.setattr(hsn_master, "_watcher_pid", -1)
+
+    hsn_master.get_hsn_mapping()
+    assert hsn_master._watcher_pid == os.getpid() and hsn_master._watcher.is_alive()
+
+
+def test_hsn_mapping_reloads_do_not_overlap(monkeypatch):
+    import threading
+    import time
+    from app.services import hsn_master
+
+    current = hsn_master.get_hsn_mapping()
+    running, overlaps = [], []
+
+    def slow_load(generation):
+        overlaps.append(len(running))
+        running.append(generation)
+        time.sleep(0.05)
+        running.pop()
+        return current
+
+    monkeypatch.setattr(hsn_master, "_load_mapping", slow_load)
+    threads = [threading.Thread(target=hsn_master.reload_hsn_mapping, args=(True,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert overlaps == [0, 0, 0]
+
+
+def test_back_dated_invoices_use_the_rate_in_force():
+    from datetime import date
+    import pytest
+    from app.services.hsn_rates import RateHistory
+
+    history = RateHistory({
+        "8418": [
+            {"from": "2017-07-01", "to": "2018-07-27", "default_category": "28%"},
+            {"from": "2018-07-27", "default_category": "18%"},
+        ],
+        "841810": [{"from": "2017-07-01", "to": "2017-11-15", "default_category": "12%"}],
+    })
+    assert history.category_on("8418", date(2018, 7, 26)) == "28%"
+    assert history.category_on("8418", date(2018, 7, 27)) == "18%"
+    assert history.category_on("8418", date(2017, 6, 30)) is None
+    assert history.resolve("84181010", "8418", date(2017, 8, 1)) == ("841810", "12%")
+    assert history.resolve("84181010", "8418", date(2018, 1, 1)) == ("8418", "28%")
+    assert history.resolve("84181010", "84181010", date(2018, 1, 1)) is None
+    # A typo in the history rejects the file instead of rating items with it
+    with pytest.raises(ValueError, match="Unknown GST category"):
+        RateHistory({"8418": [{"from": "2017-07-01", "default_category": "18"}]})
+
+    service = GSTCategorizationService()
+    assert service.categorize_invoice({"hsn_code": "8418", "date": "15/03/2018"}).category == GSTCategory.TWENTY_EIGHT
+    assert service.categorize_invoice({"hsn_code": "8418", "date": "2019-03-15"}).category == GSTCategory.EIGHTEEN
+    assert service.categorize_invoice({"hsn_code": "8418"}).category == GSTCategory.EIGHTEEN
+    items = service.categorize_line_items({"date": "01-08-2017", "items": [{"hsn_code": "8450", "amount": 100}]})
+    assert items.items[0].tax == 28.0
+
+
+def test_gst_returns_aggregate_by_period_section_and_state():
+    import io
+    from app.services.gst_returns import GstReturnAggregator
+
+    invoices = iter([
+        # Intra-state B2B: CGST + SGST
+        {"date": "2019-03-05", "buyer_gstin": "29AAGCR4375J1ZU", "items": [
+            {"hsn_code": "998231", "amount": 1000},
+            {"hsn_code": "0401", "amount": 200},
+        ]},
+        # Inter-state B2B: IGST
+        {"date": "2019-03-20", "buyer_gstin": "27AAPFU0939F1ZV", "hsn_code": "8418", "subtotal": 500, "gst_amount": 90},
+        # B2C with place of supply, back-dated rate
+        {"date": "2018-07-01", "place_of_supply": "27", "items": [{"hsn_code": "8418", "amount": 100}]},
+        {"date": "not a date", "hsn_code": "8418", "amount": 100},
+    ])
+    returns = GstReturnAggregator("29ABCDE1234F1Z5").add_many(invoices)
+
+    assert (returns.invoices, returns.skipped) == (3, 1)
+    assert returns.periods() == ["2018-07", "2019-03"]
+    march = returns.to_dict("2019-03")["periods"]["2019-03"]
+    assert march["b2b"] == [
+        {"gstin": "27AAPFU0939F1ZV", "count": 1, "taxable_value": 500.0, "igst": 90.0, "cgst": 0.0, "sgst": 0.0},
+        {"gstin": "29AAGCR4375J1ZU", "count": 1, "taxable_value": 1200.0, "igst": 0.0, "cgst": 90.0, "sgst": 90.0},
+    ]
+    assert march["gstr3b"][0]["nil_exempt_value"] == 200.0
+    assert march["gstr3b"][0]["gstr3b_due"] == "2019-04-20"
+    assert returns.rows("b2c") == [{
+        "period": "2018-07", "place_of_supply": "27", "rate": "28%",
+        "count": 1, "taxable_value": 100.0, "igst": 28.0, "cgst": 0.0, "sgst": 0.0,
+    }]
+    assert returns.total_tax() == 298.0
+
+    # Stated tax without a resolvable code: slab from the tax, never nil-rated
+    uncoded = GstReturnAggregator("29ABCDE1234F1Z5").add_many([
+        {"date": "2024-01-05", "amount": 1180, "gst_amount": 180},
+        {"date": "2024-01-06", "hsn_code": "0000", "subtotal": 100, "gst_amount": 7},
+    ])
+    assert [(row["rate"], row["cgst"]) for row in uncoded.rows("rates")] == [("18%", 90.0), ("UNCLASSIFIED", 3.5)]
+    assert uncoded.rows("gstr3b")[0]["nil_exempt_value"] == 0.0
+
+    # Itemized: items without a code share the tax the coded items leave over
+    itemized = GstReturnAggregator("29ABCDE1234F1Z5").add_many([
+        {"date": "2024-01-05", "gst_amount": 180, "items": [{"description": "qqq", "amount": 1000}]},
+        {"date": "2024-01-06", "gst_amount": 270, "items": [
+            {"hsn_code": "998231", "amount": 1000},
+            {"description": "qqq", "amount": 300},
+            {"description": "zzz", "amount": 200},
+        ]},
+        {"date": "2024-01-07", "items": [{"description": "qqq", "amount": 50}]},
+    ])
+    assert [(row["rate"], row["taxable_value"], row["cgst"]) for row in itemized.rows("rates")] == [
+        ("18%", 2500.0, 225.0), ("UNCLASSIFIED", 50.0, 0.0),
+    ]
+    assert itemized.rows("gstr3b")[0]["nil_exempt_value"] == 0.0
+    assert itemized.total_tax() == 450.0
+
+    out = io.StringIO()
+    returns.write_csv("rates", out)
+    assert out.getvalue().splitlines()[0] == "period,rate,count,taxable_value,igst,cgst,sgst"
+
+
+def test_gst_returns_endpoint_streams_ndjson():
+    import json
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    body = "\n".join(json.dumps({"date": f"2024-0{month}-10", "hsn_code": "998231", "amount": 100}) for month in (1, 2))
+    response = client.post(
+        "/api/v1/gst/returns?format=csv&section=gstr3b",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert len(lines) == 3 and lines[1].startswith("2024-01,1,100.0")
+    assert client.post("/api/v1/gst/returns?section=nope", json=[]).status_code == 400
+    for invoice in ({"items": [1]}, {"items": "abc"}, {"gstin": 27}, {"buyer_gstin": ["27"]}, 5):
+        assert client.post("/api/v1/gst/returns", json=[invoice]).status_code == 400
+
+
+def test_gstin_checksum_and_decomposition():
+    from app.services.gstin import check_character, validate_gstin, validate_gstins
+    from app.services.reconciliation import ReconciliationService
+    from app.services.validation import field_errors
+
+    check = validate_gstin(" 27aapfu0939f1zv ")
+    assert check.valid and check.gstin == "27AAPFU0939F1ZV"
+    assert (check.state, check.pan, check.holder_type, check.entity_number) == ("Maharashtra", "AAPFU0939F", "Firm", "1")
+    assert check_character("29AAGCR4375J1Z") == "U"
+
+    # Right format, wrong check character (a typical OCR misread)
+    typo = validate_gstin("27AAPFU0939F1ZW")
+    assert not typo.valid and typo.errors == ("Check character should be V, got W",)
+    assert not validate_gstin("00AAPFU0939F1ZV").valid
+    assert validate_gstin("27AAPFU0939").errors == ("GSTIN must be 15 characters, got 11",)
+    assert "gstin" in field_errors({"gstin": "27AAPFU0939F1ZW"})
+    assert not ReconciliationService()._is_valid_gstin_format("27AAPFU0939F1ZW")
+
+    gstins = ["27AAPFU0939F1ZV", "27AAPFU0939F1ZW", "", "29AAGCR4375J1ZU", "27AAPFU0939F1XV", "27AAPFÜ0939F1ZV"]
+    assert [result.valid for result in validate_gstins(gstins)] == [validate_gstin(g).valid for g in gstins]
+    assert [result.valid for result in validate_gstins(gstins)] == [True, False, False, True, False, False]
+
+
+def test_validate_gstins_endpoint():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    response = client.post(
+        "/api/v1/gst/validate-gstins?invalid_only=true",
+        content="gstin,name\n27AAPFU0939F1ZV,Acme\n27AAPFU0939F1ZW,Typo\n",
+        headers={"Content-Type": "text/csv"},
+    )
+    body = response.json()
+    assert body["summary"] == {**body["summary"], "count": 2, "valid": 1, "invalid": 1}
+    assert [(result["index"], result["gstin"]) for result in body["results"]] == [(1, "27AAPFU0939F1ZW")]
+    assert client.get("/api/v1/gst/gstin/29AAGCR4375J1ZU").json()["state"] == "Karnataka"
+
+
+def test_gst_penalties_per_period_from_filing_dates(tmp_path, monkeypatch):
+    from datetime import date
+    import threading
+    from app.services import analytics
+    from app.services.gst_penalties import GstPenaltyCalculator, load_gst_filings, period_penalty, record_gst_filing
+
+    path = str(tmp_path / "gst_filings.json")
+    record_gst_filing(path, "2024-01", {"gstr1": "2024-02-21"})
+    record_gst_filing(path, "2024-01", {"gstr3b": "2024-03-01", "tax_paid": None})
+    filings = load_gst_filings(path)
+    assert filings == {"2024-01": {"gstr1": "2024-02-21", "gstr3b": "2024-03-01"}}
+
+    calculator = GstPenaltyCalculator()
+    period_tax = {"2024-01": 1000.0, "2024-02": 0.0, "2024-05": 500.0}
+    january, february, may = calculator.calculate(period_tax, filings, as_of=date(2024, 6, 1))
+    # Both returns 10 days late at Rs 50/day, 18% a year on the tax for 10 days
+    assert (january.status, january.days_late) == ("filed_late", {"gstr1": 10, "gstr3b": 10})
+    assert (january.late_fee, january.interest, january.total) == (1000.0, 4.93, 1004.93)
+    # Unfiled nil return: Rs 20/day, capped at Rs 500 per return
+    assert (february.status, february.late_fee, february.interest) == ("overdue", 1000.0, 0.0)
+    assert (may.status, may.total) == ("open", 0.0)
+
+    # The filed period is final; only open periods are recomputed
+    calculator.calculate(period_tax, filings, as_of=date(2024, 7, 1))
+    assert (calculator.computed, calculator.reused) == (5, 1)
+
+    monkeypatch.setattr(analytics.settings, "GST_FILINGS_PATH", path)
+    analysis = analytics.AnalyticsService().analyze_gst_compliance([
+        {"date": "2024-01-15", "hsn_code": "998231", "subtotal": 1000, "gst_amount": 180},
+        {"date": "2024-01-20", "hsn_code": "998231", "subtotal": 1000, "gst_amount": 180},
+    ])
+    assert analysis.gst_returns_due[0]["status"] == "filed"
+    assert [(p["period"], p["amount"], p["severity"]) for p in analysis.gst_penalties] == [("2024-01", 1001.78, "medium")]
+
+    # Returns filed on time, tax paid a month late: interest only
+    late_payment = period_penalty(
+        "2024-03", 1000.0, {"gstr1": "2024-04-11", "gstr3b": "2024-04-20", "tax_paid": "2024-05-20"}, date(2024, 6, 1)
+    )
+    [summary] = analytics.AnalyticsService()._identify_gst_penalties([late_payment])
+    assert summary["type"] == "Late GST Payment"
+    assert summary["description"] == "GST for 2024-03 was paid late (interest Rs 14.79)"
+
+    # Concurrent writers (other workers) do not drop each other's periods
+    threads = [
+        threading.Thread(target=record_gst_filing, args=(path, f"2023-{month:02d}", {"gstr1": f"2023-{month:02d}-28"}))
+        for month in range(1, 13)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert len(load_gst_filings(path)) == 13
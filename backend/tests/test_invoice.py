@@ -9,3 +9,550 @@ This module contains test cases for invoice processing functionality:
 
 Author: Dev 1
 """
+import sys
+import pytest
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.table_extraction import cluster_rows, extract_line_items
+
+
+def _layout(rows):
+    """Build words/boxes from (y, [(x, text), ...]) rows with 10px high words"""
+    words, boxes = [], []
+    for y, cells in rows:
+        for x, text in cells:
+            words.append(text)
+            boxes.append([x, y, x + 8 * len(text), y + 10])
+    return words, boxes
+
+
+def test_cluster_rows_groups_by_vertical_overlap():
+    words, boxes = _layout([
+        (10, [(200, "B"), (10, "A")]),
+        (12, [(400, "C")]),
+        (40, [(10, "D")]),
+    ])
+    rows = cluster_rows(words, boxes)
+    assert [[cell["text"] for cell in row] for row in rows] == [["A", "B", "C"], ["D"]]
+
+
+def test_extract_line_items_with_header():
+    words, boxes = _layout([
+        (10, [(10, "Description"), (200, "HSN"), (300, "Qty"), (380, "Rate"), (480, "Amount")]),
+        (30, [(10, "Steel"), (60, "Bolts"), (200, "7318"), (300, "10"), (380, "2.50"), (480, "25.00")]),
+        (50, [(10, "Washers"), (200, "7318"), (300, "4"), (380, "1.25"), (480, "5.00")]),
+        (70, [(10, "zinc"), (50, "plated")]),
+        (90, [(10, "Total"), (480, "30.00")]),
+    ])
+    items = extract_line_items(words, boxes)
+    assert items == [
+        {"description": "Steel Bolts", "hsn_code": "7318", "quantity": 10.0, "rate": 2.5, "amount": 25.0},
+        {"description": "Washers zinc plated", "hsn_code": "7318", "quantity": 4.0, "rate": 1.25, "amount": 5.0},
+    ]
+
+
+def test_extract_line_items_without_header():
+    words, boxes = _layout([
+        (10, [(10, "KEDAI"), (70, "RUNCIT")]),
+        (30, [(10, "MILO"), (50, "1KG"), (300, "17.90")]),
+        (50, [(10, "TOTAL"), (300, "17.90")]),
+        (70, [(10, "CASH"), (300, "20.00")]),
+    ])
+    items = extract_line_items(words, boxes)
+    assert [(item["description"], item["amount"]) for item in items] == [("MILO 1KG", 17.9)]
+
+
+def test_ocr_images_batched_splits_results_per_image(monkeypatch):
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("easyocr")
+    from app.services import ocr_service
+
+    calls = []
+
+    class FakeReader:
+        def readtext_batched(self, images, batch_size=1, n_width=None, n_height=None):
+            calls.append((n_width, n_height, [image.shape for image in images]))
+            return [[([[0, 0], [5, 0], [5, 5], [0, 5]], f"w{image.shape[0]}", 0.9)] for image in images]
+
+    monkeypatch.setattr(ocr_service, "get_ocr_reader", lambda: FakeReader())
+    monkeypatch.setattr("easyocr.utils.reformat_input", lambda image: (image, None))
+
+    images = [np.zeros((10, 10, 3)), np.zeros((20, 10, 3)), np.zeros((10, 10, 3)), np.zeros((22, 11, 3))]
+    results = ocr_service.ocr_images_batched(images, batch_size=8)
+
+    assert [r.words for r in results] == [["w10"], ["w20"], ["w10"], ["w22"]]
+    # Similar aspect ratios batch together, resized to the chunk's largest size
+    assert sorted((len(shapes), n_width or 0, n_height or 0) for n_width, n_height, shapes in calls) == [(2, 0, 0), (2, 11, 22)]
+    # Boxes come back in each image's own pixels
+    assert results[1].boxes == [[0, 0, int(5 * 10 / 11), int(5 * 20 / 22)]]
+
+
+def test_ocr_cache_round_trip_and_counters(tmp_path):
+    from app.services.ocr_cache import OcrCache
+    from app.services.ocr_service import OcrResult
+
+    cache = OcrCache(str(tmp_path), max_bytes=1024 * 1024)
+    key = OcrCache.make_key(b"image", engine="easyocr", version="1.7", params={"languages": ["en"]})
+    result = OcrResult(words=["TOTAL", "₹1,500.00"], boxes=[[1, 2, 3, 4], [5, 6, 7, 8]], confidences=[0.5, 0.25])
+
+    assert cache.get(key) is None
+    cache.put(key, result)
+    assert cache.get(key) == result
+    assert OcrCache(str(tmp_path), max_bytes=1024 * 1024).get(key) == result
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_ocr_cache_key_depends_on_engine_version_and_params():
+    from app.services.ocr_cache import OcrCache
+
+    base = OcrCache.make_key(b"image", "easyocr", "1.7", {"languages": ["en"]})
+    assert base != OcrCache.make_key(b"image", "google-vision", "1.7", {"languages": ["en"]})
+    assert base != OcrCache.make_key(b"image", "easyocr", "1.8", {"languages": ["en"]})
+    assert base != OcrCache.make_key(b"image", "easyocr", "1.7", {"languages": ["en", "hi"]})
+
+
+def test_ocr_cache_evicts_least_recently_used(tmp_path):
+    from app.services.ocr_cache import OcrCache
+    from app.services.ocr_service import OcrResult
+
+    result = OcrResult(words=["word"] * 50, boxes=[[0, 0, 1, 1]] * 50, confidences=[1.0] * 50)
+    cache = OcrCache(str(tmp_path), max_bytes=10 ** 6)
+    cache.put("a", result)
+    entry_size = cache.stats()["bytes"]
+    cache.max_bytes = 2 * entry_size
+
+    cache.put("b", result)
+    cache.get("a")
+    cache.put("c", result)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == result and cache.get("c") == result
+    assert cache.stats()["evictions"] == 1
+
+
+LAYOUTLM_LABELS = ["O", "B-total", "I-total", "B-date", "I-date", "B-company", "I-company", "B-address", "I-address"]
+
+
+class _FakeEncoding(dict):
+    def __init__(self, data, word_ids):
+        super().__init__(data)
+        self._word_ids = word_ids
+
+    def word_ids(self, index):
+        return self._word_ids[index]
+
+
+def _fake_layoutlm_backend(np, window_words, overlap, predict, padded_lengths):
+    """
+    LayoutLM stand-in with one token per word: documents are split into
+    windows of window_words words overlapping by overlap words, and
+    predict(window, word_id) gives the (label, score) for a token
+    """
+
+    class FakeTokenizer:
+        def __call__(self, text, boxes, truncation, verbose):
+            return {"input_ids": [[0] + [5] * len(words) + [2] for words in text]}
+
+    class FakeProcessor:
+        tokenizer = FakeTokenizer()
+
+        def __call__(self, images, text, boxes, return_tensors, truncation, padding, stride, return_overflowing_tokens):
+            assert padding == "longest" and return_overflowing_tokens
+            windows, mapping = [], []
+            for doc, words in enumerate(text):
+                start = 0
+                while True:
+                    windows.append(list(range(start, min(start + window_words, len(words)))))
+                    mapping.append(doc)
+                    if start + window_words >= len(words):
+                        break
+                    start += window_words - overlap
+            longest = max(len(ids) for ids in windows) + 2
+            padded_lengths.append(longest)
+            word_ids = [[None] + ids + [None] * (longest - len(ids) - 1) for ids in windows]
+            return _FakeEncoding({
+                "input_ids": np.ones((len(windows), longest), dtype=np.int64),
+                "window": np.arange(len(windows)),
+                "overflow_to_sample_mapping": np.array(mapping),
+            }, word_ids)
+
+    class FakeBackend:
+        processor = FakeProcessor()
+        id2label = dict(enumerate(LAYOUTLM_LABELS))
+
+        def predict_logits(self, encoding):
+            rows, length = encoding["input_ids"].shape
+            logits = np.zeros((rows, length, 9), dtype=np.float32)
+            for row, window in enumerate(encoding["window"]):
+                for token in range(1, length):
+                    label, score = predict(int(window), token - 1)
+                    logits[row, token, label] = score
+            return logits
+
+    return FakeBackend()
+
+
+def test_extract_fields_batch_pads_each_length_bucket_to_its_longest():
+    np = pytest.importorskip("numpy")
+    from PIL import Image
+    from app.services.invoice_extraction import extract_fields_batch, length_buckets
+
+    assert length_buckets([50, 10, 30, 20, 40], 2) == [[1, 3], [2, 4], [0]]
+
+    padded_lengths = []
+    # Every token predicts label 1 ("total")
+    backend = _fake_layoutlm_backend(np, 512, 0, lambda window, token: (1, 5.0), padded_lengths)
+
+    image = Image.new("RGB", (100, 100))
+    documents = [
+        (image, ["w"] * count, [[0, 0, 10, 10]] * count)
+        for count in (40, 3, 41, 2)
+    ]
+    results = extract_fields_batch(documents, backend=backend, batch_size=2)
+
+    assert padded_lengths == [5, 43]
+    assert [len(r["total"].split()) for r in results] == [40, 3, 41, 2]
+
+
+def test_extract_fields_batch_merges_overlapping_windows_by_confidence():
+    np = pytest.importorskip("numpy")
+    from PIL import Image
+    from app.services.invoice_extraction import extract_fields_batch
+
+    # Window 0 covers words 0-3 and says "total", window 1 covers words 2-5
+    # and says "date"; each is confident only away from its edges
+    def predict(window, position):
+        word = position + 2 * window
+        if window == 0:
+            return 1, 1.0 if word == 3 else 5.0
+        return 3, 1.0 if word == 2 else 5.0
+
+    backend = _fake_layoutlm_backend(np, 4, 2, predict, [])
+    words = [f"w{i}" for i in range(6)]
+    image = Image.new("RGB", (100, 100))
+
+    [fields] = extract_fields_batch([(image, words, [[0, 0, 10, 10]] * 6)], backend=backend)
+
+    assert fields == {"total": "w0 w1 w2", "date": "w3 w4 w5"}
+
+
+def test_word_predictions_use_first_subword_and_most_confident_window():
+    np = pytest.importorskip("numpy")
+    from app.services.layoutlm_decoding import word_predictions
+
+    # Document 0 has 3 words split over two windows that both cover word 1;
+    # word 2 spans two subword tokens. Document 1 has one word.
+    word_ids = np.array([
+        [-1, 0, 1, -1, -1],
+        [-1, 1, 2, 2, -1],
+        [-1, 0, -1, -1, -1],
+    ])
+    probabilities = np.full((3, 5, 3), 0.1)
+    probabilities[0, 1] = [0.1, 0.8, 0.1]
+    probabilities[0, 2] = [0.1, 0.6, 0.3]
+    probabilities[1, 1] = [0.1, 0.1, 0.8]
+    probabilities[1, 2] = [0.1, 0.1, 0.8]
+    probabilities[1, 3] = [0.9, 0.05, 0.05]  # second subword of word 2, ignored
+    probabilities[2, 1] = [0.7, 0.2, 0.1]
+
+    (labels, confidences), (other_labels, _) = word_predictions(word_ids, probabilities, [3, 1], [0, 0, 1])
+
+    assert labels.tolist() == [1, 2, 2]
+    assert confidences.tolist() == pytest.approx([0.8, 0.8, 0.8])
+    assert other_labels.tolist() == [0]
+
+
+def test_group_fields_splits_bio_spans_and_keeps_most_confident():
+    np = pytest.importorskip("numpy")
+    from app.services.layoutlm_decoding import group_fields
+
+    id2label = dict(enumerate(LAYOUTLM_LABELS))
+    words = ["ACME", "Ltd", "Total", "99.00", "Total", "100.00", "12/01/2024"]
+    labels = np.array([5, 6, 0, 1, 0, 1, 4])
+    confidences = np.array([0.9, 0.7, 0.99, 0.6, 0.99, 0.95, 0.5])
+
+    fields = group_fields(words, labels, confidences, id2label)
+
+    assert {name: field.text for name, field in fields.items()} == {
+        "company": "ACME Ltd", "total": "100.00", "date": "12/01/2024"
+    }
+    assert fields["company"].confidence == pytest.approx(0.8)
+
+
+def test_inference_scheduler_batches_concurrent_requests():
+    import threading
+    from app.services.inference_scheduler import InferenceScheduler
+
+    batches = []
+    release = threading.Event()
+
+    def run_batch(items):
+        # Hold the first batch until every request is queued
+        release.wait(timeout=5)
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    scheduler = InferenceScheduler(run_batch, max_batch_size=4, max_wait_ms=50)
+    try:
+        futures = [scheduler.submit(i) for i in range(9)]
+        release.set()
+        assert [future.result(timeout=5) for future in futures] == [i * 10 for i in range(9)]
+    finally:
+        scheduler.shutdown(timeout=5)
+
+    assert sorted(len(batch) for batch in batches) == [1, 4, 4]
+    stats = scheduler.stats()
+    assert stats["requests"] == 9 and stats["batches"] == 3
+    assert stats["batch_size_histogram"] == {1: 1, 4: 2}
+    assert sum(stats["queue_depth_histogram"].values()) == 9
+
+
+def test_inference_scheduler_propagates_batch_errors():
+    from app.services.inference_scheduler import InferenceScheduler
+
+    def run_batch(items):
+        raise ValueError("model exploded")
+
+    scheduler = InferenceScheduler(run_batch, max_batch_size=2, max_wait_ms=1)
+    try:
+        with pytest.raises(ValueError, match="model exploded"):
+            scheduler.submit("invoice").result(timeout=5)
+        assert scheduler.stats()["failed_batches"] == 1
+    finally:
+        scheduler.shutdown(timeout=5)
+
+
+def test_inference_scheduler_isolates_the_failing_request():
+    import threading
+    from app.services.inference_scheduler import InferenceScheduler
+
+    release = threading.Event()
+
+    def run_batch(items):
+        release.wait(timeout=5)
+        if "corrupt" in items:
+            raise ValueError("bad document")
+        return [item.upper() for item in items]
+
+    scheduler = InferenceScheduler(run_batch, max_batch_size=4, max_wait_ms=50)
+    try:
+        futures = [scheduler.submit(item) for item in ("a", "corrupt", "b")]
+        release.set()
+        assert futures[0].result(timeout=5) == "A" and futures[2].result(timeout=5) == "B"
+        with pytest.raises(ValueError, match="bad document"):
+            futures[1].result(timeout=5)
+        stats = scheduler.stats()
+        assert (stats["failed_batches"], stats["failed_requests"]) == (1, 1)
+    finally:
+        scheduler.shutdown(timeout=5)
+
+
+def test_mmap_safetensors_shares_file_pages(tmp_path):
+    torch = pytest.importorskip("torch")
+    from safetensors.torch import save_file
+    from app.services.shared_weights import mmap_safetensors
+
+    tensors = {
+        "weight": torch.arange(12, dtype=torch.float32).reshape(3, 4),
+        "bias": torch.tensor([1.5, -2.0], dtype=torch.float16),
+        "steps": torch.tensor([7], dtype=torch.int64),
+    }
+    path = tmp_path / "model.safetensors"
+    save_file(tensors, str(path))
+
+    mapped = mmap_safetensors(str(path))
+
+    assert set(mapped) == set(tensors)
+    for name, tensor in tensors.items():
+        assert mapped[name].dtype == tensor.dtype
+        assert torch.equal(mapped[name], tensor)
+    # All tensors are views of one storage over the file
+    assert mapped["weight"].untyped_storage().nbytes() == path.stat().st_size
+
+
+def test_model_manager_evicts_least_recently_used_models():
+    from app.services.model_manager import ModelKey, ModelManager
+
+    manager = ModelManager(max_bytes=100)
+    loads = []
+
+    def get(kind, size):
+        def load():
+            loads.append(kind)
+            return kind.upper()
+        return manager.get(ModelKey(kind), load, size_of=lambda model: size)
+
+    assert get("ocr", 40) == "OCR"
+    assert get("layoutlm", 50) == "LAYOUTLM"
+    assert get("ocr", 40) == "OCR"  # hit: layoutlm is now least recently used
+    get("tamil-ocr", 30)
+
+    assert loads == ["ocr", "layoutlm", "tamil-ocr"]
+    assert manager.loaded(ModelKey("ocr")) and not manager.loaded(ModelKey("layoutlm"))
+    stats = manager.stats()
+    assert (stats["hits"], stats["misses"], stats["lru_evictions"]) == (1, 3, 1)
+    assert stats["loaded_bytes"] == 70
+    assert stats["models"]["ocr:default:en"]["hits"] == 1
+
+    # A model larger than the cap is still kept once loaded
+    get("huge", 500)
+    assert manager.loaded(ModelKey("huge")) and manager.stats()["loaded_bytes"] == 500
+
+
+def test_model_manager_unloads_idle_models(monkeypatch):
+    from app.services import model_manager
+    from app.services.model_manager import ModelKey, ModelManager
+
+    now = [1000.0]
+    monkeypatch.setattr(model_manager.time, "monotonic", lambda: now[0])
+    manager = ModelManager(max_bytes=0, idle_seconds=60)
+    manager.get(ModelKey("ocr"), lambda: "reader", size_of=lambda model: 1)
+    now[0] += 30
+    manager.get(ModelKey("layoutlm"), lambda: "backend", size_of=lambda model: 1)
+
+    now[0] += 45
+    assert manager.evict_idle() == [ModelKey("ocr")]
+    assert manager.loaded(ModelKey("layoutlm"))
+    assert manager.stats()["idle_evictions"] == 1
+
+
+def _vendor_invoice(invoice_no, date, total, shift=0, gstin="29ABCDE1234F1ZW"):
+    """(words, pixel boxes) of a recurring vendor's 2000x1000 px invoice layout"""
+    rows = [
+        (40, [(100, "ACME"), (260, "TRADERS"), (1400, gstin)]),
+        (100, [(100, "Invoice"), (300, "No"), (400, invoice_no), (1400, "Date"), (1520, date)]),
+        (300, [(100, "Description"), (900, "Quantity"), (1400, "Amount")]),
+        (800, [(1200, "Total"), (1400, total)]),
+        (900, [(100, "Thank"), (260, "you"), (380, "for"), (480, "business")]),
+    ]
+    words, boxes = _layout([(y + shift, [(x + shift, text) for x, text in cells]) for y, cells in rows])
+    return words, boxes
+
+
+def test_vendor_templates_extract_learned_regions(tmp_path):
+    from app.services.vendor_templates import VendorTemplateStore
+
+    store = VendorTemplateStore(str(tmp_path / "templates.json"), min_samples=2)
+    page = (2000, 1000)
+
+    first = _vendor_invoice("A-101", "01/02/2024", "1,200.00")
+    assert store.extract(*first, page, 0.8, "easyocr") is None  # nothing learned yet
+    store.learn(*first, page, {"company": "ACME TRADERS", "date": "01/02/2024", "total": "1,200.00"}, "easyocr")
+    second = _vendor_invoice("A-245", "15/03/2024", "85.50")
+    template = store.learn(*second, page, {"company": "ACME TRADERS", "date": "15/03/2024", "total": "85.50"}, "easyocr")
+    assert template.vendor_key == "gstin:29ABCDE1234F1ZW" and template.samples == 2
+    # The cascade never reads an invoice number from a template
+    with pytest.raises(ValueError, match="invoice_number"):
+        store.learn(*second, page, {"invoice_number": "A-245"}, "easyocr")
+
+    # A new invoice scanned slightly offset is read from the regions
+    third = _vendor_invoice("A-377", "30/04/2024", "9,999.00", shift=6)
+    match = store.extract(*third, page, 0.8, "easyocr")
+    assert match is not None and match.confidence >= 0.8
+    assert {name: field.text for name, field in match.fields.items()} == {
+        "company": "ACME TRADERS", "date": "30/04/2024", "total": "9,999.00"
+    }
+    # Another engine splits the page into different words: no template yet
+    assert store.extract(*third, page, 0.8, "google-vision") is None
+
+    # Templates persist and are shared through the file
+    reloaded = VendorTemplateStore(str(tmp_path / "templates.json"), min_samples=2)
+    assert reloaded.stats()["usable_templates"] == 1
+    assert store.stats()["hits"] == 1 and store.stats()["no_template"] == 2
+
+
+def test_vendor_templates_fall_back_when_layout_changes(tmp_path):
+    from app.services.vendor_templates import VendorTemplateStore
+
+    store = VendorTemplateStore(str(tmp_path / "templates.json"), min_samples=1)
+    page = (2000, 1000)
+    store.learn(*_vendor_invoice("A-101", "01/02/2024", "1,200.00"), page, {"total": "1,200.00"}, "easyocr")
+
+    # Same GSTIN, but the static text moved: the model has to run
+    words, boxes = _vendor_invoice("A-102", "02/02/2024", "50.00")
+    moved = [[x0, y0 + 120 * (i % 2), x1, y1 + 120 * (i % 2)] for i, (x0, y0, x1, y1) in enumerate(boxes)]
+    assert store.extract(words, moved, page, 0.8, "easyocr") is None
+    # Unknown vendor
+    assert store.extract(*_vendor_invoice("B-1", "01/02/2024", "5.00", gstin="27PQRST6789K1ZW"), page, 0.8, "easyocr") is None
+    assert store.stats()["low_confidence"] == 1 and store.stats()["no_template"] == 1
+
+
+def test_vendor_template_stores_do_not_lose_concurrent_updates(tmp_path):
+    import threading
+    from app.services.gstin import check_character
+    from app.services.vendor_templates import VendorTemplateStore
+
+    path = str(tmp_path / "templates.json")
+    page = (2000, 1000)
+    # Two stores on one file, like two gunicorn workers
+    stores = [VendorTemplateStore(path, min_samples=1) for _ in range(2)]
+
+    def learn(store, offset):
+        for i in range(offset, 20, 2):
+            gstin = f"29ABCDE12{i:02d}F1Z"
+            words, boxes = _vendor_invoice("A-1", "01/02/2024", "5.00", gstin=gstin + check_character(gstin))
+            store.learn(words, boxes, page, {"total": "5.00"}, "easyocr")
+
+    threads = [threading.Thread(target=learn, args=(store, offset)) for offset, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert VendorTemplateStore(path, min_samples=1).stats()["templates"] == 20
+
+
+def _cascade_ocr(text):
+    from app.services.ocr_service import OcrResult
+
+    words = text.split()
+    return OcrResult(words, [[10 * i, 0, 10 * i + 8, 10] for i in range(len(words))], [0.9] * len(words))
+
+
+def test_cascade_skips_model_when_regex_fields_validate(monkeypatch):
+    from app.services import extraction_cascade, invoice_extraction
+
+    def no_model(*args):
+        raise AssertionError("model tier should not run")
+
+    monkeypatch.setattr(invoice_extraction, "model_fields", no_model)
+    before = extraction_cascade.cascade_stats()["resolved_by"]["regex"]
+
+    result = extraction_cascade.run_cascade(
+        _cascade_ocr("Invoice No 12345 Date 12/03/2024 GSTIN 29ABCDE1234F1ZW Total 1,200.00"), no_model, "easyocr"
+    )
+
+    assert result.tier == "regex" and result.errors == []
+    assert result.fields["total"] == "1200.00" and result.fields["invoice_date"] == "12/03/2024"
+    assert extraction_cascade.cascade_stats()["resolved_by"]["regex"] == before + 1
+
+
+def test_cascade_runs_model_only_for_missing_fields(monkeypatch):
+    from PIL import Image
+    from app.services import extraction_cascade, invoice_extraction
+
+    calls = []
+    monkeypatch.setattr(invoice_extraction, "template_fields", lambda *args: None)
+    monkeypatch.setattr(
+        invoice_extraction, "model_fields",
+        lambda *args: calls.append(args) or {"total": "88.50", "date": "01/01/1999", "company": "ACME"}
+    )
+    before = extraction_cascade.cascade_stats()
+
+    # No total on the page for the regex tier
+    result = extraction_cascade.run_cascade(
+        _cascade_ocr("Invoice No 12345 Date 12/03/2024 GSTIN 29ABCDE1234F1ZW"),
+        lambda: Image.new("RGB", (100, 100)),
+        "easyocr"
+    )
+
+    assert len(calls) == 1 and result.tier == "layoutlm" and result.errors == []
+    # Only the failing field is taken from the model
+    assert result.fields["total"] == "88.50" and result.fields["invoice_date"] == "12/03/2024"
+    assert result.data["amount"] == 88.5
+    stats = extraction_cascade.cascade_stats()
+    assert stats["model_invocations"] == before["model_invocations"] + 1
+    assert stats["regex_field_failures"]["total"] == before["regex_field_failures"].get("total", 0) + 1
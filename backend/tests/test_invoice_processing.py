@@ -1,6 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 import os
+import subprocess
 import sys
 from pathlib import Path
 
@@ -50,6 +51,43 @@ def test_invoice_detail():
     assert response.status_code == 200
     assert "invoice_number" in response.json()
 
+def test_ready_endpoint_reports_components():
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert set(response.json()["components"]) == {"ocr", "layoutlm"}
+
+def test_app_import_defers_heavy_dependencies():
+    # Run in a fresh interpreter: other tests may already have imported them
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('torch', 'easyocr', 'sklearn', 'transformers') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent.parent, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
+
+def test_background_warmup_marks_component_ready(monkeypatch):
+    from app.services import warmup
+
+    loaded = []
+    monkeypatch.setitem(warmup.COMPONENTS, "fake", (lambda: loaded.append(True), lambda: bool(loaded)))
+    assert warmup.component_status("fake") == "not_loaded"
+
+    # Unknown names (a typo in WARMUP_COMPONENTS) are skipped, not a KeyError
+    warmup.start_background_warmup(["fake", "layoutlmv3"]).join(timeout=5)
+    assert warmup.readiness(["fake", "layoutlmv3"])["ready"]
+
+def test_metrics_endpoint_reports_scheduler_histograms():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    scheduler = response.json()["layoutlm_scheduler"]
+    assert {"queue_depth", "batch_size_histogram", "queue_depth_histogram"} <= set(scheduler)
+    assert {"hits", "misses", "lru_evictions", "idle_evictions", "models"} <= set(response.json()["models"])
+    assert "hits" in response.json()["vendor_templates"]
+    assert set(response.json()["extraction_cascade"]["resolved_by"]) == {"regex", "template", "layoutlm", "unresolved"}
+
 @pytest.fixture(autouse=True)
 def cleanup():
     # Cleanup after each test
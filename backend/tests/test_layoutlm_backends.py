@@ -0,0 +1,65 @@
+import pytest
+from pathlib import Path
+
+from app.core.config import settings
+from app.services.layoutlm_backends import available_backends, load_backend
+
+# INT8 weights may flip a few low-margin tokens; FP32 runtimes must agree exactly
+MIN_INT8_FIELD_AGREEMENT = 0.9
+SROIE_DATASET = Path(__file__).parent.parent / "datasets" / "sroie_tokenized"
+MODEL_DIR = settings.LAYOUTLM_MODEL_DIR
+
+pytestmark = pytest.mark.skipif(
+    not Path(MODEL_DIR, "config.json").exists() or not SROIE_DATASET.exists(),
+    reason="fine-tuned LayoutLMv3 model or SROIE dataset not available"
+)
+
+
+@pytest.fixture(scope="module")
+def sroie_samples():
+    datasets = pytest.importorskip("datasets")
+    return list(datasets.load_from_disk(str(SROIE_DATASET)))
+
+
+@pytest.fixture(scope="module")
+def backend_fields(sroie_samples):
+    """Field predictions per backend for every SROIE sample (boxes already on the 0-1000 grid)"""
+    from app.services.invoice_extraction import extract_fields
+
+    fields = {}
+    for name in available_backends(MODEL_DIR):
+        backend = load_backend(name, MODEL_DIR)
+        fields[name] = [
+            extract_fields(
+                sample["image"].convert("RGB"), sample["words"], sample["boxes"], backend=backend, boxes_normalized=True
+            )
+            for sample in sroie_samples
+        ]
+    return fields
+
+
+def _field_agreement(reference, candidate):
+    pairs = [
+        (ref.get(field), cand.get(field))
+        for ref, cand in zip(reference, candidate)
+        for field in set(ref) | set(cand)
+    ]
+    if not pairs:
+        return 1.0
+    return sum(a == b for a, b in pairs) / len(pairs)
+
+
+def test_onnx_matches_torch(backend_fields):
+    """ONNX Runtime FP32 reproduces the PyTorch field predictions"""
+    if "onnx" not in backend_fields:
+        pytest.skip("ONNX export not found, run scripts/export_layoutlm_onnx.py")
+    assert backend_fields["onnx"] == backend_fields["torch"]
+
+
+@pytest.mark.parametrize("name", ["torch-int8", "onnx-int8"])
+def test_int8_field_parity(backend_fields, name):
+    """Quantized backends extract the same fields as FP32 on SROIE"""
+    if name not in backend_fields:
+        pytest.skip(f"{name} backend not available")
+    agreement = _field_agreement(backend_fields["torch"], backend_fields[name])
+    assert agreement >= MIN_INT8_FIELD_AGREEMENT
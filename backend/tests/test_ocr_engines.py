@@ -0,0 +1,146 @@
+"""
+OCR Engine Tests
+
+This module contains test cases for the pluggable OCR engines:
+- Latency-budgeted routing and confidence escalation
+- Fallback when an engine fails
+- Google Vision engine against the local fake Vision server
+- Batched Vision requests and the shared Vision client
+
+Author: Dev 1
+"""
+import pytest
+
+from app.services.ocr_engines import GoogleVisionEngine, OcrEngine, OcrRouter
+from app.services.ocr_service import OcrResult
+
+
+class FakeEngine(OcrEngine):
+    def __init__(self, name, expected_latency, confidence, fail=False):
+        self.name = name
+        self.expected_latency = expected_latency
+        self.confidence = confidence
+        self.fail = fail
+        self.calls = 0
+
+    def lookup(self, content):
+        return None
+
+    def store(self, content, result):
+        pass
+
+    def recognize(self, content):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("engine down")
+        return OcrResult(words=[self.name], boxes=[[0, 0, 1, 1]], confidences=[self.confidence])
+
+
+def test_router_stops_at_confident_fast_engine():
+    fast, slow = FakeEngine("fast", 0.1, 0.9), FakeEngine("slow", 1.0, 0.99)
+    routed = OcrRouter([slow, fast], latency_budget=5.0, confidence_threshold=0.8).recognize(b"img")
+
+    assert routed.engine == "fast"
+    assert (fast.calls, slow.calls) == (1, 0)
+
+
+def test_router_escalates_on_low_confidence():
+    fast, slow = FakeEngine("fast", 0.1, 0.4), FakeEngine("slow", 1.0, 0.95)
+    router = OcrRouter([fast, slow], latency_budget=5.0, confidence_threshold=0.8)
+    routed = router.recognize(b"img")
+
+    assert routed.engine == "slow"
+    assert [attempt["engine"] for attempt in routed.attempts] == ["fast", "slow"]
+    assert router.stats()["escalations"] == 1
+
+
+def test_router_respects_latency_budget():
+    fast, slow = FakeEngine("fast", 0.1, 0.4), FakeEngine("slow", 10.0, 0.95)
+    routed = OcrRouter([fast, slow], latency_budget=2.0, confidence_threshold=0.8).recognize(b"img")
+
+    assert routed.engine == "fast"
+    assert slow.calls == 0
+
+
+def test_router_falls_back_when_engine_fails():
+    broken, slow = FakeEngine("broken", 0.1, 0.9, fail=True), FakeEngine("slow", 10.0, 0.7)
+    routed = OcrRouter([broken, slow], latency_budget=1.0, confidence_threshold=0.8).recognize(b"img")
+
+    assert routed.engine == "slow"
+    assert "error" in routed.attempts[0]
+
+
+def test_google_vision_engine_against_fake_server(fake_vision_server):
+    pytest.importorskip("google.cloud.vision")
+
+    engine = GoogleVisionEngine(endpoint=fake_vision_server.endpoint)
+    result = engine.recognize(b"TAX INVOICE 1500.00")
+
+    assert result.words == ["TAX", "INVOICE", "1500.00"]
+    assert result.boxes[1] == [80, 10, 140, 30]
+    assert result.confidence == pytest.approx(0.95)
+    with pytest.raises(Exception, match="Vision API error"):
+        engine.recognize(b"ERROR bad image")
+
+
+def test_google_vision_batches_images_per_request(fake_vision_server, monkeypatch):
+    pytest.importorskip("google.cloud.vision")
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "GOOGLE_VISION_BATCH_SIZE", 16)
+    monkeypatch.setattr(settings, "GOOGLE_VISION_MAX_CONCURRENCY", 2)
+    engine = GoogleVisionEngine(endpoint=fake_vision_server.endpoint)
+    contents = [f"INVOICE {i}".encode() for i in range(20)]
+    contents[7] = b"ERROR unreadable"
+
+    results = engine.recognize_batch(contents)
+
+    assert sorted(fake_vision_server.calls) == [4, 16]
+    assert [r.words for i, r in enumerate(results) if i != 7] == [["INVOICE", str(i)] for i in range(20) if i != 7]
+    assert isinstance(results[7], Exception) and "unreadable" in str(results[7])
+
+
+def test_google_vision_client_is_shared_until_closed(fake_vision_server, monkeypatch):
+    pytest.importorskip("google.cloud.vision")
+    from app.core.config import settings
+    from app.services import ocr_engines
+
+    monkeypatch.setattr(settings, "GOOGLE_VISION_ENDPOINT", fake_vision_server.endpoint)
+    ocr_engines.close_vision_client()
+    try:
+        first, second = GoogleVisionEngine(), GoogleVisionEngine()
+        assert first.client is second.client is ocr_engines.get_vision_client()
+        assert second.recognize(b"GST 18%").words == ["GST", "18%"]
+    finally:
+        ocr_engines.close_vision_client()
+    assert ocr_engines.get_vision_client() is not first.client
+    ocr_engines.close_vision_client()
+
+
+def test_google_vision_batch_pipeline_reports_errors_per_file(fake_vision_server, monkeypatch, tmp_path):
+    pytest.importorskip("google.cloud.vision")
+    from app.core.config import settings
+    from app.services import ocr_engines
+    from app.services.ocr_google import run_google_vision_and_layoutlm_batch
+
+    monkeypatch.setattr(settings, "GOOGLE_VISION_ENDPOINT", fake_vision_server.endpoint)
+    monkeypatch.setattr(settings, "OCR_CACHE_ENABLED", False)
+    ocr_engines.close_vision_client()
+    good = tmp_path / "good.png"
+    good.write_bytes(b"Invoice No 12345 Date 12/03/2024 GSTIN 29ABCDE1234F1ZW Total 1,200.00")
+    bad = tmp_path / "bad.png"
+    bad.write_bytes(b"ERROR unreadable")
+    try:
+        results = run_google_vision_and_layoutlm_batch([str(good), str(tmp_path / "missing.png"), str(bad)])
+        assert results[0]["total"] == "1200.00" and results[0]["currency"] == "N/A"
+        assert "missing.png" in results[1]["error"] and "unreadable" in results[2]["error"]
+
+        # A transport failure fails every file, each with its own error entry
+        def unreachable(self, contents):
+            raise ConnectionError("Vision endpoint unreachable")
+
+        monkeypatch.setattr(GoogleVisionEngine, "recognize_batch", unreachable)
+        results = run_google_vision_and_layoutlm_batch([str(good), str(bad)])
+        assert all("unreachable" in result["error"] for result in results)
+    finally:
+        ocr_engines.close_vision_client()